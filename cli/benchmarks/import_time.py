@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the commands run from hooks (list, validate)
+
+Runs each command in a fresh interpreter with `-X importtime` and reports the
+median total import time and wall time. Exits non-zero when a command exceeds the
+import budget or loads a module it should never need, such as a provider SDK.
+
+    python cli/benchmarks/import_time.py --runs 10 --budget-ms 100
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+CLI_MAIN = Path(__file__).resolve().parent.parent / "main.py"
+
+COMMANDS = {
+    'list': ['list'],
+    'validate': ['validate'],
+}
+
+# Modules only `run`/`create` should ever load
+FORBIDDEN_MODULES = ['anthropic', 'openai', 'httpx', 'pydantic', 'tiktoken', 'cli.core.llm_client']
+
+# Runs the CLI in-process, then reports which forbidden modules it loaded
+PROBE = """
+import io, json, sys
+from contextlib import redirect_stdout
+sys.path.insert(0, {root!r})
+sys.argv = ['main.py'] + {argv!r}
+from cli.cli import main
+with redirect_stdout(io.StringIO()):
+    main()
+print(json.dumps([name for name in {forbidden!r} if name in sys.modules]))
+"""
+
+
+def total_import_us(stderr: str) -> int:
+    """Sum the self time of every module in `-X importtime` output"""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us = line.split('|')[0].split(':')[1].strip()
+        if self_us.isdigit():
+            total += int(self_us)
+    return total
+
+
+def measure(argv: List[str], runs: int) -> Dict[str, float]:
+    """Median import and wall time of a command over `runs` fresh interpreters"""
+    imports = []
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', str(CLI_MAIN)] + argv,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        walls.append(time.perf_counter() - start)
+        imports.append(total_import_us(completed.stderr))
+    return {
+        'import_ms': statistics.median(imports) / 1000.0,
+        'wall_ms': statistics.median(walls) * 1000.0,
+    }
+
+
+def forbidden_imports(argv: List[str]) -> List[str]:
+    """Forbidden modules loaded while running a command"""
+    probe = PROBE.format(root=str(CLI_MAIN.parent.parent), argv=argv, forbidden=FORBIDDEN_MODULES)
+    completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True)
+    try:
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        print(completed.stderr, file=sys.stderr)
+        return ['<probe failed>']
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup for list and validate')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per command (default: 10)')
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='Maximum median import time per command (default: 100)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    
+    # Keep the index and validation caches warm, as they are in a hook
+    for argv in COMMANDS.values():
+        subprocess.run([sys.executable, str(CLI_MAIN)] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    results = {}
+    failed = False
+    for name, argv in COMMANDS.items():
+        result = measure(argv, args.runs)
+        result['forbidden'] = forbidden_imports(argv)
+        result['within_budget'] = result['import_ms'] <= args.budget_ms and not result['forbidden']
+        failed = failed or not result['within_budget']
+        results[name] = result
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            status = "ok" if result['within_budget'] else "OVER BUDGET"
+            print(f"{name:10} imports {result['import_ms']:7.1f} ms   wall {result['wall_ms']:7.1f} ms   {status}")
+            if result['forbidden']:
+                print(f"{'':10} loaded: {', '.join(result['forbidden'])}")
+        print(f"\nBudget: {args.budget_ms:.0f} ms of imports per command (median of {args.runs} runs)")
+    
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of run, run-all and validate on synthetic repositories
+
+Generates repositories of the given sizes, then runs each scenario in a fresh
+interpreter against the mock provider (`--provider mock`), so only the CLI's own
+work is measured: walking and reading files, chunking, prompt building, the
+reduce and output. Reports wall time, provider calls, tokens sent and received,
+and peak RSS per scenario next to the size of the scanned source. With
+--max-rss-mb, a scenario whose peak RSS exceeds the budget fails the benchmark.
+    
+    python cli/benchmarks/pipeline.py --files 1000,10000,100000
+    python cli/benchmarks/pipeline.py --files 1000 --mock "latency=0.5,tokens_per_second=100" --json
+    python cli/benchmarks/pipeline.py --files 20000 --file-size 50000 --scenarios run,run-all --max-rss-mb 256
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+CLI_ROOT = Path(__file__).resolve().parent.parent
+
+# Scenario name: CLI arguments after the common ones; '{repo}' is the synthetic repository
+SCENARIOS = {
+    'run': ['run', 'detect-secrets', '--path', '{repo}/src'],
+    'run-jsonl': ['run', 'detect-secrets', '--path', '{repo}/src', '--format', 'jsonl'],
+    'run-all': ['run-all', '--path', '{repo}/src'],
+    'validate': ['validate', '--format', 'json', '--no-cache'],
+}
+DEFAULT_SCENARIOS = ['run', 'run-all', 'validate']
+
+EXTENSIONS = ['.py', '.js', '.ts', '.go', '.java']
+FILES_PER_DIR = 100
+RULES_PER_REPO = 0.1  # Synthetic rule files for validate, per source file
+
+# Runs one CLI command in-process and reports what it cost
+PROBE = """
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+argv = json.load(sys.stdin)
+from cli.cli import main
+from cli.core.mock_provider import MockClient
+start = time.perf_counter()
+stdout = sys.stdout
+with open(os.devnull, 'w') as devnull:
+    sys.stdout = devnull
+    try:
+        exit_code = main(argv)
+    except SystemExit as e:
+        exit_code = e.code
+    sys.stdout = stdout
+wall = time.perf_counter() - start
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# Kilobytes on Linux, bytes on macOS
+peak_rss_mb = peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+print(json.dumps(dict(MockClient.totals, exit_code=exit_code, wall_s=wall, peak_rss_mb=peak_rss_mb)))
+"""
+
+
+def source_file(rng: random.Random, index: int, extension: str, size: int) -> str:
+    """Plausible source text of about `size` bytes, with the odd hard-coded credential"""
+    lines = [f"// module {index}" if extension != '.py' else f"# module {index}"]
+    while sum(len(line) + 1 for line in lines) < size:
+        n = rng.randint(0, 9999)
+        kind = rng.random()
+        if kind < 0.02:
+            lines.append(f"api_key = \"sk-{rng.getrandbits(96):024x}\"")
+        elif kind < 0.3:
+            lines.append(f"def handler_{n}(request):" if extension == '.py' else f"function handler_{n}(request) {{")
+        elif kind < 0.6:
+            lines.append(f"    value_{n} = request.get(\"param_{n % 97}\")")
+        else:
+            lines.append(f"    result = query(\"SELECT * FROM t{n % 13} WHERE id = \" + value_{n})")
+    return "\n".join(lines) + "\n"
+
+
+def rule_file(index: int) -> str:
+    return f"""---
+description: Synthetic benchmark rule {index}
+languages:
+- python
+alwaysApply: false
+---
+
+rule_id: secure-flow-bench-{index}
+
+## Benchmark Rule {index}
+
+Check every handler for unvalidated input.
+
+### Implementation Checklist
+- [ ] Validate input
+"""
+
+
+def make_repo(root: Path, files: int, file_size: int, seed: int) -> Path:
+    """Create (or reuse) a synthetic repository with `files` source files and some rule files"""
+    repo = root / f"repo-{files}-{file_size}-{seed}"
+    marker = repo / ".complete"
+    if marker.exists():
+        return repo
+    
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = repo / "src" / f"pkg{i // FILES_PER_DIR:05d}"
+        if i % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        extension = EXTENSIONS[i % len(EXTENSIONS)]
+        size = max(64, int(rng.expovariate(1.0 / file_size)))
+        (directory / f"module_{i}{extension}").write_text(source_file(rng, i, extension, size))
+    
+    rules = repo / "rules"
+    rules.mkdir(parents=True, exist_ok=True)
+    for i in range(max(1, int(files * RULES_PER_REPO))):
+        (rules / f"secure-flow-bench-{i}.md").write_text(rule_file(i))
+    
+    marker.write_text("")
+    return repo
+
+
+def source_size_mb(repo: Path) -> float:
+    """Total size of the repository's source files"""
+    return sum(entry.stat().st_size for entry in (repo / "src").rglob('*') if entry.is_file()) / (1024 * 1024)
+
+
+def run_scenario(name: str, repo: Path, mock: str, cache_dir: Path) -> Dict[str, Any]:
+    """Run one scenario in a fresh interpreter and return its measurements"""
+    argv = ['--no-daemon'] + [arg.replace('{repo}', str(repo)) for arg in SCENARIOS[name]]
+    if name == 'validate':
+        argv += sorted(str(path) for path in (repo / "rules").iterdir())
+    else:
+        # Every call reaches the provider: nothing is answered from caches or checkpoints
+        argv += ['--provider', 'mock', '--no-cache', '--no-resume']
+    
+    env = dict(os.environ, SECURE_FLOW_CACHE_DIR=str(cache_dir), SECURE_FLOW_MOCK=mock)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE.format(root=str(CLI_ROOT.parent))],
+        input=json.dumps(argv),
+        capture_output=True,
+        text=True,
+        env=env
+    )
+    elapsed = time.perf_counter() - start
+    try:
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        print(completed.stderr[-2000:], file=sys.stderr)
+        result = {'exit_code': completed.returncode}
+    result['process_s'] = elapsed
+    return result
+
+
+def print_row(result: Dict[str, Any]) -> None:
+    if 'wall_s' not in result:
+        print(f"{result['scenario']:10} {result['files']:>7} files   FAILED (exit {result['exit_code']})")
+        return
+    print(
+        f"{result['scenario']:10} {result['files']:>7} files   wall {result['wall_s']:7.2f} s   "
+        f"calls {result['calls']:>5}   tokens {result['input_tokens']:>11,} in {result['output_tokens']:>9,} out   "
+        f"peak RSS {result['peak_rss_mb']:7.1f} MB of {result['source_mb']:.0f} MB source"
+        + ("" if result['exit_code'] == 0 else f"   exit {result['exit_code']}")
+        + ("   OVER BUDGET" if result.get('over_budget') else "")
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark run, run-all and validate on synthetic repositories')
+    parser.add_argument('--files', default='1000,10000', help='Comma-separated repository sizes in files (default: 1000,10000)')
+    parser.add_argument('--file-size', type=int, default=2000, help='Mean source file size in bytes (default: 2000)')
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS), help=f"Comma-separated scenarios from: {', '.join(SCENARIOS)} (default: {','.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument('--mock', default='', help='Mock provider settings, as in SECURE_FLOW_MOCK (default: instant replies)')
+    parser.add_argument('--workdir', help='Directory for the generated repositories, reused between runs (default: a temporary directory)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated repositories (default: 0)')
+    parser.add_argument('--max-rss-mb', type=float, help='Fail when a scenario\'s peak RSS exceeds this many MB')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    sizes = [int(size) for size in args.files.split(',') if size.strip()]
+    
+    with tempfile.TemporaryDirectory(prefix='secure-flow-bench-') as tmp:
+        workdir = Path(args.workdir) if args.workdir else Path(tmp)
+        results = []
+        failed = False
+        for size in sizes:
+            start = time.perf_counter()
+            repo = make_repo(workdir, size, args.file_size, args.seed)
+            source_mb = source_size_mb(repo)
+            if not args.json:
+                print(f"Repository of {size} files ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            for name in scenarios:
+                with tempfile.TemporaryDirectory(prefix='secure-flow-cache-') as cache_dir:
+                    result = run_scenario(name, repo, args.mock, Path(cache_dir))
+                result.update(scenario=name, files=size, source_mb=source_mb)
+                if args.max_rss_mb is not None and result.get('peak_rss_mb', 0) > args.max_rss_mb:
+                    result['over_budget'] = True
+                failed = failed or result.get('exit_code') not in (0, None) or result.get('over_budget', False)
+                results.append(result)
+                if not args.json:
+                    print_row(result)
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,12 +5,187 @@ Main entry point using argparse
 """
 import argparse
 import sys
+from typing import List, Optional
 
-from .commands import list_rules, create_rule, validate_rules, run_rule
+# Command modules are loaded on first use, so only the chosen subcommand's imports are paid for
+from . import commands
+from .core.config import DEFAULT_MAX_FILE_SIZE
 
 
-def main():
-    """Main CLI entry point"""
+def _add_input_options(parser: argparse.ArgumentParser) -> None:
+    """Add the options that select codebase files to include as context"""
+    parser.add_argument(
+        '-f', '--files',
+        action='append',
+        default=[],
+        help='Specific files to include as context (can be used multiple times)'
+    )
+    parser.add_argument(
+        '--path',
+        action='append',
+        default=[],
+        dest='paths',
+        help='Directory to scan for context files, honouring .gitignore (can be used multiple times)'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        default=[],
+        help='Glob pattern a scanned file must match (can be used multiple times)'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        help='Glob pattern of scanned files or directories to skip (can be used multiple times)'
+    )
+    parser.add_argument(
+        '--max-file-size',
+        type=int,
+        default=DEFAULT_MAX_FILE_SIZE,
+        help=f'Skip files larger than this many bytes (default: {DEFAULT_MAX_FILE_SIZE})'
+    )
+
+
+def _add_run_options(parser: argparse.ArgumentParser) -> None:
+    """Add the options shared by the run and run-all commands"""
+    _add_input_options(parser)
+    parser.add_argument(
+        '-t', '--llm-token',
+        help='LLM API token (or set ANTHROPIC_API_KEY/OPENAI_API_KEY env var)'
+    )
+    parser.add_argument(
+        '-p', '--provider',
+        default='anthropic',
+        choices=['anthropic', 'openai', 'mock'],
+        help='LLM provider; mock answers locally, configured by SECURE_FLOW_MOCK (default: anthropic)'
+    )
+    parser.add_argument(
+        '-m', '--model',
+        help='Model name (default: claude-3-5-sonnet-20241022 for anthropic, gpt-4 for openai)'
+    )
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=int,
+        default=4,
+        help='Number of chunks analysed in parallel (default: 4)'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        help='Maximum requests per minute sent to the provider'
+    )
+    parser.add_argument(
+        '--tpm',
+        type=int,
+        help='Maximum tokens per minute sent to the provider'
+    )
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=5,
+        help='Retries per call after rate limits or transient provider errors (default: 5)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=600.0,
+        help='Seconds to wait for a provider response before retrying (default: 600)'
+    )
+    parser.add_argument(
+        '--http2',
+        action='store_true',
+        help="Use HTTP/2 for provider connections (requires: pip install 'httpx[http2]')"
+    )
+    parser.add_argument(
+        '--no-resume',
+        action='store_true',
+        help='Do not checkpoint completed calls or resume a previously failed run'
+    )
+    parser.add_argument(
+        '--no-prompt-cache',
+        action='store_true',
+        help='Do not mark the rule prompt for provider-side prompt caching'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always call the provider instead of reusing cached responses'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='Directory for cached LLM responses (default: ~/.cache/secure-flow/responses)'
+    )
+    parser.add_argument(
+        '-i', '--incremental',
+        action='store_true',
+        help='Only re-analyse chunks whose files changed since the last run of this rule'
+    )
+    parser.add_argument(
+        '--manifest-dir',
+        help='Directory for incremental findings manifests (default: .secure-flow/manifests)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Print each chunk and summary as it is generated'
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=['text', 'jsonl', 'sarif'],
+        default='text',
+        help='Output format: the model\'s report as text, or schema-validated findings as JSON Lines or SARIF (default: text)'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='Write findings to this file instead of stdout (with --format jsonl or sarif)'
+    )
+    parser.add_argument(
+        '--summarize',
+        action='store_true',
+        help='Combine the results of a rule run in several chunks with model calls instead of merging its findings locally'
+    )
+    parser.add_argument(
+        '--prefilter',
+        action='store_true',
+        help="Only send files matching the rule's relevance signals (include globs, keywords, patterns); may drop relevant files"
+    )
+    # Sending every file in the rule's languages is the default; kept so existing scripts still work
+    parser.add_argument('--no-prefilter', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--top-files',
+        type=int,
+        help='Send at most this many files per rule, ranked by lexical relevance to the rule (BM25); implies --prefilter'
+    )
+    parser.add_argument(
+        '--diff',
+        metavar='RANGE',
+        help='Only scan what changed in a git revision range (base..head, base...head, or base against the working tree)'
+    )
+    parser.add_argument(
+        '--diff-context',
+        dest='diff_window',
+        type=int,
+        default=10,
+        help='Unchanged lines sent on each side of a changed range with --diff (default: 10)'
+    )
+    parser.add_argument(
+        '--telemetry',
+        dest='telemetry_output',
+        metavar='FILE',
+        help='Write phase timings, token usage, cost estimates and latency histograms to this file'
+    )
+    parser.add_argument(
+        '--telemetry-format',
+        choices=['json', 'otlp'],
+        default='json',
+        help='Telemetry file format: a JSON report, or OTLP/JSON traces for OpenTelemetry (default: json)'
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for every command"""
     parser = argparse.ArgumentParser(
         description="Secure Flow CLI - Manage and execute security rules",
         formatter_class=argparse.RawDescriptionHelpFormatter
@@ -21,6 +196,16 @@ def main():
         action='version',
         version='%(prog)s 1.0.0'
     )
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help='Run in this process even if a secure-flow daemon is running'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='Profile the command with cProfile and write the statistics to this file (implies --no-daemon)'
+    )
     
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
@@ -35,12 +220,7 @@ def main():
         required=True,
         help='Description of the rule'
     )
-    create_parser.add_argument(
-        '-f', '--files',
-        action='append',
-        default=[],
-        help='Specific files to include as context (can be used multiple times)'
-    )
+    _add_input_options(create_parser)
     create_parser.add_argument(
         '-t', '--llm-token',
         help='LLM API token (or set ANTHROPIC_API_KEY/OPENAI_API_KEY env var)'
@@ -51,6 +231,10 @@ def main():
         choices=['anthropic', 'openai'],
         help='LLM provider (default: anthropic)'
     )
+    create_parser.add_argument(
+        '-m', '--model',
+        help='Model name (default: claude-3-5-sonnet-20241022 for anthropic, gpt-4 for openai)'
+    )
     create_parser.add_argument(
         '-l', '--languages',
         action='append',
@@ -60,64 +244,255 @@ def main():
         '-o', '--output',
         help='Output file path (default: auto-generated from rule_name)'
     )
+    create_parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always call the provider instead of reusing cached responses'
+    )
+    create_parser.add_argument(
+        '--cache-dir',
+        help='Directory for cached LLM responses (default: ~/.cache/secure-flow/responses)'
+    )
+    create_parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Print the rule as it is generated'
+    )
     
     # Validate command
     validate_parser = subparsers.add_parser('validate', help='Validate all rule files')
+    validate_parser.add_argument(
+        'paths',
+        nargs='*',
+        help='Rule files to validate (default: all rules), e.g. the staged files in a pre-commit hook'
+    )
+    validate_parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=['text', 'json', 'sarif', 'junit'],
+        default='text',
+        help='Output format (default: text)'
+    )
+    validate_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        help='Worker processes for validating many files (default: CPU count)'
+    )
+    validate_parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Re-validate files even if their content was already found valid'
+    )
+    
+    # Sync command
+    sync_parser = subparsers.add_parser('sync', help='Regenerate the Cursor commands of rules that changed')
+    sync_parser.add_argument(
+        '--check',
+        action='store_true',
+        help='Only report out-of-date commands, exiting 1 if there are any (e.g. in CI)'
+    )
+    sync_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Regenerate every command, not only those whose rule changed'
+    )
+    sync_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        help='Worker threads writing commands (default: CPU count + 4, at most 32)'
+    )
     
     # Run command
     run_parser = subparsers.add_parser('run', help='Run a specific rule manually with LLM assistance')
-    run_parser.add_argument('rule_id', help='ID of the rule to run')
+    run_parser.add_argument('rule_id', nargs='?', help='ID of the rule to run')
     run_parser.add_argument(
-        '-f', '--files',
-        action='append',
-        default=[],
-        help='Specific files to include as context (can be used multiple times)'
-    )
-    run_parser.add_argument(
-        '-t', '--llm-token',
-        help='LLM API token (or set ANTHROPIC_API_KEY/OPENAI_API_KEY env var)'
+        '--rules',
+        help='Comma-separated rule IDs to run together in one batch, instead of rule_id'
     )
-    run_parser.add_argument(
-        '-p', '--provider',
-        default='anthropic',
-        choices=['anthropic', 'openai'],
-        help='LLM provider (default: anthropic)'
+    _add_run_options(run_parser)
+    run_parser.set_defaults(command_parser=run_parser)
+    
+    # Run-all command
+    run_all_parser = subparsers.add_parser('run-all', help='Run all rules (or a subset) in one batch')
+    run_all_parser.add_argument(
+        '--rules',
+        help='Comma-separated rule IDs to run (default: all rules)'
     )
+    _add_run_options(run_all_parser)
     
-    args = parser.parse_args()
+    # Serve command
+    serve_parser = subparsers.add_parser('serve', help='Run a long-lived daemon that serves list, validate and run')
+    serve_parser.add_argument(
+        '--socket',
+        help='Unix socket to listen on (default: ~/.cache/secure-flow/daemon.sock)'
+    )
+    serve_parser.add_argument(
+        '--port',
+        type=int,
+        help='Listen for HTTP on this TCP port instead of a Unix socket'
+    )
+    serve_parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Loopback address to bind with --port (default: 127.0.0.1)'
+    )
+    serve_parser.add_argument(
+        '--max-jobs',
+        type=int,
+        default=4,
+        help='Commands executed at once; further requests wait in a queue (default: 4)'
+    )
     
+    return parser
+
+
+def dispatch(args: argparse.Namespace, parser: argparse.ArgumentParser) -> int:
+    """Run the command selected by parsed arguments"""
     if not args.command:
         parser.print_help()
         return 1
     
+    if args.command == 'run' and args.rule_id and args.rules:
+        args.command_parser.error('give either a rule_id or --rules, not both')
+    
     # Route to appropriate command handler
     if args.command == 'list':
-        return list_rules()
+        return commands.list_rules()
     elif args.command == 'create':
         # Set default languages if none provided
         languages = args.languages if args.languages else ['python', 'javascript', 'typescript']
-        return create_rule(
+        return commands.create_rule(
             rule_name=args.rule_name,
             description=args.description,
             files=args.files,
+            paths=args.paths,
+            include=args.include,
+            exclude=args.exclude,
+            max_file_size=args.max_file_size,
             llm_token=args.llm_token,
             provider=args.provider,
+            model=args.model,
             languages=languages,
-            output=args.output
+            output=args.output,
+            no_cache=args.no_cache,
+            cache_dir=args.cache_dir,
+            stream=args.stream
         )
     elif args.command == 'validate':
-        return validate_rules()
-    elif args.command == 'run':
-        return run_rule(
+        return commands.validate_rules(
+            paths=args.paths,
+            output_format=args.output_format,
+            jobs=args.jobs,
+            no_cache=args.no_cache
+        )
+    elif args.command == 'sync':
+        return commands.sync_cursor_commands(
+            check=args.check,
+            force=args.force,
+            jobs=args.jobs
+        )
+    elif args.command == 'run' and not args.rules:
+        if not args.rule_id:
+            args.command_parser.error('a rule_id or --rules is required')
+        return commands.run_rule(
             rule_id=args.rule_id,
             files=args.files,
+            paths=args.paths,
+            include=args.include,
+            exclude=args.exclude,
+            max_file_size=args.max_file_size,
             llm_token=args.llm_token,
-            provider=args.provider
+            provider=args.provider,
+            model=args.model,
+            concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_retries=args.max_retries,
+            no_resume=args.no_resume,
+            no_prompt_cache=args.no_prompt_cache,
+            timeout=args.timeout,
+            http2=args.http2,
+            no_cache=args.no_cache,
+            cache_dir=args.cache_dir,
+            incremental=args.incremental,
+            manifest_dir=args.manifest_dir,
+            stream=args.stream,
+            output_format=args.output_format,
+            output=args.output,
+            summarize=args.summarize,
+            prefilter=args.prefilter and not args.no_prefilter,
+            top_files=args.top_files,
+            telemetry_output=args.telemetry_output,
+            telemetry_format=args.telemetry_format,
+            diff=args.diff,
+            diff_window=args.diff_window
+        )
+    elif args.command in ('run', 'run-all'):
+        rule_ids = [rule_id.strip() for rule_id in args.rules.split(',') if rule_id.strip()] if args.rules else None
+        return commands.run_all_rules(
+            rule_ids=rule_ids,
+            files=args.files,
+            paths=args.paths,
+            include=args.include,
+            exclude=args.exclude,
+            max_file_size=args.max_file_size,
+            llm_token=args.llm_token,
+            provider=args.provider,
+            model=args.model,
+            concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_retries=args.max_retries,
+            no_resume=args.no_resume,
+            no_prompt_cache=args.no_prompt_cache,
+            timeout=args.timeout,
+            http2=args.http2,
+            no_cache=args.no_cache,
+            cache_dir=args.cache_dir,
+            incremental=args.incremental,
+            manifest_dir=args.manifest_dir,
+            stream=args.stream,
+            output_format=args.output_format,
+            output=args.output,
+            summarize=args.summarize,
+            prefilter=args.prefilter and not args.no_prefilter,
+            top_files=args.top_files,
+            telemetry_output=args.telemetry_output,
+            telemetry_format=args.telemetry_format,
+            diff=args.diff,
+            diff_window=args.diff_window
+        )
+    elif args.command == 'serve':
+        return commands.serve(
+            socket_path=args.socket,
+            host=args.host,
+            port=args.port,
+            max_jobs=args.max_jobs
         )
     else:
         parser.print_help()
         return 1
 
 
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main CLI entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    # Hand the command to a running daemon, which has everything loaded already
+    if not args.no_daemon and not args.profile:
+        from .core.daemon import DAEMON_COMMANDS, forward_to_daemon
+        if args.command in DAEMON_COMMANDS:
+            exit_code = forward_to_daemon(sys.argv[1:] if argv is None else argv)
+            if exit_code is not None:
+                return exit_code
+    
+    if args.profile:
+        from .core.telemetry import Profiler
+        with Profiler().running(args.profile):
+            return dispatch(args, parser)
+    return dispatch(args, parser)
+
+
 if __name__ == '__main__':
     sys.exit(main())
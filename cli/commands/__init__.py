@@ -1,10 +1,24 @@
 """
 Command handlers for Secure Flow CLI
 """
-from .list import list_rules
-from .create import create_rule
-from .validate import validate_rules
-from .run import run_rule
+import importlib
 
-__all__ = ['list_rules', 'create_rule', 'validate_rules', 'run_rule']
+# Each handler's module is only imported when the handler is first accessed,
+# so a subcommand never pays for the dependencies of the others
+_COMMAND_MODULES = {
+    'list_rules': '.list',
+    'create_rule': '.create',
+    'validate_rules': '.validate',
+    'sync_cursor_commands': '.sync',
+    'run_rule': '.run',
+    'run_all_rules': '.run_all',
+    'serve': '.serve',
+}
 
+__all__ = ['list_rules', 'create_rule', 'validate_rules', 'sync_cursor_commands', 'run_rule', 'run_all_rules', 'serve']
+
+
+def __getattr__(name):
+    if name in _COMMAND_MODULES:
+        return getattr(importlib.import_module(_COMMAND_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
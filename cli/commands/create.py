@@ -6,7 +6,11 @@ from pathlib import Path
 from typing import List, Optional
 
 from ..core.config import CURSOR_COMMANDS_DIR, RULES_DIR
+from ..core.cache import ResponseCache
+from ..core.cursor_commands import SyncState, write_command
 from ..core.llm_client import LLMClient
+from ..core.streaming import StreamPrinter
+from ..core.walker import DEFAULT_MAX_FILE_SIZE, collect_codebase_context
 
 
 def create_rule(
@@ -16,24 +20,31 @@ def create_rule(
     llm_token: Optional[str],
     provider: str,
     languages: List[str],
-    output: Optional[str]
+    output: Optional[str],
+    no_cache: bool = False,
+    cache_dir: Optional[str] = None,
+    model: Optional[str] = None,
+    stream: bool = False,
+    paths: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE
 ) -> int:
     """Create a new rule with LLM assistance using codebase context"""
     
     # Read file contents
     files_content = {}
-    if files:
-        for filepath in files:
-            file_path = Path(filepath)
-            if not file_path.exists():
-                print(f"Warning: File not found: {filepath}", file=sys.stderr)
-                continue
-            
-            try:
-                content = file_path.read_text()
-                files_content[str(file_path)] = content
-            except Exception as e:
-                print(f"Warning: Could not read {filepath}: {e}", file=sys.stderr)
+    if files or paths:
+        files_content = collect_codebase_context(
+            files,
+            paths=paths,
+            include=include,
+            exclude=exclude,
+            languages=languages,
+            max_file_size=max_file_size,
+            # Contents are only read when the prompt is built
+            lazy=True
+        )
     
     if not files_content:
         print("No valid files provided. Creating rule without codebase context.", file=sys.stderr)
@@ -41,13 +52,22 @@ def create_rule(
     # Generate rule with LLM
     try:
         print(f"Generating rule '{rule_name}' using {provider}...")
-        llm = LLMClient(provider=provider, api_key=llm_token)
+        llm = LLMClient(
+            provider=provider,
+            api_key=llm_token,
+            model=model,
+            cache=None if no_cache else ResponseCache(Path(cache_dir) if cache_dir else None)
+        )
+        printer = StreamPrinter() if stream else None
         rule_content = llm.generate_rule(
             rule_name=rule_name,
             description=description,
             files_content=files_content,
-            languages=languages
+            languages=languages,
+            on_token=printer.write if printer else None
         )
+        if printer:
+            printer.finish()
     except Exception as e:
         print(f"Error generating rule: {e}", file=sys.stderr)
         return 1
@@ -70,41 +90,15 @@ def create_rule(
         print(f"Error writing rule file: {e}", file=sys.stderr)
         return 1
     
-    # Generate and write cursor command file
+    # Translate the rule into its cursor command locally; no second model call is needed
     try:
-        print(f"Generating cursor command file using {provider}...")
-        
-        # Determine cursor command filename - use the same name as the rule file that was created
-        rule_filename = output_path.stem  # Get filename without extension
-        cursor_command_name = rule_filename  # Use the same name as the rule file
-        
-        cursor_command_path = CURSOR_COMMANDS_DIR / f"{cursor_command_name}.md"
-        
-        # Ensure cursor commands directory exists
-        CURSOR_COMMANDS_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Generate cursor command content using AI
-        cursor_command_content = llm.generate_cursor_command(rule_content, rule_name)
-        
-        # Remove markdown code block wrapper if present
-        content = cursor_command_content.strip()
-        if content.startswith('```markdown'):
-            content = content[11:]  # Remove ```markdown
-        elif content.startswith('```'):
-            content = content[3:]  # Remove ```
-        
-        # Remove trailing ```
-        if content.endswith('```'):
-            content = content[:-3]
-        
-        cursor_command_content = content.strip()
-        
-        # Write cursor command file
-        cursor_command_path.write_text(cursor_command_content)
+        # Recorded so a later `sync` knows this command is current
+        state = SyncState(CURSOR_COMMANDS_DIR)
+        cursor_command_path = write_command(output_path, rule_content, CURSOR_COMMANDS_DIR, state)
+        state.save()
         print(f"✅ Cursor command created successfully: {cursor_command_path}")
         return 0
     except Exception as e:
         print(f"Warning: Error creating cursor command file: {e}", file=sys.stderr)
         # Don't fail the whole operation if cursor command creation fails
         return 0
-
@@ -2,11 +2,9 @@
 List command - List all existing rules
 """
 import sys
-import yaml
-import re
-from pathlib import Path
 
 from ..core.config import RULES_DIR
+from ..core.rules import get_rule_index
 
 
 def list_rules() -> int:
@@ -15,7 +13,8 @@ def list_rules() -> int:
         print("Rules directory not found!", file=sys.stderr)
         return 1
     
-    rules = sorted(RULES_DIR.glob("*.md"))
+    # Metadata comes from the rule index; only new or changed files are parsed
+    rules = get_rule_index().rules()
     
     if not rules:
         print("No rules found.")
@@ -23,32 +22,16 @@ def list_rules() -> int:
     
     print(f"\nFound {len(rules)} rule(s):\n")
     
-    for rule_file in rules:
-        try:
-            content = rule_file.read_text()
-            
-            # Extract frontmatter
-            if content.startswith('---'):
-                frontmatter_end = content.index('---', 3)
-                frontmatter_text = content[3:frontmatter_end].strip()
-                frontmatter = yaml.safe_load(frontmatter_text)
-                
-                description = frontmatter.get('description', 'No description')
-                languages = ', '.join(frontmatter.get('languages', []))
-                always_apply = frontmatter.get('alwaysApply', False)
-                
-                # Extract rule_id
-                rule_id_match = re.search(r'rule_id:\s*(\S+)', content)
-                rule_id = rule_id_match.group(1) if rule_id_match else rule_file.stem
-                
-                print(f"  📋 {rule_id}")
-                print(f"     Description: {description}")
-                print(f"     Languages: {languages}")
-                print(f"     Always Apply: {always_apply}")
-                print()
-        except Exception as e:
-            print(f"  ⚠️  {rule_file.name} (error reading: {e})")
+    for rule in rules:
+        if rule['error']:
+            print(f"  ⚠️  {rule['file']} (error reading: {rule['error']})")
             print()
+            continue
+        
+        print(f"  📋 {rule['rule_id']}")
+        print(f"     Description: {rule['description']}")
+        print(f"     Languages: {', '.join(rule['languages'])}")
+        print(f"     Always Apply: {rule['alwaysApply']}")
+        print()
     
     return 0
-
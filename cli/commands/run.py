@@ -2,67 +2,166 @@
 Run command - Run a specific rule manually with LLM assistance
 """
 import sys
-from pathlib import Path
 from typing import List, Optional
 
-from ..core.config import RULES_DIR
+from ..core.diff import DEFAULT_DIFF_CONTEXT, DiffError
+from ..core.http_pool import DEFAULT_TIMEOUT
 from ..core.llm_client import LLMClient
+from ..core.rules import load_rule
+from ..core.runner import RuleNotFoundError, build_client, collect_context, execute_plan, open_manifests, plan_jobs, recorded_telemetry, resolve_rule_files, write_empty_findings
+from ..core.streaming import StreamPrinter
+from ..core.walker import DEFAULT_MAX_FILE_SIZE
 
 
 def run_rule(
     rule_id: str,
     files: List[str],
     llm_token: Optional[str],
-    provider: str
+    provider: str,
+    model: Optional[str] = None,
+    concurrency: int = LLMClient.DEFAULT_CONCURRENCY,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    max_retries: int = LLMClient.DEFAULT_MAX_RETRIES,
+    no_resume: bool = False,
+    no_prompt_cache: bool = False,
+    timeout: float = DEFAULT_TIMEOUT,
+    http2: bool = False,
+    no_cache: bool = False,
+    cache_dir: Optional[str] = None,
+    incremental: bool = False,
+    manifest_dir: Optional[str] = None,
+    stream: bool = False,
+    output_format: str = 'text',
+    output: Optional[str] = None,
+    summarize: bool = False,
+    prefilter: bool = False,
+    top_files: Optional[int] = None,
+    telemetry_output: Optional[str] = None,
+    telemetry_format: str = 'json',
+    diff: Optional[str] = None,
+    diff_window: int = DEFAULT_DIFF_CONTEXT,
+    paths: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE
 ) -> int:
     """Run a specific rule manually with LLM assistance"""
     
-    # Find rule file
-    rule_file = RULES_DIR / f"{rule_id}.md"
-    if not rule_file.exists():
-        # Try without prefix
-        rule_file = RULES_DIR / f"secure-flow-{rule_id}.md"
-        if not rule_file.exists():
-            print(f"Error: Rule '{rule_id}' not found in {RULES_DIR}", file=sys.stderr)
-            return 1
+    # Find rule file (with or without the secure-flow- prefix)
+    try:
+        rule_file = resolve_rule_files([rule_id])[0]
+    except RuleNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
     
     # Read rule content
     try:
-        rule_content = rule_file.read_text()
+        rule = load_rule(rule_file)
     except Exception as e:
         print(f"Error reading rule file: {e}", file=sys.stderr)
         return 1
+    descriptions = {rule_file.stem: rule['description']}
     
-    # Read file contents for context
-    codebase_context = {}
-    if files:
-        for filepath in files:
-            file_path = Path(filepath)
-            if not file_path.exists():
-                print(f"Warning: File not found: {filepath}", file=sys.stderr)
-                continue
-            
-            try:
-                content = file_path.read_text()
-                codebase_context[str(file_path)] = content
-            except Exception as e:
-                print(f"Warning: Could not read {filepath}: {e}", file=sys.stderr)
-    else:
-        print("No files specified. Running rule without codebase context.", file=sys.stderr)
-    
-    # Execute rule with LLM
-    try:
-        print(f"Executing rule '{rule_id}' using {provider}...\n")
-        llm = LLMClient(provider=provider, api_key=llm_token)
-        result = llm.run_rule(rule_content, codebase_context)
+    with recorded_telemetry(telemetry_output, telemetry_format) as telemetry:
+        # Read file contents for context; scanned directories only contribute files in the rule's languages
+        if not diff and not files and not paths:
+            print("No files specified. Running rule without codebase context.", file=sys.stderr)
+        try:
+            codebase_context, diff_context = collect_context(
+                files,
+                paths=paths,
+                include=include,
+                exclude=exclude,
+                languages=None if rule['alwaysApply'] else rule['languages'] or None,
+                max_file_size=max_file_size,
+                diff=diff,
+                diff_window=diff_window,
+                telemetry=telemetry
+            )
+        except DiffError as e:
+            print(f"Error: Could not diff {diff}: {e}", file=sys.stderr)
+            return 1
+        if diff_context is not None:
+            print(diff_context.summary(), file=sys.stderr)
+            if not codebase_context:
+                print(f"No changed files in {diff} apply to '{rule_id}'.", file=sys.stderr)
+                write_empty_findings(descriptions, output_format, output)
+                return 0
+        
+        # With --prefilter, leave out files the rule's signals say cannot matter; files named with --files stay
+        plan = plan_jobs(
+            {rule_file.stem: rule},
+            codebase_context,
+            keep=files,
+            prefilter=prefilter,
+            top_files=top_files,
+            # Already applied while collecting
+            filter_languages=False,
+            telemetry=telemetry
+        )
+        summary = plan.prefiltered.summary()
+        if summary:
+            print(summary, file=sys.stderr)
+        if plan.irrelevant:
+            print(f"No files are relevant to '{rule_id}'; run without --prefilter or --top-files to send them anyway.", file=sys.stderr)
+            write_empty_findings(descriptions, output_format, output)
+            return 0
         
+        # Execute rule with LLM; with a structured format stdout only carries findings
+        progress = sys.stdout if output_format == 'text' else sys.stderr
+        try:
+            print(f"Executing rule '{rule_id}' using {provider}...\n", file=progress)
+            llm = build_client(
+                provider,
+                llm_token,
+                model=model,
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                max_retries=max_retries,
+                resume=not no_resume,
+                prompt_caching=not no_prompt_cache,
+                timeout=timeout,
+                http2=http2,
+                cache=not no_cache,
+                cache_dir=cache_dir,
+                telemetry=telemetry
+            )
+            printer = None
+            if stream and output_format == 'text':
+                # Print chunk and summary text as it arrives instead of waiting for the end
+                print("=" * 80)
+                print("RULE EXECUTION RESULT")
+                print("=" * 80)
+                printer = StreamPrinter()
+            outcome = execute_plan(
+                llm,
+                plan,
+                output_format,
+                output,
+                manifests=open_manifests(plan.jobs, manifest_dir) if incremental else None,
+                diff_context=diff_context,
+                on_token=printer,
+                summarize=summarize
+            )
+        except Exception as e:
+            print(f"Error executing rule: {e}", file=sys.stderr)
+            return 1
+    
+    if output_format != 'text':
+        print(outcome.findings, file=sys.stderr)
+        if outcome.rejected:
+            print(f"Warning: {outcome.rejected} finding(s) did not match the findings schema and were dropped", file=sys.stderr)
+    elif printer is not None:
+        printer.finish()
+        print("=" * 80)
+    else:
         print("=" * 80)
         print("RULE EXECUTION RESULT")
         print("=" * 80)
-        print(result)
+        print(outcome.results[rule_file.stem])
         print("=" * 80)
-        return 0
-    except Exception as e:
-        print(f"Error executing rule: {e}", file=sys.stderr)
-        return 1
-
+    if outcome.usage:
+        print(outcome.usage, file=sys.stderr)
+    return 0
@@ -0,0 +1,177 @@
+"""
+Run-all command - Run many rules against one codebase context in a single batch
+"""
+import sys
+from typing import List, Optional
+
+from ..core.diff import DEFAULT_DIFF_CONTEXT, DiffError
+from ..core.http_pool import DEFAULT_TIMEOUT
+from ..core.llm_client import LLMClient
+from ..core.rules import load_rule
+from ..core.runner import RuleNotFoundError, build_client, collect_context, execute_plan, open_manifests, plan_jobs, recorded_telemetry, resolve_rule_files, write_empty_findings
+from ..core.streaming import StreamPrinter
+from ..core.walker import DEFAULT_MAX_FILE_SIZE
+
+
+def run_all_rules(
+    rule_ids: Optional[List[str]],
+    files: List[str],
+    llm_token: Optional[str],
+    provider: str,
+    model: Optional[str] = None,
+    concurrency: int = LLMClient.DEFAULT_CONCURRENCY,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    max_retries: int = LLMClient.DEFAULT_MAX_RETRIES,
+    no_resume: bool = False,
+    no_prompt_cache: bool = False,
+    timeout: float = DEFAULT_TIMEOUT,
+    http2: bool = False,
+    no_cache: bool = False,
+    cache_dir: Optional[str] = None,
+    incremental: bool = False,
+    manifest_dir: Optional[str] = None,
+    stream: bool = False,
+    output_format: str = 'text',
+    output: Optional[str] = None,
+    summarize: bool = False,
+    prefilter: bool = False,
+    top_files: Optional[int] = None,
+    telemetry_output: Optional[str] = None,
+    telemetry_format: str = 'json',
+    diff: Optional[str] = None,
+    diff_window: int = DEFAULT_DIFF_CONTEXT,
+    paths: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE
+) -> int:
+    """Run several rules (all rules by default) in one batch with a shared worker pool"""
+    
+    # Resolve rule files
+    try:
+        rule_files = resolve_rule_files(rule_ids)
+    except RuleNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    
+    # With a structured format stdout only carries findings
+    progress = sys.stdout if output_format == 'text' else sys.stderr
+    
+    if not rule_files:
+        print("No rules found.", file=progress)
+        return 0
+    
+    rules = {}
+    for rule_file in rule_files:
+        try:
+            rules[rule_file.stem] = load_rule(rule_file)
+        except Exception as e:
+            print(f"Error reading rule file {rule_file.name}: {e}", file=sys.stderr)
+            return 1
+    descriptions = {rule_id: rule['description'] for rule_id, rule in rules.items()}
+    
+    with recorded_telemetry(telemetry_output, telemetry_format) as telemetry:
+        # Read file contents once for every rule
+        if not diff and not files and not paths:
+            print("No files specified. Running rules without codebase context.", file=sys.stderr)
+        try:
+            codebase_context, diff_context = collect_context(
+                files,
+                paths=paths,
+                include=include,
+                exclude=exclude,
+                max_file_size=max_file_size,
+                diff=diff,
+                diff_window=diff_window,
+                telemetry=telemetry
+            )
+        except DiffError as e:
+            print(f"Error: Could not diff {diff}: {e}", file=sys.stderr)
+            return 1
+        if diff_context is not None:
+            print(diff_context.summary(), file=sys.stderr)
+            if not codebase_context:
+                print(f"No changed files in {diff}.", file=progress)
+                write_empty_findings(descriptions, output_format, output)
+                return 0
+        
+        # Pair each rule with the files in its languages; files named with --files are never dropped by the pre-filter
+        plan = plan_jobs(rules, codebase_context, keep=files, prefilter=prefilter, top_files=top_files, telemetry=telemetry)
+        if plan.skipped:
+            print(f"Skipping {len(plan.skipped)} rule(s) with no files in their languages: {', '.join(plan.skipped)}", file=sys.stderr)
+        if plan.irrelevant:
+            print(f"Skipping {len(plan.irrelevant)} rule(s) with no relevant files: {', '.join(plan.irrelevant)}", file=sys.stderr)
+        summary = plan.prefiltered.summary(f" ({len(plan.jobs) + len(plan.irrelevant)} rule(s))")
+        if summary:
+            print(summary, file=sys.stderr)
+        skipped = plan.skipped + plan.irrelevant
+        
+        if not plan.jobs:
+            print("No rules apply to the provided files.", file=progress)
+            write_empty_findings(descriptions, output_format, output)
+            return 0
+        
+        # Execute rules with LLM
+        try:
+            print(f"Executing {len(plan.jobs)} rule(s) using {provider}...\n", file=progress)
+            llm = build_client(
+                provider,
+                llm_token,
+                model=model,
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                max_retries=max_retries,
+                resume=not no_resume,
+                prompt_caching=not no_prompt_cache,
+                timeout=timeout,
+                http2=http2,
+                cache=not no_cache,
+                cache_dir=cache_dir,
+                telemetry=telemetry
+            )
+            printer = None
+            if stream and output_format == 'text':
+                # Results are printed as they arrive, so only the trailer follows them
+                print("=" * 80)
+                print(f"RULE EXECUTION RESULTS ({len(plan.jobs)} rule(s))")
+                print("=" * 80)
+                printer = StreamPrinter()
+            outcome = execute_plan(
+                llm,
+                plan,
+                output_format,
+                output,
+                manifests=open_manifests(plan.jobs, manifest_dir) if incremental else None,
+                diff_context=diff_context,
+                on_token=printer,
+                summarize=summarize
+            )
+        except Exception as e:
+            print(f"Error executing rules: {e}", file=sys.stderr)
+            return 1
+    
+    if output_format != 'text':
+        print(outcome.findings, file=sys.stderr)
+        if outcome.rejected:
+            print(f"Warning: {outcome.rejected} finding(s) did not match the findings schema and were dropped", file=sys.stderr)
+        if skipped:
+            print(f"Skipped (no matching files): {', '.join(skipped)}", file=sys.stderr)
+    else:
+        if printer is not None:
+            printer.finish()
+        else:
+            print("=" * 80)
+            print(f"RULE EXECUTION RESULTS ({len(outcome.results)} rule(s))")
+            print("=" * 80)
+            for rule_id, result in outcome.results.items():
+                print(f"\n## {rule_id}\n")
+                print(result)
+                print("\n" + "-" * 80)
+        if skipped:
+            print(f"\nSkipped (no matching files): {', '.join(skipped)}")
+        print("=" * 80)
+    if outcome.usage:
+        print(outcome.usage, file=sys.stderr)
+    return 0
@@ -0,0 +1,47 @@
+"""
+Serve command - Run a long-lived daemon that serves list, validate and run
+"""
+import sys
+from pathlib import Path
+from typing import Optional
+
+from ..core.daemon import DAEMON_SOCKET, DAEMON_TOKEN_FILE
+from ..core.server import create_server, serve_forever, warm_up
+
+
+def serve(
+    socket_path: Optional[str] = None,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+    max_jobs: int = 4
+) -> int:
+    """Serve CLI commands from one warm process until interrupted"""
+    unix_socket = None if port is not None else Path(socket_path) if socket_path else DAEMON_SOCKET
+    
+    try:
+        server = create_server(socket_path=unix_socket, host=host, port=port, max_jobs=max_jobs)
+    except OSError as e:
+        print(f"Error: Could not start the daemon: {e}", file=sys.stderr)
+        return 1
+    
+    warm_up()
+    
+    if unix_socket is None:
+        address = f"http://{host}:{server.server_address[1]}"
+        print(f"Clients must send the token in {DAEMON_TOKEN_FILE} (or SECURE_FLOW_DAEMON_TOKEN) with each request", file=sys.stderr)
+    else:
+        address = str(unix_socket)
+    print(f"secure-flow daemon listening on {address} (up to {max_jobs} concurrent commands)", file=sys.stderr)
+    if unix_socket != DAEMON_SOCKET:
+        print(f"Point the CLI at it with: export SECURE_FLOW_DAEMON={address}", file=sys.stderr)
+    
+    def remove_files():
+        # The socket, or the token that is useless once the daemon stops
+        try:
+            (unix_socket or DAEMON_TOKEN_FILE).unlink()
+        except OSError:
+            pass
+    
+    serve_forever(server, on_stop=remove_files)
+    print("secure-flow daemon stopped", file=sys.stderr)
+    return 0
@@ -0,0 +1,52 @@
+"""
+Sync command - Regenerate the Cursor commands of rules that changed
+"""
+import sys
+from typing import Optional
+
+from ..core.config import CURSOR_COMMANDS_DIR, RULES_DIR
+from ..core.cursor_commands import SyncState, sync_commands
+from ..core.rules import list_rule_files
+
+
+def sync_cursor_commands(
+    check: bool = False,
+    force: bool = False,
+    jobs: Optional[int] = None
+) -> int:
+    """Translate changed rules into .cursor/commands, or with `check` only report what is out of date"""
+    if not RULES_DIR.exists():
+        print(f"Error: Rules directory not found: {RULES_DIR}", file=sys.stderr)
+        return 1
+    
+    state = SyncState(CURSOR_COMMANDS_DIR)
+    try:
+        statuses = sync_commands(
+            list_rule_files(),
+            CURSOR_COMMANDS_DIR,
+            state=state,
+            max_workers=jobs,
+            force=force,
+            check=check
+        )
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error syncing cursor commands: {e}", file=sys.stderr)
+        return 1
+    
+    changed = {name: status for name, status in statuses.items() if status != 'unchanged'}
+    for name, status in changed.items():
+        print(f"{status:>9}  {CURSOR_COMMANDS_DIR / name}")
+    
+    if check:
+        if changed:
+            print(f"\n{len(changed)} cursor command(s) are out of date; run 'sync' to regenerate them", file=sys.stderr)
+            return 1
+        print(f"All {len(statuses)} cursor command(s) are up to date")
+        return 0
+    
+    adopted = sum(1 for status in changed.values() if status == 'adopted')
+    summary = f"\nSync complete: {len(changed) - adopted} changed, {len(statuses) - len(changed)} unchanged"
+    if adopted:
+        summary += f", {adopted} adopted as they are"
+    print(summary)
+    return 0
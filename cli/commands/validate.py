@@ -1,22 +1,48 @@
 """
 Validate command - Validate all rule files
 """
-from ..core.validator import RuleValidator
+from pathlib import Path
+from typing import List, Optional
 
+from ..core.report import VALIDATION_FORMATTERS
+from ..core.validator import RuleValidator, ValidationCache
 
-def validate_rules() -> int:
-    """Validate all rule files"""
-    print("Validating all rule files...\n")
+
+def validate_rules(
+    paths: Optional[List[str]] = None,
+    output_format: str = 'text',
+    jobs: Optional[int] = None,
+    no_cache: bool = False
+) -> int:
+    """Validate all rule files, or only the given ones"""
+    text = output_format == 'text'
+    cache = None if no_cache else ValidationCache()
+    
+    if paths:
+        if text:
+            print(f"Validating {len(paths)} rule file(s)...\n")
+        results = {
+            str(rule_path): result
+            for rule_path, result in RuleValidator.validate_files(
+                [Path(path) for path in paths], max_workers=jobs, cache=cache
+            ).items()
+        }
+    else:
+        if text:
+            print("Validating all rule files...\n")
+        results = RuleValidator.validate_all_rules(max_workers=jobs, cache=cache)
+    
+    valid_count = sum(1 for is_valid, _ in results.values() if is_valid)
+    total_count = len(results)
     
-    results = RuleValidator.validate_all_rules()
+    if not text:
+        print(VALIDATION_FORMATTERS[output_format](dict(sorted(results.items()))))
+        return 0 if valid_count == total_count else 1
     
     if not results:
         print("No rule files found to validate.")
         return 0
     
-    valid_count = sum(1 for is_valid, _ in results.values() if is_valid)
-    total_count = len(results)
-    
     for rule_name, (is_valid, errors) in sorted(results.items()):
         if is_valid:
             print(f"✅ {rule_name}")
@@ -28,4 +54,3 @@ def validate_rules() -> int:
     print(f"\nValidation complete: {valid_count}/{total_count} rules are valid")
     
     return 0 if valid_count == total_count else 1
-
@@ -1,9 +1,21 @@
 """
 Core modules for Secure Flow CLI
 """
+import importlib
+
 from .config import RULES_DIR, SKILL_FILE
-from .validator import RuleValidator
-from .llm_client import LLMClient
 
-__all__ = ['RULES_DIR', 'SKILL_FILE', 'RuleValidator', 'LLMClient']
+# Heavier modules are only imported when first accessed
+_LAZY_EXPORTS = {
+    'RuleValidator': '.validator',
+    'LLMClient': '.llm_client',
+    'AsyncLLMClient': '.async_client',
+}
+
+__all__ = ['RULES_DIR', 'SKILL_FILE', 'RuleValidator', 'LLMClient', 'AsyncLLMClient']
+
 
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,385 @@
+"""
+Asyncio client: awaitable rule execution for services and notebooks
+
+AsyncLLMClient plans, chunks, caches, checkpoints, merges and records usage exactly
+as LLMClient does; only the calls differ. They go through the providers' asyncio SDK
+clients (AsyncAnthropic, AsyncOpenAI), and a rule's chunks are gathered on the event
+loop instead of a thread pool, so one process can serve many concurrent runs. File
+reads and writes (planning, prompt building, response cache, checkpoints and
+manifests) run in the loop's default executor so they never stall other calls:
+
+    async with AsyncLLMClient(provider="anthropic") as llm:
+        results = await asyncio.gather(*(llm.run_rule(rule, context) for rule, context in runs))
+"""
+import asyncio
+import contextvars
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar, Union
+
+from .cache import ResponseCache
+from .checkpoint import RunCheckpoint
+from .llm_client import ChunkPrompt, LLMClient
+from .manifest import FindingsManifest
+
+T = TypeVar('T')
+
+
+class AsyncLLMClient(LLMClient):
+    """LLMClient whose calls are coroutines, for use from an asyncio event loop
+    
+    Takes the same arguments as LLMClient. `concurrency` bounds the calls in flight
+    for each run; runs started concurrently on one client share its connections,
+    rate limiter, response cache and usage totals. Close the client with `aclose()`,
+    or use it as an async context manager.
+    """
+    
+    def _make_client(self) -> Any:
+        # Bound to the event loop it first runs on, so it is owned by this client rather than the pool
+        return self.pool.async_provider_client(self.provider, self.api_key)
+    
+    async def aclose(self) -> None:
+        """Close the SDK client's connections"""
+        await self.client.close()
+    
+    async def __aenter__(self) -> "AsyncLLMClient":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+    
+    async def _offload(self, func: Callable[..., T], *args: Any) -> T:
+        """Run blocking file I/O in the default executor, keeping the caller's context variables"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: context.run(func, *args))
+    
+    async def generate_rule(
+        self,
+        rule_name: str,
+        description: str,
+        files_content: Mapping[str, str],
+        languages: List[str],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """Generate a new rule using LLM, passing text to `on_token` as it streams in"""
+        prompt = self._build_generate_prompt(rule_name, description, files_content, languages)
+        return await self._make_api_call(prompt, 4096, on_token)
+    
+    async def _make_api_call(
+        self,
+        prompt: str,
+        max_tokens: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """Make a single API call to the LLM, answering from the response cache when possible"""
+        if self.cache is None:
+            return await self._request_completion(prompt, max_tokens, on_token, system)
+        
+        key = ResponseCache.make_key(self.provider, self.model, prompt, max_tokens, system)
+        cached = await self._offload(self.cache.get, key)
+        if cached is not None:
+            self.telemetry.annotate(response_cache='hit')
+            if on_token is not None:
+                on_token(cached)
+            return cached
+        
+        result = await self._request_completion(prompt, max_tokens, on_token, system)
+        await self._offload(self.cache.set, key, result)
+        return result
+    
+    async def stream(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the completion for a prompt piece by piece as it arrives"""
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(self.provider, self.model, prompt, max_tokens, system)
+            cached = await self._offload(self.cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+        
+        pieces = []
+        async for text in self._stream_completion(prompt, max_tokens, system):
+            pieces.append(text)
+            yield text
+        
+        if key is not None:
+            await self._offload(self.cache.set, key, "".join(pieces))
+    
+    async def _with_retries(self, send: Callable[[], Awaitable[T]]) -> T:
+        """Await `send()`, retrying transient provider errors with backoff"""
+        attempt = 0
+        while True:
+            try:
+                return await send()
+            except Exception as e:
+                attempt += 1
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+    
+    async def _request_completion(
+        self,
+        prompt: str,
+        max_tokens: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """Send a single completion request to the provider, retrying transient errors"""
+        if on_token is not None:
+            pieces = []
+            async for text in self._stream_completion(prompt, max_tokens, system):
+                pieces.append(text)
+                on_token(text)
+            return "".join(pieces)
+        
+        return await self._with_retries(lambda: self._send_request(prompt, max_tokens, system))
+    
+    async def _acquire_rate_limit(self, system: Optional[str], prompt: str, max_tokens: int) -> None:
+        """Wait for the rate limiter to admit one request, without blocking the event loop"""
+        if not self.rate_limiter.enabled and not self.rate_limiter.paused:
+            return
+        with self.telemetry.span('rate_limit.wait'):
+            await self.rate_limiter.acquire_async(self._estimate_tokens((system or "") + prompt) + max_tokens)
+    
+    async def _send_request(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Send one completion request to the provider"""
+        await self._acquire_rate_limit(system, prompt, max_tokens)
+        
+        with self.telemetry.span('llm.request', provider=self.provider, model=self.model, max_tokens=max_tokens) as span:
+            if self.provider in self.MESSAGES_API_PROVIDERS:
+                message = await self.client.messages.create(**self._anthropic_request(prompt, max_tokens, system))
+                span.set(**self._record_usage(getattr(message, 'usage', None)))
+                return message.content[0].text
+            else:  # openai
+                response = await self.client.chat.completions.create(**self._openai_request(prompt, max_tokens, system))
+                span.set(**self._record_usage(getattr(response, 'usage', None)))
+                return response.choices[0].message.content
+    
+    async def _stream_completion(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a completion, retrying transient errors that occur before any text arrives"""
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async for text in self._open_stream(prompt, max_tokens, system):
+                    emitted = True
+                    yield text
+                return
+            except Exception as e:
+                # Text already passed on cannot be taken back, so only a clean failure is retried
+                if emitted:
+                    raise
+                attempt += 1
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+    
+    async def _open_stream(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Send a streaming completion request to the provider, yielding text as it arrives"""
+        await self._acquire_rate_limit(system, prompt, max_tokens)
+        
+        # Not made current: a generator cannot hold a context variable across its yields
+        span = self.telemetry.start_span('llm.request', provider=self.provider, model=self.model, max_tokens=max_tokens, stream=True)
+        started = time.perf_counter()
+        first_token = True
+        try:
+            if self.provider in self.MESSAGES_API_PROVIDERS:
+                async with self.client.messages.stream(**self._anthropic_request(prompt, max_tokens, system)) as stream:
+                    async for text in stream.text_stream:
+                        if first_token:
+                            span.set(time_to_first_token_s=time.perf_counter() - started)
+                            first_token = False
+                        yield text
+                    span.set(**self._record_usage(getattr(await stream.get_final_message(), 'usage', None)))
+            else:  # openai
+                response = await self.client.chat.completions.create(**self._openai_request(prompt, max_tokens, system, stream=True))
+                async for chunk in response:
+                    if getattr(chunk, 'usage', None) is not None:
+                        span.set(**self._record_usage(chunk.usage))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            span.set(time_to_first_token_s=time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+        except GeneratorExit:
+            # The consumer stopped reading early
+            span.end()
+            raise
+        except BaseException as e:
+            span.end(e)
+            raise
+        span.end()
+    
+    async def _run_prompt(
+        self,
+        label: str,
+        prompt: str,
+        announce: bool = True,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        system: Optional[str] = None,
+        kind: str = 'chunk'
+    ) -> str:
+        """Execute one prompt of the map (`kind` 'chunk') or reduce ('reduce') phase"""
+        input_tokens = self._estimate_tokens((system or "") + prompt)
+        max_tokens = self._calculate_max_tokens(input_tokens)
+        
+        if announce:
+            sys.stderr.write(f"Processing {label}...\n")
+        
+        stream_to = None
+        if on_token is not None:
+            stream_to = lambda text: on_token(label, text)
+        with self.telemetry.span(f'llm.{kind}', label=label, estimated_input_tokens=input_tokens):
+            return await self._make_api_call(prompt, max_tokens, stream_to, system)
+    
+    async def _map_prompts(
+        self,
+        items: List[Tuple[str, str, Union[str, ChunkPrompt]]],
+        announce: bool = True,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        checkpoint: Optional[RunCheckpoint] = None,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        kind: str = 'chunk'
+    ) -> List[str]:
+        """Run (label, system, prompt) items concurrently on the event loop, returning results in item order
+        
+        At most `concurrency` items are in flight, so at most that many ChunkPrompts
+        are built at once. Otherwise as LLMClient._map_prompts.
+        """
+        slots = asyncio.Semaphore(self.concurrency)
+        
+        async def run_item(index: int, label: str, system: str, prompt: Union[str, ChunkPrompt]) -> str:
+            async with slots:
+                if isinstance(prompt, ChunkPrompt):
+                    # Reads the chunk's files
+                    prompt = await self._offload(prompt.build)
+                result = await self._offload(checkpoint.get, prompt, system) if checkpoint is not None else None
+                if result is not None:
+                    if on_token is not None:
+                        on_token(label, result)
+                else:
+                    result = await self._run_prompt(label, prompt, announce, on_token, system, kind)
+                    if checkpoint is not None:
+                        await self._offload(checkpoint.record, prompt, result, system)
+            if on_result is not None:
+                on_result(index, result)
+            return result
+        
+        # A failed item does not cancel the others, so their results still reach the checkpoint
+        outcomes = await asyncio.gather(
+            *(run_item(i, label, system, prompt) for i, (label, system, prompt) in enumerate(items)),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return outcomes
+    
+    async def _run_chunks(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        manifests: Optional[Dict[str, FindingsManifest]] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        structured: bool = False,
+        on_result: Optional[Callable[[str, str], None]] = None,
+        merge_locally: bool = False
+    ) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, List[str]], Optional[RunCheckpoint]]:
+        """Plan and run the chunk calls of several rules (the map phase)"""
+        # Planning reads and counts the tokens of every file, and finishing saves the manifests
+        plan = await self._offload(self._plan_map, jobs, manifests, structured, on_result, merge_locally)
+        plan.replay_stored(on_token, on_result)
+        with self.telemetry.span('map', calls=len(plan.items)):
+            mapped = await self._map_prompts(plan.items, plan.announce, on_token, plan.checkpoint, plan.item_done)
+        return await self._offload(plan.finish, mapped)
+    
+    async def _reduce_results(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        pending: Dict[str, List[str]],
+        on_token: Optional[Callable[[str, str], None]] = None,
+        checkpoint: Optional[RunCheckpoint] = None
+    ) -> Dict[str, str]:
+        """Tree-reduce the chunk results of each rule until one result remains"""
+        reduced = {}
+        level = 0
+        
+        while pending:
+            level += 1
+            items, owners, carried, announce = self._plan_reduce_level(jobs, pending, level)
+            merged = await self._map_prompts(items, announce, on_token, checkpoint, kind='reduce')
+            pending = self._apply_reduce_level(owners, merged, reduced, carried)
+        
+        return reduced
+    
+    async def run_rule(
+        self,
+        rule_content: str,
+        codebase_context: Mapping[str, str],
+        manifest: Optional[FindingsManifest] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        summarize: bool = False
+    ) -> str:
+        """Execute a rule with codebase context; arguments are as in LLMClient.run_rule"""
+        manifests = {"": manifest} if manifest is not None else None
+        results = await self.run_rules({"": (rule_content, codebase_context)}, manifests, on_token, summarize)
+        return results[""]
+    
+    async def stream_rule(self, rule_content: str, codebase_context: Mapping[str, str]) -> AsyncIterator[Tuple[str, str]]:
+        """Execute a rule, yielding (label, text) pieces of every chunk and summary as they arrive"""
+        pieces = asyncio.Queue()
+        done = object()
+        
+        async def execute():
+            try:
+                await self.run_rule(rule_content, codebase_context, on_token=lambda label, text: pieces.put_nowait((label, text)))
+            finally:
+                pieces.put_nowait(done)
+        
+        task = asyncio.ensure_future(execute())
+        try:
+            while True:
+                piece = await pieces.get()
+                if piece is done:
+                    break
+                yield piece
+            # Raises the run's error, if it failed
+            await task
+        finally:
+            # The consumer stopped reading early
+            if not task.done():
+                task.cancel()
+    
+    async def run_rules(
+        self,
+        jobs: Dict[str, Tuple[str, Mapping[str, str]]],
+        manifests: Optional[Dict[str, FindingsManifest]] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        summarize: bool = False
+    ) -> Dict[str, str]:
+        """Execute several rules, gathering every (rule, chunk) call on the event loop
+        
+        Arguments and results are as in LLMClient.run_rules.
+        """
+        plans, results, checkpoint = await self._run_chunks(jobs, manifests, on_token, merge_locally=not summarize)
+        
+        pending = {rule_id: results[rule_id] for rule_id, chunks in plans.items() if len(chunks) > 1}
+        if summarize:
+            with self.telemetry.span('reduce', rules=len(pending)):
+                summaries = await self._reduce_results(jobs, pending, on_token, checkpoint)
+        else:
+            summaries = self._merge_pending(jobs, pending, on_token)
+        return await self._offload(self._finish_run, jobs, results, summaries, checkpoint)
+    
+    async def run_rules_structured(
+        self,
+        jobs: Dict[str, Tuple[str, Mapping[str, str]]],
+        on_result: Callable[[str, str], None],
+        manifests: Optional[Dict[str, FindingsManifest]] = None
+    ) -> None:
+        """Execute several rules for structured findings; `on_result` is called on the event loop"""
+        _, _, checkpoint = await self._run_chunks(jobs, manifests, structured=True, on_result=on_result)
+        if checkpoint is not None:
+            await self._offload(checkpoint.complete)
@@ -0,0 +1,131 @@
+"""
+Content-addressed on-disk cache for LLM responses
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .config import CACHE_DIR
+
+
+class ResponseCache:
+    """Stores LLM responses on disk keyed by a hash of the request"""
+    
+    DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024  # 256 MB
+    DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60  # 30 days
+    # A long-lived cache (e.g. in the daemon) evicts again after writing this share of its
+    # size limit, or after this long, so it stays bounded without scanning on every write
+    EVICT_AFTER_WRITTEN_FRACTION = 0.1
+    EVICT_INTERVAL_SECONDS = 60 * 60
+    
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else CACHE_DIR / "responses"
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        # Bytes written, and monotonic time, since the last eviction (None before the first)
+        self._written_since_eviction = 0
+        self._last_eviction: Optional[float] = None
+    
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Build the cache key for a request, including its system prompt"""
+        payload = json.dumps([provider, model, system, prompt, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _entry_path(self, key: str) -> Path:
+        # Shard by key prefix so no single directory grows too large
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss"""
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        
+        if time.time() - entry.get('created', 0) > self.max_age_seconds:
+            self._remove(path)
+            return None
+        
+        # Refresh mtime so size-based eviction drops least recently used entries first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('response')
+    
+    def set(self, key: str, response: str) -> None:
+        """Store a response under `key`"""
+        path = self._entry_path(key)
+        entry = json.dumps({'created': time.time(), 'response': response}, ensure_ascii=False)
+        
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so concurrent readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(entry)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        
+        # Evict on the first write, then whenever enough was written or enough time passed
+        with self._lock:
+            self._written_since_eviction += len(entry.encode('utf-8'))
+            now = time.monotonic()
+            if self._last_eviction is not None and (
+                self._written_since_eviction < self.max_size_bytes * self.EVICT_AFTER_WRITTEN_FRACTION
+                and now - self._last_eviction < self.EVICT_INTERVAL_SECONDS
+            ):
+                return
+            self._written_since_eviction = 0
+            self._last_eviction = now
+        self.evict()
+    
+    def evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        if not self.cache_dir.exists():
+            return
+        
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+    
+    def clear(self) -> None:
+        """Remove every cached response"""
+        for path in self.cache_dir.glob("*/*.json"):
+            self._remove(path)
+    
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
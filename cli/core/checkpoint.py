@@ -0,0 +1,80 @@
+"""
+Checkpoints of completed LLM calls so a failed run can resume
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import CACHE_DIR
+
+CHECKPOINT_DIR = CACHE_DIR / "checkpoints"
+
+
+class RunCheckpoint:
+    """Append-only record of the results of one run's completed calls
+
+    Each completed call is appended as one JSON line as soon as it finishes, so a
+    run that fails part way keeps everything already paid for. Rerunning the same
+    work picks those results up; the file is removed once the run succeeds.
+    """
+
+    def __init__(self, run_key: str, checkpoint_dir: Optional[Path] = None):
+        self.path = Path(checkpoint_dir or CHECKPOINT_DIR) / f"{run_key}.jsonl"
+        self._lock = threading.Lock()
+        self._results = self._load()
+        self.resumed = len(self._results)
+
+    @staticmethod
+    def run_key(provider: str, model: str, prompts: List[Tuple[Optional[str], str]]) -> str:
+        """Identify a run by everything it will send to the provider, as (system, prompt) pairs"""
+        digest = hashlib.sha256(json.dumps([provider, model]).encode('utf-8'))
+        for system, prompt in prompts:
+            digest.update(RunCheckpoint.item_key(prompt, system).encode('ascii'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def item_key(prompt: str, system: Optional[str] = None) -> str:
+        return hashlib.sha256(json.dumps([system, prompt], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _load(self) -> Dict[str, str]:
+        results = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves a partial last line
+                        continue
+                    results[record['key']] = record['result']
+        except OSError:
+            pass
+        return results
+
+    def get(self, prompt: str, system: Optional[str] = None) -> Optional[str]:
+        """Return the result recorded for a prompt, if any"""
+        with self._lock:
+            return self._results.get(self.item_key(prompt, system))
+
+    def record(self, prompt: str, result: str, system: Optional[str] = None) -> None:
+        """Append the result of a completed call"""
+        key = self.item_key(prompt, system)
+        line = json.dumps({'key': key, 'result': result}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._results[key] = result
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def complete(self) -> None:
+        """Discard the checkpoint once the run has finished"""
+        with self._lock:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
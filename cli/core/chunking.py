@@ -0,0 +1,189 @@
+"""
+Chunk planning: pack codebase files into as few prompt-sized chunks as possible
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# Lines repeated between consecutive windows of an oversized file
+DEFAULT_OVERLAP_LINES = 20
+
+
+def _split_long_line(line: str, max_chars: int) -> List[str]:
+    """Hard-split a single line (e.g. minified code) that exceeds a window on its own"""
+    return [line[i:i + max_chars] for i in range(0, len(line), max_chars)]
+
+
+def number_lines(filepath: str, text: str, first_line: int) -> str:
+    """Prefix each line of a window with its line number in the file, as diff excerpts are"""
+    lines = text.splitlines()
+    last_line = first_line + max(len(lines), 1) - 1
+    width = len(str(last_line))
+    out = [
+        f"# Lines {first_line}-{last_line} of {filepath}. "
+        f"Each line starts with its line number in the file; report findings with these numbers."
+    ]
+    out += [f"{number:>{width}} | {line}" for number, line in enumerate(lines, first_line)]
+    return "\n".join(out) + "\n"
+
+
+class ContextChunk(Mapping[str, str]):
+    """The files (or line-range windows of files) of one chunk, read from the codebase context on access
+
+    A chunk only refers to its files, so planning a lazily read context keeps no
+    content in memory; each file is read when the chunk's prompt is built. The lines
+    of a window are numbered as in the file (see number_lines).
+    """
+
+    def __init__(
+        self,
+        source: Mapping[str, str],
+        members: Dict[str, Tuple[str, Optional[int], Optional[int]]],
+        windows: Optional[Dict[str, Tuple[str, int, int]]] = None
+    ):
+        self.source = source
+        # Label -> (file path, first character, end character); a whole file has no range
+        self.members = members
+        # Label of each window -> (file path, first line, last line), to place its findings in the file
+        self.windows = windows or {}
+
+    def __getitem__(self, label: str) -> str:
+        filepath, start, end = self.members[label]
+        content = self.source[filepath]
+        if start is None:
+            return content
+        return number_lines(filepath, content[start:end], self.windows[label][1])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.members)
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __contains__(self, label: object) -> bool:
+        return label in self.members
+
+
+def split_into_windows(
+    filepath: str,
+    content: str,
+    max_tokens: int,
+    measure: Callable[[str, str], int],
+    overlap_lines: int = DEFAULT_OVERLAP_LINES
+) -> List[Tuple[str, int, int, int, int]]:
+    """Split an oversized file into overlapping line-range windows that each fit `max_tokens`
+
+    Returns (label, start, end, first line, last line) tuples, where the label names
+    the file and its line range and the window's text is content[start:end]. The
+    budget allows for the line numbers the window is sent with.
+    """
+    total_tokens = max(1, measure(filepath, content))
+    # Size windows in characters using the file's own characters-per-token ratio
+    chars_per_token = max(len(content), 1) / total_tokens
+    max_chars = max(1, int(max_tokens * chars_per_token * 0.95))
+    # Characters the line number adds to each line ("  123 | ")
+    number_chars = len(str(content.count('\n') + 1)) + 3
+
+    # Character offset at which each line (or piece of a hard-split line) starts, and its line number
+    offsets = []
+    line_numbers = []
+    position = 0
+    for number, line in enumerate(content.splitlines(keepends=True), 1):
+        for piece in _split_long_line(line, max(1, max_chars - number_chars)) if len(line) + number_chars > max_chars else [line]:
+            offsets.append(position)
+            line_numbers.append(number)
+            position += len(piece)
+    offsets.append(position)
+    lines = len(offsets) - 1
+
+    windows = []
+    start = 0
+    while start < lines:
+        end = start
+        while end < lines and (offsets[end + 1] - offsets[start] + (end + 1 - start) * number_chars <= max_chars or end == start):
+            end += 1
+
+        first_line, last_line = line_numbers[start], line_numbers[end - 1]
+        windows.append((f"{filepath} (lines {first_line}-{last_line})", offsets[start], offsets[end], first_line, last_line))
+        if end >= lines:
+            break
+        # Step back for overlap, but always make progress
+        start = max(start + 1, end - overlap_lines)
+
+    return windows
+
+
+def plan_chunks(
+    codebase_context: Mapping[str, str],
+    max_tokens_per_chunk: int,
+    measure: Callable[[str, str], int],
+    overlap_lines: int = DEFAULT_OVERLAP_LINES,
+    file_tokens: Optional[Mapping[str, int]] = None
+) -> List[ContextChunk]:
+    """Bin-pack files into chunks that fit within `max_tokens_per_chunk`
+
+    `measure(label, text)` returns the tokens one file contributes to a prompt.
+    Files of the same directory are placed together when the whole directory fits
+    in a chunk; otherwise files are packed first-fit-decreasing. Files larger than a
+    chunk are split into overlapping line-range windows instead of being truncated.
+    `file_tokens` may hold what `measure` returned for each file when the caller sized
+    the context; then only files that must be split are read here. Otherwise each
+    file is read once. No content is kept.
+    """
+    if not codebase_context:
+        return [ContextChunk(codebase_context, {})]
+
+    # Expand the input into (order, label, member, tokens) pieces grouped by directory
+    groups: Dict[str, List[Tuple[int, str, Tuple[str, Optional[int], Optional[int]], int]]] = {}
+    windows: Dict[str, Tuple[str, int, int]] = {}
+    order = 0
+    for filepath in codebase_context:
+        content = None
+        tokens = file_tokens.get(filepath) if file_tokens is not None else None
+        if tokens is None:
+            content = codebase_context[filepath]
+            tokens = measure(filepath, content)
+        if tokens > max_tokens_per_chunk:
+            if content is None:
+                content = codebase_context[filepath]
+            pieces = []
+            for label, start, end, first_line, last_line in split_into_windows(filepath, content, max_tokens_per_chunk, measure, overlap_lines):
+                windows[label] = (filepath, first_line, last_line)
+                pieces.append((label, (filepath, start, end), measure(label, number_lines(filepath, content[start:end], first_line))))
+        else:
+            pieces = [(filepath, (filepath, None, None), tokens)]
+
+        directory = str(Path(filepath).parent)
+        for label, member, piece_tokens in pieces:
+            groups.setdefault(directory, []).append((order, label, member, piece_tokens))
+            order += 1
+
+    bins: List[Tuple[List[int], List[Tuple[int, str, Tuple[str, Optional[int], Optional[int]], int]]]] = []  # ([used_tokens], pieces)
+
+    def place(pieces: List[Tuple[int, str, Tuple[str, Optional[int], Optional[int]], int]], tokens: int) -> None:
+        for used, members in bins:
+            if used[0] + tokens <= max_tokens_per_chunk:
+                used[0] += tokens
+                members.extend(pieces)
+                return
+        bins.append(([tokens], list(pieces)))
+
+    # First-fit-decreasing over directories, keeping each directory whole when possible
+    for pieces in sorted(groups.values(), key=lambda group: -sum(piece[3] for piece in group)):
+        group_tokens = sum(piece[3] for piece in pieces)
+        if group_tokens <= max_tokens_per_chunk:
+            place(pieces, group_tokens)
+        else:
+            for piece in sorted(pieces, key=lambda piece: -piece[3]):
+                place([piece], piece[3])
+
+    # Present files within a chunk, and chunks themselves, in input order
+    chunks = [sorted(members) for _, members in bins]
+    chunks.sort(key=lambda members: members[0][0])
+    return [
+        ContextChunk(
+            codebase_context,
+            {label: member for _, label, member, _ in members},
+            {label: windows[label] for _, label, _, _ in members if label in windows}
+        )
+        for members in chunks
+    ]
@@ -1,6 +1,7 @@
 """
 Configuration constants for Secure Flow CLI
 """
+import os
 from pathlib import Path
 
 # CLI is in cli/ folder, so go up two levels to find claude-skills (cli/core -> cli -> root)
@@ -8,3 +9,11 @@ RULES_DIR = Path(__file__).parent.parent.parent / "claude-skills" / "rules"
 SKILL_FILE = Path(__file__).parent.parent.parent / "claude-skills" / "SKILL.md"
 CURSOR_COMMANDS_DIR = Path(__file__).parent.parent.parent / ".cursor" / "commands"
 
+# On-disk cache for LLM responses and other derived data
+CACHE_DIR = Path(
+    os.environ.get("SECURE_FLOW_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "secure-flow"
+)
+
+# Larger files are skipped when building codebase context
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024  # 1 MB
@@ -0,0 +1,164 @@
+"""
+Codebase context helpers: matching files to rule languages, and lazily read contexts
+"""
+import contextvars
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .manifest import hash_content
+
+# Directory that collected file paths are reported relative to: the working directory of a
+# daemon client, whose files the daemon is given by absolute path (see core/server.py)
+report_root: contextvars.ContextVar = contextvars.ContextVar('secure_flow_report_root', default=None)
+
+# Language names as used in rule frontmatter
+EXTENSION_LANGUAGES = {
+    '.py': 'python',
+    '.pyi': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.mjs': 'javascript',
+    '.cjs': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.java': 'java',
+    '.kt': 'java',
+    '.go': 'go',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.cs': 'csharp',
+    '.csproj': 'csharp',
+    '.tf': 'terraform',
+    '.tfvars': 'terraform',
+    '.hcl': 'terraform',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.json': 'json',
+    '.sh': 'shell',
+    '.bash': 'shell',
+    '.zsh': 'shell',
+    '.dockerfile': 'docker',
+    '.md': 'markdown',
+}
+
+# Dependency manifests and other well-known files belong to their ecosystem's language
+FILENAME_LANGUAGES = {
+    'dockerfile': 'docker',
+    'containerfile': 'docker',
+    'docker-compose.yml': 'docker',
+    'docker-compose.yaml': 'docker',
+    'requirements.txt': 'python',
+    'pipfile': 'python',
+    'pipfile.lock': 'python',
+    'pyproject.toml': 'python',
+    'setup.py': 'python',
+    'setup.cfg': 'python',
+    'package.json': 'javascript',
+    'package-lock.json': 'javascript',
+    'yarn.lock': 'javascript',
+    'pnpm-lock.yaml': 'javascript',
+    'go.mod': 'go',
+    'go.sum': 'go',
+    'gemfile': 'ruby',
+    'gemfile.lock': 'ruby',
+    'pom.xml': 'java',
+    'build.gradle': 'java',
+    'composer.json': 'php',
+    'composer.lock': 'php',
+}
+
+
+def detect_language(filepath: str) -> Optional[str]:
+    """Return the rule language of a file, or None if it cannot be determined"""
+    path = Path(filepath)
+    name = path.name.lower()
+    
+    if name in FILENAME_LANGUAGES:
+        return FILENAME_LANGUAGES[name]
+    if name.startswith('dockerfile') or name.endswith('.dockerfile'):
+        return 'docker'
+    return EXTENSION_LANGUAGES.get(path.suffix.lower())
+
+
+class LazyContext(Mapping[str, str]):
+    """A codebase context that holds only paths and sizes, reading a file each time it is looked up
+    
+    Behaves like the Dict[str, str] of an eagerly read context, but no content is
+    kept in memory: a file is read when a chunk containing it is hashed or sent, and
+    released once that is done, so large repositories are never held in memory whole.
+    """
+    
+    def __init__(self, sizes: Dict[str, int], root: Optional[str] = None):
+        # File path -> size in bytes, in context order
+        self.sizes = sizes
+        # Directory the paths are relative to, when it is not the working directory
+        self.root = root
+    
+    def _located(self, filepath: str) -> str:
+        return os.path.join(self.root, filepath) if self.root else filepath
+    
+    def __getitem__(self, filepath: str) -> str:
+        if filepath not in self.sizes:
+            raise KeyError(filepath)
+        try:
+            with open(self._located(filepath), 'rb') as f:
+                return f.read().decode('utf-8', errors='replace')
+        except OSError as e:
+            # Removed or unreadable since the context was collected; sent as empty
+            print(f"Warning: Could not read {filepath}: {e}", file=sys.stderr)
+            return ""
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.sizes)
+    
+    def __len__(self) -> int:
+        return len(self.sizes)
+    
+    def __contains__(self, filepath: object) -> bool:
+        return filepath in self.sizes
+    
+    def __repr__(self) -> str:
+        return f"LazyContext({len(self.sizes)} files, {sum(self.sizes.values())} bytes)"
+    
+    def subset(self, filepaths: Iterable[str]) -> "LazyContext":
+        """A lazy context of only the given files, in the order given"""
+        return LazyContext({filepath: self.sizes[filepath] for filepath in filepaths}, self.root)
+    
+    def version(self, filepath: str) -> Optional[Tuple[int, int]]:
+        """The file's current (mtime, size), which identifies its content without reading it"""
+        try:
+            stat = os.stat(self._located(filepath))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+def subset_context(codebase_context: Mapping[str, str], filepaths: Iterable[str]) -> Mapping[str, str]:
+    """The part of a codebase context holding `filepaths`, without reading a lazy context"""
+    if isinstance(codebase_context, LazyContext):
+        return codebase_context.subset(filepaths)
+    return {filepath: codebase_context[filepath] for filepath in filepaths}
+
+
+def file_version(codebase_context: Mapping[str, str], filepath: str) -> Any:
+    """Identify the content of a file in a context: by (mtime, size) if read lazily, else by its hash"""
+    if isinstance(codebase_context, LazyContext):
+        return codebase_context.version(filepath)
+    return hash_content(codebase_context[filepath])
+
+
+def filter_by_languages(codebase_context: Mapping[str, str], languages: List[str]) -> Mapping[str, str]:
+    """Keep files whose language is in `languages`
+    
+    Files of an undetected language are kept, since they may still matter to the rule.
+    """
+    wanted = {language.lower() for language in languages}
+    filepaths = []
+    for filepath in codebase_context:
+        language = detect_language(filepath)
+        if language is None or language in wanted:
+            filepaths.append(filepath)
+    return subset_context(codebase_context, filepaths)
+
@@ -0,0 +1,279 @@
+"""
+Cursor commands: translate rules into the .cursor/commands layout locally and keep them in sync
+
+A command is derived from its rule without a model:
+
+    # <rule title>
+    ## Overview       the paragraph under the title (or the description)
+    ## Steps          one numbered step per ### or #### section, with its bullets and code
+    ## <title> Checklist   every checkbox item of the rule
+
+The hash of the rule each command was written from is kept in STATE_FILE_NAME next
+to the commands and committed with them, so every checkout agrees on what is out of
+date. A command that exists without a recorded hash, e.g. one maintained by hand,
+is adopted as it is rather than rewritten.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import CURSOR_COMMANDS_DIR
+from .rules import parse_frontmatter
+
+# Bump when the translation changes, so `sync` regenerates every command
+TRANSLATOR_VERSION = 1
+# Kept in the commands directory; Cursor only reads its .md files
+STATE_FILE_NAME = ".secure-flow-sync.json"
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+CHECKBOX_PATTERN = re.compile(r'^\s*[-*+]\s+\[[ xX]\]\s+(.*)$')
+BULLET_PATTERN = re.compile(r'^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+
+def _split_frontmatter(content: str) -> Tuple[Dict, str]:
+    """Return a rule's frontmatter (empty if it has none or it does not parse) and its body"""
+    if not content.startswith('---'):
+        return {}, content
+    try:
+        end = content.index('---', 3)
+    except ValueError:
+        return {}, content
+    try:
+        frontmatter = parse_frontmatter(content)
+    except Exception:
+        frontmatter = {}
+    return frontmatter if isinstance(frontmatter, dict) else {}, content[end + 3:]
+
+
+def _step_lines(body: List[str]) -> List[str]:
+    """Format a section's lines as the bullets of a step, leaving code blocks as they are"""
+    lines = []
+    in_fence = False
+    for line in body:
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+            lines.append("    " + line.strip())
+        elif in_fence:
+            lines.append("    " + line if line.strip() else "")
+        elif not line.strip():
+            continue
+        else:
+            bullet = BULLET_PATTERN.match(line)
+            if bullet:
+                # Rules nest bullets by two spaces; commands by four
+                depth = len(bullet.group(1).expandtabs(4)) // 2
+                lines.append("    " * (depth + 1) + "- " + bullet.group(2).strip())
+            else:
+                lines.append("    - " + line.strip())
+    return lines
+
+
+def translate_rule(rule_content: str, rule_name: Optional[str] = None) -> str:
+    """Build the Cursor command for a rule from its markdown
+    
+    Deterministic: the same rule always gives the same command. `rule_name` is the
+    title used when the rule has no heading.
+    """
+    frontmatter, body = _split_frontmatter(rule_content)
+    
+    title = None
+    intro: List[str] = []
+    sections: List[Tuple[str, List[str]]] = []
+    checklist: List[str] = []
+    in_fence = False
+    for line in body.splitlines():
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_PATTERN.match(line)
+        if heading and len(heading.group(1)) <= 2 and title is None and not sections:
+            title = heading.group(2)
+        elif heading and len(heading.group(1)) in (3, 4):
+            sections.append((heading.group(2), []))
+        elif heading:
+            continue
+        elif not in_fence and CHECKBOX_PATTERN.match(line):
+            checklist.append(CHECKBOX_PATTERN.match(line).group(1).strip())
+        elif sections:
+            sections[-1][1].append(line)
+        elif title is not None and not line.startswith('rule_id:'):
+            intro.append(line)
+    
+    title = title or rule_name or "Secure Flow Rule"
+    overview = " ".join(line.strip() for line in intro if line.strip())
+    overview = overview or str(frontmatter.get('description') or "").strip()
+    
+    output = [f"# {title}", ""]
+    if overview:
+        output += ["## Overview", "", overview, ""]
+    
+    steps = [
+        (name, _step_lines(lines))
+        for name, lines in sections
+        if 'checklist' not in name.lower()
+    ]
+    steps = [(name, lines) for name, lines in steps if lines]
+    if steps:
+        output += ["## Steps", ""]
+        for number, (name, lines) in enumerate(steps, 1):
+            output += [f"{number}. **{name}**"] + lines + [""]
+    
+    if checklist:
+        output += [f"## {title} Checklist", ""]
+        output += [f"- [ ] {item}" for item in checklist] + [""]
+    
+    return "\n".join(output)
+
+
+def command_path(rule_path: Path, commands_dir: Path = CURSOR_COMMANDS_DIR) -> Path:
+    """Where the command for a rule file is written: the rule's file name, or its unprefixed one if that exists"""
+    stem = rule_path.stem
+    if stem.startswith('secure-flow-'):
+        unprefixed = commands_dir / f"{stem[len('secure-flow-'):]}.md"
+        if unprefixed.exists():
+            return unprefixed
+    return commands_dir / f"{stem}.md"
+
+
+def source_hash(rule_content: str) -> str:
+    """Hash a rule's content together with the translator version
+    
+    Line endings are normalized so checkouts converting them agree with the recorded hash.
+    """
+    digest = hashlib.sha256(f"{TRANSLATOR_VERSION}\0".encode('utf-8'))
+    digest.update(rule_content.replace('\r\n', '\n').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SyncState:
+    """Source hashes of the rules each generated command was last written from"""
+    
+    VERSION = 1
+    
+    def __init__(self, commands_dir: Path = CURSOR_COMMANDS_DIR, path: Optional[Path] = None):
+        self.commands_dir = Path(commands_dir)
+        self.path = Path(path) if path is not None else self.commands_dir / STATE_FILE_NAME
+        self.hashes: Dict[str, str] = self._load()
+        self._dirty = False
+    
+    def _load(self) -> Dict[str, str]:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return dict(data.get('commands', {}))
+    
+    def get(self, command_name: str) -> Optional[str]:
+        return self.hashes.get(command_name)
+    
+    def set(self, command_name: str, digest: str) -> None:
+        if self.hashes.get(command_name) != digest:
+            self.hashes[command_name] = digest
+            self._dirty = True
+    
+    def discard(self, command_name: str) -> None:
+        if self.hashes.pop(command_name, None) is not None:
+            self._dirty = True
+    
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                # Committed with the commands, so written to diff cleanly
+                json.dump({'version': self.VERSION, 'commands': self.hashes}, f, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            return
+        self._dirty = False
+
+
+def write_command(
+    rule_path: Path,
+    rule_content: str,
+    commands_dir: Path = CURSOR_COMMANDS_DIR,
+    state: Optional[SyncState] = None
+) -> Path:
+    """Translate a rule and write its command, recording the rule's hash in `state`"""
+    path = command_path(rule_path, commands_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(translate_rule(rule_content, rule_path.stem), encoding='utf-8')
+    if state is not None:
+        state.set(path.name, source_hash(rule_content))
+    return path
+
+
+def sync_commands(
+    rule_paths: List[Path],
+    commands_dir: Path = CURSOR_COMMANDS_DIR,
+    state: Optional[SyncState] = None,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+    check: bool = False
+) -> Dict[str, str]:
+    """Regenerate the commands whose rule changed since they were last written
+    
+    `rule_paths` is every rule, since generated commands of rules not among them are
+    removed. Returns a status per command file name: 'created', 'updated', 'adopted'
+    (an existing command without a recorded hash, kept as it is), 'unchanged' or
+    'removed'. `force` rewrites every command. With `check` nothing is written and
+    commands that `sync` would write or remove are reported as 'stale'.
+    """
+    state = state if state is not None else SyncState(commands_dir)
+    statuses: Dict[str, str] = {}
+    pending = []  # (rule path, content, command path)
+    sources = set()
+    for rule_path in rule_paths:
+        content = rule_path.read_text(encoding='utf-8')
+        path = command_path(rule_path, commands_dir)
+        sources.add(path.name)
+        recorded = state.get(path.name)
+        if not path.exists() or (force and not check) or (recorded is not None and recorded != source_hash(content)):
+            if check:
+                statuses[path.name] = 'stale'
+            else:
+                pending.append((rule_path, content, path))
+        elif recorded is None:
+            if not check:
+                state.set(path.name, source_hash(content))
+            statuses[path.name] = 'unchanged' if check else 'adopted'
+        else:
+            statuses[path.name] = 'unchanged'
+    
+    if not check:
+        def write(job: Tuple[Path, str, Path]) -> str:
+            rule_path, content, path = job
+            existed = path.exists()
+            write_command(rule_path, content, commands_dir)
+            return 'updated' if existed else 'created'
+        
+        with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) + 4)) as executor:
+            for (rule_path, content, path), status in zip(pending, executor.map(write, pending)):
+                statuses[path.name] = status
+                state.set(path.name, source_hash(content))
+    
+    # Commands generated for rules that no longer exist
+    for name in sorted(set(state.hashes) - sources):
+        if check:
+            statuses[name] = 'stale'
+            continue
+        try:
+            (commands_dir / name).unlink()
+        except FileNotFoundError:
+            pass
+        state.discard(name)
+        statuses[name] = 'removed'
+    
+    if not check:
+        state.save()
+    return dict(sorted(statuses.items()))
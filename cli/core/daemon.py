@@ -0,0 +1,121 @@
+"""
+Finding and talking to a running secure-flow daemon (see server.py)
+"""
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+from .config import CACHE_DIR
+
+DAEMON_SOCKET = CACHE_DIR / "daemon.sock"
+# Shared secret of a daemon listening on TCP, readable by its user only
+DAEMON_TOKEN_FILE = CACHE_DIR / "daemon.token"
+# Commands a daemon executes on behalf of the CLI
+DAEMON_COMMANDS = {'list', 'validate', 'run', 'run-all'}
+# Credentials the daemon falls back to, as the CLI does, when no --llm-token is given
+FORWARDED_ENV = ('ANTHROPIC_API_KEY', 'OPENAI_API_KEY')
+# Seconds to wait for the daemon to accept a request; the command itself may run much longer
+CONNECT_TIMEOUT = 5.0
+
+
+def daemon_address() -> Optional[str]:
+    """Return where a daemon listens: SECURE_FLOW_DAEMON (a socket path or http://host:port),
+    else the default socket if it exists, or None when the daemon should not be used"""
+    if os.environ.get('SECURE_FLOW_NO_DAEMON'):
+        return None
+    address = os.environ.get('SECURE_FLOW_DAEMON')
+    if address:
+        return address
+    return str(DAEMON_SOCKET) if DAEMON_SOCKET.exists() else None
+
+
+def connect(address: str, timeout: Optional[float] = CONNECT_TIMEOUT) -> Any:
+    """Open an HTTP connection to a daemon over a Unix socket or TCP"""
+    # Imported here: most CLI calls never look for a daemon, and http.client loads ssl
+    import http.client
+    import socket
+    
+    if address.startswith('http://'):
+        return http.client.HTTPConnection(address[len('http://'):].rstrip('/'), timeout=timeout)
+    
+    class UnixHTTPConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+    
+    return UnixHTTPConnection('localhost', timeout=timeout)
+
+
+def daemon_token() -> Optional[str]:
+    """Return the token a TCP daemon requires: SECURE_FLOW_DAEMON_TOKEN, else the daemon's token file"""
+    token = os.environ.get('SECURE_FLOW_DAEMON_TOKEN')
+    if token:
+        return token
+    try:
+        return DAEMON_TOKEN_FILE.read_text(encoding='utf-8').strip() or None
+    except OSError:
+        return None
+
+
+def request_headers(address: str) -> Dict[str, str]:
+    """Headers of a request to a daemon, with the token when it listens on TCP"""
+    headers = {'Content-Type': 'application/json'}
+    if address.startswith('http://'):
+        token = daemon_token()
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+    return headers
+
+
+def forwarded_env() -> Dict[str, str]:
+    return {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ}
+
+
+def forward_to_daemon(argv: List[str]) -> Optional[int]:
+    """Run a CLI command in the daemon, relaying its output as it is produced
+    
+    Returns the command's exit code, or None when no daemon is reachable and the
+    command should run in this process instead.
+    """
+    address = daemon_address()
+    if address is None:
+        return None
+    
+    body = json.dumps({'argv': argv, 'cwd': os.getcwd(), 'env': forwarded_env()})
+    try:
+        connection = connect(address)
+        connection.request('POST', '/cli', body, request_headers(address))
+        response = connection.getresponse()
+    except OSError:
+        # Nothing is listening, e.g. a socket left behind by a daemon that was killed
+        return None
+    if response.status != 200:
+        return None
+    
+    # The command may run for minutes; only accepting the request was time-limited
+    if connection.sock is not None:
+        connection.sock.settimeout(None)
+    
+    exit_code = None
+    try:
+        for line in response:
+            event = json.loads(line)
+            if 'stdout' in event:
+                sys.stdout.write(event['stdout'])
+                sys.stdout.flush()
+            elif 'stderr' in event:
+                sys.stderr.write(event['stderr'])
+                sys.stderr.flush()
+            elif 'exit' in event:
+                exit_code = event['exit']
+    except (OSError, ValueError):
+        pass
+    finally:
+        connection.close()
+    
+    if exit_code is None:
+        print("Error: Lost connection to the secure-flow daemon", file=sys.stderr)
+        return 1
+    return exit_code
@@ -0,0 +1,345 @@
+"""
+Diff-scoped context: the changed hunks of a git diff with surrounding lines and their enclosing function
+
+Each changed file is sent as an excerpt rather than in full: every changed range
+widened by a window of lines on each side and, where it fits, to the whole
+function or block around it. Excerpt lines carry their line numbers in the new
+version of the file, so findings refer to lines of the pull request.
+"""
+import fnmatch
+import os
+import re
+import subprocess
+from pathlib import Path, PurePath
+from typing import Any, Dict, List, Optional, Tuple
+
+from .context import detect_language
+from .tokens import TokenCounter
+from .walker import DEFAULT_MAX_FILE_SIZE, SNIFF_BYTES, is_binary
+
+DEFAULT_DIFF_CONTEXT = 10  # Lines kept on each side of a changed range
+MAX_ENCLOSING_LINES = 200  # Longer functions or blocks are represented by their first line only
+
+HUNK_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+# Lines that open a function, class or block, per rule language
+_JS_DEFINITION = (
+    r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\b|class\s+\w)'
+    r'|^\s*(?:export\s+)?(?:const|let|var)\s+\w+\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)[^=]*=>|\w+\s*=>)'
+    r'|^\s*(?:(?:public|private|protected|static|async|readonly|get|set)\s+)*\w+\s*\([^)]*\)\s*(?::[^{]+)?\{\s*$'
+)
+_C_LIKE_DEFINITION = (
+    r'^\s*(?:@\w+\s+)*(?:(?:public|private|protected|internal|static|final|abstract|synchronized|override'
+    r'|virtual|sealed|async|partial|open|suspend)\s+)*'
+    r'(?:(?:class|interface|enum|record|struct|object|trait|fun|function)\s+\w|[\w<>\[\],.?]+\s+\w+\s*\()'
+)
+DEFINITION_PATTERNS = {
+    'python': re.compile(r'^\s*(?:async\s+)?(?:def|class)\s+\w'),
+    'ruby': re.compile(r'^\s*(?:def|class|module)\s+\S'),
+    'go': re.compile(r'^(?:func|type)\s'),
+    'javascript': re.compile(_JS_DEFINITION),
+    'typescript': re.compile(_JS_DEFINITION),
+    'java': re.compile(_C_LIKE_DEFINITION),
+    'csharp': re.compile(_C_LIKE_DEFINITION),
+    'php': re.compile(_C_LIKE_DEFINITION),
+    'shell': re.compile(r'^\s*(?:function\s+\w+|\w+\s*\(\s*\))'),
+    'terraform': re.compile(r'^\s*(?:resource|data|module|variable|output|locals|provider|terraform)\b'),
+}
+# Languages whose blocks end by indentation rather than braces
+INDENTED_LANGUAGES = {'python', 'ruby'}
+# Statements the C-like pattern would otherwise take for a method signature
+CONTROL_KEYWORDS = {'if', 'else', 'for', 'foreach', 'while', 'switch', 'catch', 'return', 'new', 'throw', 'do', 'try', 'using', 'lock'}
+
+
+class DiffError(Exception):
+    """git could not produce the requested diff"""
+
+
+def _git(args: List[str], cwd: str, stdin: Optional[bytes] = None) -> bytes:
+    try:
+        completed = subprocess.run(['git', *args], cwd=cwd, input=stdin, capture_output=True)
+    except OSError as e:
+        raise DiffError(f"Could not run git: {e}")
+    if completed.returncode != 0:
+        raise DiffError(completed.stderr.decode('utf-8', errors='replace').strip() or f"git {args[0]} failed")
+    return completed.stdout
+
+
+def head_revision(revision_range: str) -> Optional[str]:
+    """The revision whose files are read: the right side of `base..head`, or None for the working tree"""
+    for separator in ('...', '..'):
+        if separator in revision_range:
+            return revision_range.split(separator, 1)[1] or 'HEAD'
+    return None
+
+
+def parse_diff(text: str) -> Dict[str, List[Tuple[int, int]]]:
+    """Changed line ranges (first, last) of each file in the new version, from a --unified=0 diff
+    
+    A hunk that only deletes lines is recorded as the line before the deletion.
+    Deleted files are left out.
+    """
+    changed: Dict[str, List[Tuple[int, int]]] = {}
+    ranges = None
+    for line in text.splitlines():
+        if line.startswith('diff --git '):
+            ranges = None
+        elif line.startswith('+++ '):
+            path = line[4:].strip()
+            if path.startswith('"') and path.endswith('"'):
+                path = path[1:-1]
+            ranges = None if path == '/dev/null' else changed.setdefault(path[2:] if path.startswith('b/') else path, [])
+        elif line.startswith('@@') and ranges is not None:
+            match = HUNK_PATTERN.match(line)
+            if match:
+                start = int(match.group(1))
+                count = int(match.group(2)) if match.group(2) is not None else 1
+                if count == 0:
+                    ranges.append((max(1, start), max(1, start)))
+                else:
+                    ranges.append((start, start + count - 1))
+    return changed
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _block_end(lines: List[str], start: int, language: str) -> Optional[int]:
+    """Index of the last line of the block opened at index `start`, or None if it cannot be told"""
+    if language in INDENTED_LANGUAGES:
+        indent = _indent(lines[start])
+        end = start
+        for i in range(start + 1, min(len(lines), start + MAX_ENCLOSING_LINES + 1)):
+            if not lines[i].strip():
+                continue
+            if _indent(lines[i]) <= indent:
+                # Ruby closes its blocks with an `end` at the opening indentation
+                if lines[i].strip() == 'end' or lines[i].lstrip().startswith('end '):
+                    return i
+                return end
+            end = i
+        return end
+    
+    depth = 0
+    opened = False
+    for i in range(start, min(len(lines), start + MAX_ENCLOSING_LINES + 1)):
+        for char in lines[i]:
+            if char == '{':
+                depth += 1
+                opened = True
+            elif char == '}':
+                depth -= 1
+                if opened and depth <= 0:
+                    return i
+        if not opened and i - start >= 5:
+            # A signature that never opens a brace block, e.g. an interface method
+            return None
+    return None
+
+
+def _is_definition(line: str, language: str) -> bool:
+    pattern = DEFINITION_PATTERNS.get(language)
+    if pattern is None or not pattern.match(line):
+        return False
+    words = line.split(None, 1)
+    return bool(words) and words[0] not in CONTROL_KEYWORDS
+
+
+def enclosing_block(lines: List[str], first: int, language: Optional[str]) -> Optional[Tuple[int, int]]:
+    """The innermost function or block (start, end indices) containing the line at index `first`"""
+    if language not in DEFINITION_PATTERNS:
+        return None
+    for i in range(first, max(-1, first - MAX_ENCLOSING_LINES - 1), -1):
+        if _is_definition(lines[i], language):
+            end = _block_end(lines, i, language)
+            if end is not None and end >= first:
+                return i, end
+    return None
+
+
+class FileDiff:
+    """The changed ranges of one file and the excerpt of it that is sent"""
+    
+    def __init__(self, path: str, content: str, changed: List[Tuple[int, int]], window: int = DEFAULT_DIFF_CONTEXT):
+        self.path = path
+        self.changed = sorted(changed)
+        lines = content.splitlines()
+        language = detect_language(path)
+        
+        spans = []
+        for first, last in self.changed:
+            first = min(first, max(1, len(lines)))
+            last = min(max(last, first), max(1, len(lines)))
+            spans.append((max(1, first - window), min(len(lines), last + window)))
+            block = enclosing_block(lines, first - 1, language) if lines else None
+            if block is not None:
+                start, end = block[0] + 1, block[1] + 1
+                if end - start + 1 <= MAX_ENCLOSING_LINES:
+                    spans.append((start, end))
+                else:
+                    # Too long to send whole: its first line still says where the change is
+                    spans.append((start, start))
+        
+        # Merged, sorted line ranges of the excerpt
+        self.sent: List[Tuple[int, int]] = []
+        for start, end in sorted(spans):
+            if start > end:
+                continue
+            if self.sent and start <= self.sent[-1][1] + 1:
+                self.sent[-1] = (self.sent[-1][0], max(self.sent[-1][1], end))
+            else:
+                self.sent.append((start, end))
+        
+        self.line_map = [number for start, end in self.sent for number in range(start, end + 1)]
+        self.total_lines = len(lines)
+        self.excerpt = self._render(lines)
+    
+    def _render(self, lines: List[str]) -> str:
+        width = len(str(self.sent[-1][1])) if self.sent else 1
+        out = [
+            f"# Excerpt of {self.path}: changed lines (marked +) with their surroundings. "
+            f"Each line starts with its line number in the file; report findings with these numbers."
+        ]
+        for i, (start, end) in enumerate(self.sent):
+            if i or start > 1:
+                out.append("...")
+            for number in range(start, end + 1):
+                marker = '+' if self.is_changed(number, number) else ' '
+                out.append(f"{marker}{number:>{width}} | {lines[number - 1] if number <= len(lines) else ''}")
+        if self.sent and self.sent[-1][1] < len(lines):
+            out.append("...")
+        return "\n".join(out) + "\n"
+    
+    def is_changed(self, first: int, last: int) -> bool:
+        """Whether any line from `first` to `last` was changed"""
+        return any(start <= last and first <= end for start, end in self.changed)
+    
+    def was_sent(self, first: int, last: int) -> bool:
+        """Whether any line from `first` to `last` is in the excerpt"""
+        return any(start <= last and first <= end for start, end in self.sent)
+
+
+class DiffContext:
+    """Excerpts of every file changed in a revision range, and the mapping of findings onto it"""
+    
+    def __init__(self, revision_range: str, files: Dict[str, FileDiff], full_tokens: int, repo_root: str):
+        self.revision_range = revision_range
+        self.files = files
+        self.full_tokens = full_tokens
+        self.repo_root = repo_root
+    
+    @classmethod
+    def from_git(
+        cls,
+        revision_range: str,
+        pathspecs: Optional[List[str]] = None,
+        cwd: Optional[str] = None,
+        window: int = DEFAULT_DIFF_CONTEXT,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE
+    ) -> "DiffContext":
+        """Diff `revision_range` (`base..head`, `base...head`, or `base` against the working tree)
+        
+        Paths in the result are relative to the repository root, as in pull requests.
+        Raises DiffError if git fails.
+        """
+        # Absolute pathspecs, so git may run from the first of them (e.g. in a daemon)
+        pathspecs = [os.path.abspath(pathspec) for pathspec in pathspecs or []]
+        if cwd is None:
+            cwd = os.getcwd()
+            if pathspecs:
+                first = Path(pathspecs[0])
+                cwd = str(first if first.is_dir() else first.parent)
+        repo_root = _git(['rev-parse', '--show-toplevel'], cwd).decode('utf-8').strip()
+        text = _git([
+            '-c', 'core.quotePath=false', 'diff', '--no-color', '--no-ext-diff', '--unified=0',
+            '--diff-filter=d', '--src-prefix=a/', '--dst-prefix=b/', revision_range, '--', *pathspecs
+        ], cwd).decode('utf-8', errors='replace')
+        
+        changed = {
+            path: ranges for path, ranges in parse_diff(text).items()
+            if ranges and _selected(path, include, exclude)
+        }
+        contents = _read_files(repo_root, head_revision(revision_range), list(changed), max_file_size)
+        
+        counter = TokenCounter()
+        files = {}
+        full_tokens = 0
+        for path, content in contents.items():
+            files[path] = FileDiff(path, content, changed[path], window)
+            full_tokens += counter.count_file(path, content)
+        return cls(revision_range, files, full_tokens, repo_root)
+    
+    def codebase_context(self) -> Dict[str, str]:
+        """The excerpts, keyed by path, in place of whole files"""
+        return {path: file_diff.excerpt for path, file_diff in self.files.items()}
+    
+    def summary(self) -> str:
+        counter = TokenCounter()
+        changed = sum(last - first + 1 for file_diff in self.files.values() for first, last in file_diff.changed)
+        sent = sum(len(file_diff.line_map) for file_diff in self.files.values())
+        total = sum(file_diff.total_lines for file_diff in self.files.values())
+        tokens = sum(counter.count_file(path, file_diff.excerpt) for path, file_diff in self.files.items())
+        return (
+            f"Diff {self.revision_range}: {len(self.files)} changed file(s), {changed} changed line(s); "
+            f"sending {sent} of {total} line(s), ~{tokens:,} tokens instead of ~{self.full_tokens:,} for whole files"
+        )
+    
+    def map_finding(self, finding: Dict[str, Any]) -> Dict[str, Any]:
+        """Place a finding on the lines of the new file and flag whether it touches the diff
+        
+        Sets `in_diff`. Only a finding none of whose lines were sent, but that fits the
+        excerpt, is taken to count excerpt lines rather than file lines, and is translated;
+        any other finding keeps its lines.
+        """
+        file_diff = self.files.get(finding['file'])
+        if file_diff is None:
+            finding['in_diff'] = False
+            return finding
+        
+        start, end = finding['start_line'], finding['end_line']
+        if not file_diff.was_sent(start, end) and 1 <= start <= end <= len(file_diff.line_map):
+            start, end = file_diff.line_map[start - 1], file_diff.line_map[end - 1]
+            finding['start_line'], finding['end_line'] = start, end
+        finding['in_diff'] = file_diff.is_changed(start, end)
+        return finding
+
+
+def _selected(path: str, include: Optional[List[str]], exclude: Optional[List[str]]) -> bool:
+    name = PurePath(path).name
+    matches = lambda patterns: any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+    if include and not matches(include):
+        return False
+    return not (exclude and matches(exclude))
+
+
+def _read_files(repo_root: str, revision: Optional[str], paths: List[str], max_file_size: int) -> Dict[str, str]:
+    """Read text files at a revision (one `git cat-file --batch`), or from the working tree"""
+    if revision is None:
+        blobs = {}
+        for path in paths:
+            try:
+                blobs[path] = (Path(repo_root) / path).read_bytes()
+            except OSError:
+                continue
+    else:
+        output = _git(['cat-file', '--batch'], repo_root, "".join(f"{revision}:{path}\n" for path in paths).encode('utf-8'))
+        blobs = {}
+        position = 0
+        for path in paths:
+            header_end = output.index(b'\n', position)
+            header = output[position:header_end].split()
+            position = header_end + 1
+            if header[-1] == b'missing':
+                continue
+            size = int(header[2])
+            blobs[path] = output[position:position + size]
+            position += size + 1
+    
+    return {
+        path: data.decode('utf-8', errors='replace')
+        for path, data in blobs.items()
+        if len(data) <= max_file_size and not is_binary(data[:SNIFF_BYTES])
+    }
@@ -0,0 +1,404 @@
+"""
+Structured findings: the schema requested from the model, parsing, local merging and streaming writers
+"""
+import abc
+import hashlib
+import json
+import posixpath
+import re
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, TextIO, Tuple
+
+from .report import SARIF_SCHEMA, TOOL_NAME, TOOL_URI
+
+SEVERITIES = ('critical', 'high', 'medium', 'low', 'info')
+
+# JSON Schema of one finding, as requested from the model and checked on every response
+FINDING_SCHEMA = {
+    'type': 'object',
+    'required': ['file', 'start_line', 'severity', 'title', 'remediation'],
+    'properties': {
+        'file': {'type': 'string', 'minLength': 1},
+        'start_line': {'type': 'integer', 'minimum': 1},
+        'end_line': {'type': 'integer', 'minimum': 1},
+        'severity': {'type': 'string', 'enum': list(SEVERITIES)},
+        'rule_id': {'type': 'string'},
+        'category': {'type': 'string'},
+        'title': {'type': 'string', 'minLength': 1},
+        'description': {'type': 'string'},
+        'remediation': {'type': 'string', 'minLength': 1},
+    },
+}
+
+# Appended to the rule's system prompt when structured findings are requested
+FINDINGS_INSTRUCTIONS = f"""## Output Format
+Report your findings as a single JSON object and nothing else, with no surrounding prose or code fences:
+{{"findings": [{{"file": "src/app.py", "start_line": 12, "end_line": 14, "severity": "high", "rule_id": "<rule_id of the rule>", "category": "sql-injection", "title": "Short name of the issue", "description": "What is wrong and why it matters", "remediation": "The specific change that fixes it, with code where helpful"}}]}}
+
+- file: the path as written in the "## File:" header, without any "(lines a-b)" after it
+- start_line, end_line: 1-based line numbers of the affected code within that file; where lines are shown with their numbers, use those
+- severity: one of {', '.join(SEVERITIES)}
+- category: a short kebab-case name for the kind of issue, the same for every instance of that kind
+- Report each distinct issue once; return {{"findings": []}} when the rule finds nothing
+
+Each finding must match this JSON Schema:
+{json.dumps(FINDING_SCHEMA)}"""
+
+_JSON_TYPES = {
+    'object': dict,
+    'string': str,
+    'integer': int,
+}
+
+
+def schema_errors(value: Any, schema: Dict[str, Any], path: str = 'finding') -> List[str]:
+    """Check a value against the subset of JSON Schema used by FINDING_SCHEMA"""
+    expected = _JSON_TYPES[schema['type']]
+    if not isinstance(value, expected) or isinstance(value, bool):
+        return [f"{path} must be of type {schema['type']}"]
+    
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path} must be one of: {', '.join(schema['enum'])}")
+    if 'minimum' in schema and value < schema['minimum']:
+        errors.append(f"{path} must be at least {schema['minimum']}")
+    if 'minLength' in schema and len(value) < schema['minLength']:
+        errors.append(f"{path} must not be empty")
+    if schema['type'] == 'object':
+        for name in schema.get('required', []):
+            if name not in value:
+                errors.append(f"{path} is missing required field '{name}'")
+        for name, property_schema in schema.get('properties', {}).items():
+            if name in value:
+                errors.extend(schema_errors(value[name], property_schema, f"{path}.{name}"))
+    return errors
+
+
+def _normalize(finding: Dict[str, Any], rule_id: str) -> Dict[str, Any]:
+    """Coerce the near misses models commonly produce before validating"""
+    finding = {name: finding[name] for name in FINDING_SCHEMA['properties'] if name in finding}
+    for name in ('start_line', 'end_line'):
+        if isinstance(finding.get(name), str) and finding[name].strip().isdigit():
+            finding[name] = int(finding[name])
+    if isinstance(finding.get('severity'), str):
+        finding['severity'] = finding['severity'].strip().lower()
+    if finding.get('end_line') is None and 'start_line' in finding:
+        finding['end_line'] = finding['start_line']
+    # Findings belong to the rule that was run, whatever the model echoed
+    finding['rule_id'] = rule_id
+    return finding
+
+
+def _extract_json(text: str) -> Any:
+    """Decode the first JSON value in a response, skipping any prose or code fence around it"""
+    decoder = json.JSONDecoder()
+    for start, char in enumerate(text):
+        if char in '{[':
+            try:
+                return decoder.raw_decode(text, start)[0]
+            except ValueError:
+                continue
+    raise ValueError("response contains no JSON object")
+
+
+def relocate_finding(finding: Dict[str, Any], windows: Mapping[str, Tuple[str, int, int]]) -> Dict[str, Any]:
+    """Place a finding reported against a line window (see chunking.ContextChunk.windows) in its file
+    
+    `file` becomes the file's path. Window lines are sent with their numbers in the
+    file; a range outside the window that fits its length counts lines from the
+    start of the window instead, and is shifted.
+    """
+    window = windows.get(finding['file'])
+    if window is None:
+        return finding
+    filepath, first_line, last_line = window
+    finding['file'] = filepath
+    start, end = finding['start_line'], finding['end_line']
+    inside = first_line <= start and end <= last_line
+    if not inside and end <= last_line - first_line + 1:
+        finding['start_line'], finding['end_line'] = start + first_line - 1, end + first_line - 1
+    return finding
+
+
+def parse_findings(
+    text: str,
+    rule_id: str,
+    windows: Optional[Mapping[str, Tuple[str, int, int]]] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Extract the findings from a model response and validate them against FINDING_SCHEMA
+    
+    Returns the valid findings, normalized, and one error for each finding (or
+    response) that had to be rejected. Findings in a line window of `windows` are
+    placed in their file (see relocate_finding).
+    """
+    try:
+        data = _extract_json(text)
+    except ValueError as e:
+        return [], [str(e)]
+    
+    items = data.get('findings') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return [], ["response has no 'findings' list"]
+    
+    findings = []
+    errors = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(f"finding {i + 1} must be of type object")
+            continue
+        finding = _normalize(item, rule_id)
+        finding_errors = schema_errors(finding, FINDING_SCHEMA, f"finding {i + 1}")
+        if not finding_errors and finding['end_line'] < finding['start_line']:
+            finding_errors.append(f"finding {i + 1}.end_line must not be before start_line")
+        if finding_errors:
+            errors.append("; ".join(finding_errors))
+        else:
+            findings.append(relocate_finding(finding, windows) if windows else finding)
+    return findings, errors
+
+
+def _normalize_path(path: str) -> str:
+    return posixpath.normpath(path.replace('\\', '/'))
+
+
+def _category_key(finding: Dict[str, Any]) -> str:
+    """The kind of issue a finding reports: its category, or its title when it has none"""
+    return re.sub(r'[^a-z0-9]+', '-', (finding.get('category') or finding['title']).lower()).strip('-')
+
+
+def fingerprint(finding: Dict[str, Any]) -> str:
+    """Identify a finding by rule, file, location and category, so chunks reporting it twice agree
+    
+    The path is normalized and the location is the first line, which models report
+    more consistently than the last.
+    """
+    key = "\0".join([
+        finding.get('rule_id', ''),
+        _normalize_path(finding['file']),
+        str(finding['start_line']),
+        _category_key(finding),
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def merge_findings(findings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deduplicate the findings of several chunks and order them by severity
+    
+    Findings with the same fingerprint are duplicates, and so are findings of the same
+    rule, file and category whose line ranges overlap, as where line windows of one
+    file overlap. Of duplicates, the most severe is kept, spanning both ranges.
+    Results are ordered by severity, then file and line.
+    """
+    rank = {severity: i for i, severity in enumerate(SEVERITIES)}
+    groups: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    for finding in findings:
+        finding = dict(
+            finding,
+            file=_normalize_path(finding['file']),
+            fingerprint=finding.get('fingerprint') or fingerprint(finding),
+        )
+        group = groups.setdefault((finding.get('rule_id', ''), finding['file'], _category_key(finding)), [])
+        for i, kept in enumerate(group):
+            if kept['fingerprint'] == finding['fingerprint'] or (
+                finding['start_line'] <= kept['end_line'] and kept['start_line'] <= finding['end_line']
+            ):
+                best = finding if rank[finding['severity']] < rank[kept['severity']] else kept
+                group[i] = dict(
+                    best,
+                    start_line=min(kept['start_line'], finding['start_line']),
+                    end_line=max(kept['end_line'], finding['end_line']),
+                )
+                break
+        else:
+            group.append(finding)
+    
+    merged = [finding for group in groups.values() for finding in group]
+    return sorted(merged, key=lambda finding: (rank[finding['severity']], finding['file'], finding['start_line']))
+
+
+def format_findings(findings: List[Dict[str, Any]]) -> str:
+    """Render merged findings as the markdown report of a run"""
+    if not findings:
+        return "No findings."
+    files = len({finding['file'] for finding in findings})
+    lines = [f"Found {len(findings)} finding(s) in {files} file(s)."]
+    for finding in findings:
+        location = f"{finding['file']}:{finding['start_line']}"
+        if finding['end_line'] != finding['start_line']:
+            location += f"-{finding['end_line']}"
+        lines += ["", f"### [{finding['severity'].upper()}] {finding['title']}", f"`{location}`"]
+        if finding.get('description'):
+            lines += ["", finding['description']]
+        lines += ["", f"**Remediation:** {finding['remediation']}"]
+    return "\n".join(lines)
+
+
+class FindingsWriter(abc.ABC):
+    """Writes findings to a stream as each batch arrives, without keeping them
+    
+    Safe to call from several worker threads; every batch is written whole.
+    Subclasses define the format.
+    """
+    
+    def __init__(self, stream: TextIO, rules: Optional[Dict[str, str]] = None):
+        # `rules` maps the rule ids being run to their descriptions
+        self.stream = stream
+        self.rules = rules or {}
+        self.count = 0
+        self.by_severity: Dict[str, int] = {severity: 0 for severity in SEVERITIES}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._begin()
+    
+    def write(self, findings: List[Dict[str, Any]]) -> None:
+        """Write a batch of findings, e.g. those of one chunk, and flush them"""
+        if not findings:
+            return
+        with self._lock:
+            for finding in findings:
+                self._write_finding(finding)
+                self.count += 1
+                self.by_severity[finding['severity']] += 1
+            self.stream.flush()
+    
+    def close(self) -> None:
+        """Finish the document; the stream itself is left open"""
+        with self._lock:
+            if not self._closed:
+                self._end()
+                self.stream.flush()
+                self._closed = True
+    
+    def summary(self) -> str:
+        counts = ", ".join(f"{n} {severity}" for severity, n in self.by_severity.items() if n)
+        return f"Findings: {self.count}" + (f" ({counts})" if counts else "")
+    
+    def _begin(self) -> None:
+        pass
+    
+    @abc.abstractmethod
+    def _write_finding(self, finding: Dict[str, Any]) -> None:
+        """Write one finding; called with the writer's lock held"""
+    
+    def _end(self) -> None:
+        pass
+
+
+class JsonlFindingsWriter(FindingsWriter):
+    """One JSON object per line and per finding"""
+    
+    def _write_finding(self, finding: Dict[str, Any]) -> None:
+        self.stream.write(json.dumps(finding, ensure_ascii=False) + "\n")
+
+
+# SARIF has no severity scale of its own beyond these levels
+SARIF_LEVELS = {
+    'critical': 'error',
+    'high': 'error',
+    'medium': 'warning',
+    'low': 'note',
+    'info': 'note',
+}
+
+
+class SarifFindingsWriter(FindingsWriter):
+    """A SARIF 2.1.0 log whose results are written as they arrive
+    
+    The document is opened up to the results array when the writer is created
+    and closed by `close()`, so a log is only valid once the writer is closed.
+    """
+    
+    def _begin(self) -> None:
+        document = json.dumps({
+            '$schema': SARIF_SCHEMA,
+            'version': '2.1.0',
+            'runs': [{
+                'tool': {'driver': {
+                    'name': TOOL_NAME,
+                    'informationUri': TOOL_URI,
+                    'rules': [
+                        {'id': rule_id, 'shortDescription': {'text': description}}
+                        for rule_id, description in self.rules.items()
+                    ],
+                }},
+                'results': [],
+            }],
+        }, indent=2, ensure_ascii=False)
+        head, self._tail = document.rsplit('[]', 1)
+        self.stream.write(head + '[')
+    
+    def _write_finding(self, finding: Dict[str, Any]) -> None:
+        message = finding['title']
+        if finding.get('description'):
+            message += f": {finding['description']}"
+        result = {
+            'ruleId': finding['rule_id'],
+            'level': SARIF_LEVELS[finding['severity']],
+            # SARIF fixes must carry artifact changes, so the remediation goes in the message instead
+            'message': {'text': message, 'markdown': f"{message}\n\n**Remediation:** {finding['remediation']}"},
+            'locations': [{'physicalLocation': {
+                'artifactLocation': {'uri': finding['file']},
+                'region': {'startLine': finding['start_line'], 'endLine': finding['end_line']},
+            }}],
+            'partialFingerprints': {'secureFlow/v1': finding.get('fingerprint') or fingerprint(finding)},
+            'properties': {'severity': finding['severity'], 'remediation': finding['remediation']},
+        }
+        if 'in_diff' in finding:
+            result['properties']['in_diff'] = finding['in_diff']
+        separator = ',' if self.count else ''
+        self.stream.write(f"{separator}\n        " + json.dumps(result, ensure_ascii=False))
+    
+    def _end(self) -> None:
+        self.stream.write(("\n      " if self.count else "") + ']' + self._tail + "\n")
+
+
+FINDINGS_WRITERS = {
+    'jsonl': JsonlFindingsWriter,
+    'sarif': SarifFindingsWriter,
+}
+
+
+def write_findings(
+    run_structured: Callable[[Callable[[str, str], None]], None],
+    writer: FindingsWriter,
+    transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    windows: Optional[Mapping[str, Tuple[str, int, int]]] = None
+) -> int:
+    """Parse each chunk response as it completes and write its findings straight away
+    
+    `run_structured` runs the rules, calling its argument with (rule_id, response)
+    per chunk, e.g. a bound LLMClient.run_rules_structured. Findings are placed in
+    their files with `windows` (e.g. LLMClient.windows, filled in as chunks are
+    planned), then `transform` is applied to each, e.g. DiffContext.map_finding.
+    A finding whose fingerprint was already written, e.g. by an overlapping chunk,
+    is skipped. Returns the number of rejected findings or responses; each is
+    reported on stderr.
+    """
+    rejected = [0]
+    seen = set()
+    lock = threading.Lock()
+    
+    def on_result(rule_id: str, response: str) -> None:
+        findings, errors = parse_findings(response, rule_id, windows)
+        if transform is not None:
+            findings = [transform(finding) for finding in findings]
+        with lock:
+            unique = []
+            for finding in findings:
+                finding['fingerprint'] = fingerprint(finding)
+                if finding['fingerprint'] not in seen:
+                    seen.add(finding['fingerprint'])
+                    unique.append(finding)
+        writer.write(unique)
+        if errors:
+            with lock:
+                rejected[0] += len(errors)
+            # One write so warnings from concurrent chunks do not interleave
+            sys.stderr.write("".join(f"Warning: Rejected output of {rule_id}: {error}\n" for error in errors))
+    
+    try:
+        run_structured(on_result)
+    finally:
+        writer.close()
+    return rejected[0]
@@ -0,0 +1,189 @@
+"""
+Shared HTTP connection pools and provider SDK clients
+"""
+import atexit
+import importlib.util
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection is kept open
+DEFAULT_TIMEOUT = 600.0  # Seconds; long completions stream for minutes
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections and provider SDK clients shared by every LLMClient using it
+    
+    Creating an SDK client per LLMClient means a new connection pool, and a new TLS
+    handshake, for every rule run. A pool instead holds one httpx client and one SDK
+    client per (provider, API key), so batch callers reuse warm connections.
+    """
+    
+    _shared: Dict[Tuple, "ConnectionPool"] = {}
+    _shared_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        http2: bool = False,
+        http_client: Optional[Any] = None
+    ):
+        self.max_connections = max_connections
+        # By default every connection may be kept alive, so a full batch of workers reuses them all
+        self.max_keepalive_connections = min(max_keepalive_connections or max_connections, max_connections)
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.http2 = http2
+        # An injected httpx.Client keeps its own limits and timeouts and is never closed here
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
+        self._provider_clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.RLock()
+    
+    @classmethod
+    def shared(
+        cls,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        http2: bool = False
+    ) -> "ConnectionPool":
+        """Return the process-wide pool for these settings"""
+        key = (max_connections, timeout, http2)
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None:
+                pool = cls._shared[key] = cls(max_connections=max_connections, timeout=timeout, http2=http2)
+            return pool
+    
+    def _httpx_timeout(self) -> Any:
+        import httpx
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+    
+    def _use_http2(self) -> bool:
+        """Whether connections speak HTTP/2, which needs the optional h2 package"""
+        if self.http2 and importlib.util.find_spec('h2') is None:
+            raise ImportError("h2 package not installed, which HTTP/2 needs. Install with: pip install 'httpx[http2]'")
+        return self.http2
+    
+    def http_client(self) -> Any:
+        """Return the pool's httpx.Client, creating it on first use"""
+        with self._lock:
+            if self._http_client is None:
+                import httpx
+                
+                self._http_client = httpx.Client(
+                    limits=self._httpx_limits(),
+                    timeout=self._httpx_timeout(),
+                    http2=self._use_http2()
+                )
+            return self._http_client
+    
+    def provider_client(self, provider: str, api_key: str) -> Any:
+        """Return the SDK client for a provider and API key, sharing this pool's connections
+        
+        Provider SDKs are imported here rather than at module level so commands that
+        never call a model (list, validate) don't pay for importing them.
+        """
+        key = (provider, api_key)
+        with self._lock:
+            client = self._provider_clients.get(key)
+            if client is not None:
+                return client
+            
+            if provider == "anthropic":
+                try:
+                    import anthropic
+                except ImportError:
+                    raise ImportError("anthropic package not installed. Install with: pip install anthropic")
+                client_class = anthropic.Anthropic
+            elif provider == "openai":
+                try:
+                    import openai
+                except ImportError:
+                    raise ImportError("openai package not installed. Install with: pip install openai")
+                client_class = openai.OpenAI
+            elif provider == "mock":
+                # Answers in-process, so it needs no connections
+                from .mock_provider import MockClient, MockSettings
+                client = self._provider_clients[key] = MockClient(MockSettings.from_env())
+                return client
+            else:
+                raise ValueError(f"Unsupported provider: {provider}. Use 'anthropic', 'openai' or 'mock'")
+            
+            # Retries are scheduled by LLMClient so they respect the shared rate limiter
+            options = {
+                'api_key': api_key,
+                'max_retries': 0,
+                'http_client': self.http_client(),
+            }
+            if self._owns_http_client:
+                options['timeout'] = self._httpx_timeout()
+            
+            client = self._provider_clients[key] = client_class(**options)
+            return client
+    
+    def _httpx_limits(self) -> Any:
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+    
+    def async_provider_client(self, provider: str, api_key: str) -> Any:
+        """Create an asyncio SDK client for a provider, with this pool's limits and timeouts
+        
+        Not shared: an httpx.AsyncClient belongs to the event loop it first runs on,
+        so the caller owns the client and closes it (its `close()` is awaitable).
+        """
+        if provider == "anthropic":
+            try:
+                import anthropic
+            except ImportError:
+                raise ImportError("anthropic package not installed. Install with: pip install anthropic")
+            client_class = anthropic.AsyncAnthropic
+        elif provider == "openai":
+            try:
+                import openai
+            except ImportError:
+                raise ImportError("openai package not installed. Install with: pip install openai")
+            client_class = openai.AsyncOpenAI
+        elif provider == "mock":
+            from .mock_provider import AsyncMockClient, MockSettings
+            return AsyncMockClient(MockSettings.from_env())
+        else:
+            raise ValueError(f"Unsupported provider: {provider}. Use 'anthropic', 'openai' or 'mock'")
+        
+        import httpx
+        return client_class(
+            api_key=api_key,
+            max_retries=0,
+            timeout=self._httpx_timeout(),
+            http_client=httpx.AsyncClient(limits=self._httpx_limits(), timeout=self._httpx_timeout(), http2=self._use_http2())
+        )
+    
+    def close(self) -> None:
+        """Close the pool's connections, unless its httpx client was injected"""
+        with self._lock:
+            if self._http_client is not None and self._owns_http_client:
+                self._http_client.close()
+                self._http_client = None
+            self._provider_clients.clear()
+    
+    @classmethod
+    def close_shared(cls) -> None:
+        """Close every process-wide pool"""
+        with cls._shared_lock:
+            pools = list(cls._shared.values())
+            cls._shared.clear()
+        for pool in pools:
+            pool.close()
+
+
+atexit.register(ConnectionPool.close_shared)
@@ -1,104 +1,253 @@
 """
 LLM client module for interacting with AI providers
 """
+import contextvars
+import json
 import os
+import queue
 import sys
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, TypeVar, Union
 
-# Try to import LLM libraries
-try:
-    import anthropic
-    HAS_ANTHROPIC = True
-except ImportError:
-    HAS_ANTHROPIC = False
+from .cache import ResponseCache
+from .checkpoint import RunCheckpoint
+from .chunking import ContextChunk, plan_chunks
+from .context import file_version
+from .findings import FINDINGS_INSTRUCTIONS, format_findings, merge_findings, parse_findings
+from .http_pool import ConnectionPool
+from .manifest import FindingsManifest, hash_content
+from .rate_limiter import RateLimiter, backoff_delay, is_retryable, retry_after_seconds
+from .telemetry import NULL_TELEMETRY, Telemetry, estimate_cost
+from .tokens import TokenCounter, context_window_for
 
-try:
-    import openai
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
+T = TypeVar('T')
+
+
+class ChunkPrompt:
+    """The prompt for one chunk, built from the chunk's files only when it is sent
+    
+    Planned prompts hold no file content, so a run over a large repository does not
+    keep every prompt in memory at once.
+    """
+    
+    def __init__(self, template: str, chunk: Mapping[str, str]):
+        # `template` has a {files_context} placeholder for the chunk's files
+        self.template = template
+        self.chunk = chunk
+    
+    def build(self) -> str:
+        files_context = "\n\n".join([
+            f"## File: {filepath}\n```\n{content}\n```"
+            for filepath, content in self.chunk.items()
+        ])
+        return self.template.replace("{files_context}", files_context)
+    
+    def key(self) -> str:
+        """Identify the prompt by its template and the version of each file, without building it
+        
+        Files of a lazily read context are identified by their mtime and size (see
+        context.file_version), so planning a run reads no file content.
+        """
+        chunk = self.chunk
+        if isinstance(chunk, ContextChunk):
+            members = [
+                (label, file_version(chunk.source, filepath), start, end)
+                for label, (filepath, start, end) in chunk.members.items()
+            ]
+        else:
+            members = [(filepath, file_version(chunk, filepath)) for filepath in chunk]
+        return hash_content(json.dumps([self.template, members]))
+
+
+class MapPlan:
+    """The chunk calls of a run over several rules, and where each result goes
+    
+    Planned by LLMClient._plan_map; the calls in `items` are made by the thread pool
+    of LLMClient or the event loop of AsyncLLMClient, and their results passed to `finish`.
+    """
+    
+    def __init__(self, manifests: Dict[str, FindingsManifest]):
+        self.manifests = manifests
+        self.plans: Dict[str, List[Mapping[str, str]]] = {}
+        self.results: Dict[str, List[Optional[str]]] = {}
+        self.keys: Dict[str, List[str]] = {}
+        # (label, system, prompt) of each call to make, and the (rule id, chunk index) it answers
+        self.items: List[Tuple[str, str, ChunkPrompt]] = []
+        self.owners: List[Tuple[str, int]] = []
+        # (label, rule id, findings) of the chunks answered from their manifests
+        self.stored: List[Tuple[str, str, str]] = []
+        self.checkpoint: Optional[RunCheckpoint] = None
+        self.announce = False
+        self.item_done: Optional[Callable[[int, str], None]] = None
+    
+    def replay_stored(
+        self,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        on_result: Optional[Callable[[str, str], None]] = None
+    ) -> None:
+        """Pass on the stored findings of unchanged chunks, in one piece so streaming consumers see every chunk"""
+        for label, rule_id, result in self.stored:
+            if on_token is not None:
+                on_token(label, result)
+            if on_result is not None:
+                on_result(rule_id, result)
+    
+    def finish(self, mapped: List[str]) -> Tuple[Dict[str, List[Mapping[str, str]]], Dict[str, List[str]], Optional[RunCheckpoint]]:
+        """Store the results of the calls, in item order, and record the new ones in the manifests"""
+        for (rule_id, i), result in zip(self.owners, mapped):
+            self.results[rule_id][i] = result
+        
+        fresh = set(self.owners)
+        for rule_id, manifest in self.manifests.items():
+            for i, key in enumerate(self.keys[rule_id]):
+                if (rule_id, i) in fresh:
+                    manifest.record(key, self.plans[rule_id][i], self.results[rule_id][i])
+            manifest.save()
+        
+        return self.plans, self.results, self.checkpoint
 
 
 class LLMClient:
     """Client for interacting with LLM APIs"""
     
-    # Model context limits (conservative estimates)
-    MAX_CONTEXT_TOKENS = 8192
-    SAFE_INPUT_TOKENS = 3000  # Reserve for input (rule + prompt overhead)
+    # Context limits come from the model's window (see tokens.MODEL_CONTEXT_WINDOWS)
     SAFE_OUTPUT_TOKENS = 4096  # Reserve for output
     SAFETY_MARGIN = 500  # Extra margin for token estimation errors
+    HEURISTIC_HEADROOM = 0.85  # Fraction of the input budget used when token counts are estimated
+    DEFAULT_CONCURRENCY = 4  # Parallel chunk calls in the map phase
+    DEFAULT_MAX_RETRIES = 5  # Retries of a call after transient provider errors
+    RETRY_BASE_DELAY = 1.0  # Seconds; doubles with each retry, with jitter
+    RETRY_MAX_DELAY = 60.0
     
-    def __init__(self, provider: str = "anthropic", api_key: Optional[str] = None):
+    MODELS = {
+        "anthropic": "claude-3-5-sonnet-20241022",
+        "openai": "gpt-4",
+        "mock": "mock",
+    }
+    # Providers whose clients take Anthropic Messages API requests; the mock imitates Anthropic
+    MESSAGES_API_PROVIDERS = {"anthropic", "mock"}
+    
+    def __init__(
+        self,
+        provider: str = "anthropic",
+        api_key: Optional[str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        model: Optional[str] = None,
+        token_counter: Optional[TokenCounter] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        checkpoint_dir: Optional[Path] = None,
+        prompt_caching: bool = True,
+        pool: Optional[ConnectionPool] = None,
+        telemetry: Optional[Telemetry] = None
+    ):
         self.provider = provider.lower()
+        self.model = model or self.MODELS.get(self.provider)
+        self.cache = cache
+        self.token_counter = token_counter or TokenCounter.for_model(self.provider, self.model)
+        self.max_context_tokens = context_window_for(self.model)
+        # Input budget: what the window leaves after reserving output and a margin
+        self.safe_input_tokens = self.max_context_tokens - self.SAFE_OUTPUT_TOKENS - self.SAFETY_MARGIN
+        if not self.token_counter.exact:
+            self.safe_input_tokens = int(self.safe_input_tokens * self.HEURISTIC_HEADROOM)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.checkpoint_dir = checkpoint_dir
+        self.prompt_caching = prompt_caching
+        # Token usage reported by the provider, summed over every call of this client
+        self.usage: Dict[str, int] = {
+            'calls': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_read_tokens': 0,
+            'cache_write_tokens': 0,
+        }
+        self._usage_lock = threading.Lock()
+        # Label of every line window planned so far -> (file path, first line, last line),
+        # so findings reported against a window are placed in its file
+        self.windows: Dict[str, Tuple[str, int, int]] = {}
+        # Spans of each phase, call and provider request; nothing is recorded without one
+        self.telemetry = telemetry or NULL_TELEMETRY
+        # Shared by every client and worker thread of this process that targets the provider
+        self.rate_limiter = RateLimiter.shared(self.provider, requests_per_minute, tokens_per_minute)
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY") or os.getenv("OPENAI_API_KEY")
+        if self.provider == "mock":
+            # Nothing leaves the process, so no credentials are needed
+            self.api_key = self.api_key or "mock"
         
         if not self.api_key:
             raise ValueError(f"No API key provided. Set {provider.upper()}_API_KEY environment variable or pass --llm-token")
         
-        if self.provider == "anthropic":
-            if not HAS_ANTHROPIC:
-                raise ImportError("anthropic package not installed. Install with: pip install anthropic")
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-        elif self.provider == "openai":
-            if not HAS_OPENAI:
-                raise ImportError("openai package not installed. Install with: pip install openai")
-            self.client = openai.OpenAI(api_key=self.api_key)
-        else:
-            raise ValueError(f"Unsupported provider: {provider}. Use 'anthropic' or 'openai'")
+        if self.provider not in self.MODELS:
+            raise ValueError(f"Unsupported provider: {provider}. Use 'anthropic', 'openai' or 'mock'")
+        
+        # HTTP connections and the SDK client come from a pool; by default the process-wide
+        # one, so every LLMClient of a process reuses the same warm connections
+        self.pool = pool or ConnectionPool.shared()
+        self.client = self._make_client()
     
-    @staticmethod
-    def _estimate_tokens(text: str) -> int:
-        """Estimate token count (rough approximation: ~4 chars per token)"""
-        return len(text) // 4
+    def _make_client(self) -> Any:
+        """Return the provider SDK client the requests are sent with"""
+        return self.pool.provider_client(self.provider, self.api_key)
+    
+    def _estimate_tokens(self, text: str) -> int:
+        """Count tokens with the configured token counter"""
+        return self.token_counter.count(text)
+    
+    def _file_tokens(self, filepath: str, content: str) -> int:
+        """Count the tokens a file contributes to a prompt, including its header and fence"""
+        file_wrapper = f"## File: {filepath}\n```\n\n```\n\n"
+        return self._estimate_tokens(file_wrapper) + self.token_counter.count_file(filepath, content)
     
     def _calculate_max_tokens(self, input_tokens: int) -> int:
         """Calculate safe max_tokens based on input size"""
-        available = self.MAX_CONTEXT_TOKENS - input_tokens - self.SAFETY_MARGIN
+        available = self.max_context_tokens - input_tokens - self.SAFETY_MARGIN
         # Ensure we have at least some output capacity, but cap at safe output limit
         return max(1000, min(available, self.SAFE_OUTPUT_TOKENS))
     
-    def _split_codebase_context(self, codebase_context: Dict[str, str], max_tokens_per_chunk: int) -> List[Dict[str, str]]:
-        """Split codebase context into chunks that fit within token limits"""
-        chunks = []
-        current_chunk = {}
-        current_tokens = 0
-        
-        for filepath, content in codebase_context.items():
-            file_header = f"## File: {filepath}\n```\n"
-            file_footer = "\n```\n\n"
-            file_header_tokens = self._estimate_tokens(file_header + file_footer)
-            content_tokens = self._estimate_tokens(content)
-            
-            # If single file is too large, truncate it
-            if content_tokens > max_tokens_per_chunk - file_header_tokens - 100:
-                # Truncate to fit
-                max_content_chars = (max_tokens_per_chunk - file_header_tokens - 100) * 4
-                content = content[:max_content_chars] + "\n... [truncated due to size] ...\n"
-                content_tokens = self._estimate_tokens(content)
-            
-            # Check if adding this file would exceed chunk limit
-            if current_tokens + file_header_tokens + content_tokens > max_tokens_per_chunk and current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = {}
-                current_tokens = 0
-            
-            current_chunk[filepath] = content
-            current_tokens += file_header_tokens + content_tokens
-        
-        if current_chunk:
-            chunks.append(current_chunk)
+    def _split_codebase_context(
+        self,
+        codebase_context: Mapping[str, str],
+        max_tokens_per_chunk: int,
+        file_tokens: Optional[Mapping[str, int]] = None
+    ) -> List[ContextChunk]:
+        """Split codebase context into chunks that fit within token limits
         
-        return chunks if chunks else [{}]
+        `file_tokens` holds the _file_tokens count of each file when it is already known.
+        """
+        return plan_chunks(codebase_context, max_tokens_per_chunk, self._file_tokens, file_tokens=file_tokens)
     
-    def generate_rule(self, rule_name: str, description: str, files_content: Dict[str, str], languages: List[str]) -> str:
-        """Generate a new rule using LLM"""
-        
+    def generate_rule(
+        self,
+        rule_name: str,
+        description: str,
+        files_content: Mapping[str, str],
+        languages: List[str],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """Generate a new rule using LLM, passing text to `on_token` as it streams in"""
+        prompt = self._build_generate_prompt(rule_name, description, files_content, languages)
+        return self._make_api_call(prompt, 4096, on_token)
+    
+    @staticmethod
+    def _build_generate_prompt(
+        rule_name: str,
+        description: str,
+        files_content: Mapping[str, str],
+        languages: List[str]
+    ) -> str:
+        """Build the prompt that asks for a new rule file"""
         files_context = "\n\n".join([
             f"## File: {filepath}\n```\n{content[:2000]}...\n```"
             for filepath, content in files_content.items()
         ])
         
-        prompt = f"""You are creating a security rule for Secure Flow, a security framework for AI coding agents.
+        return f"""You are creating a security rule for Secure Flow, a security framework for AI coding agents.
 
 Rule Name: {rule_name}
 Description: {description}
@@ -124,107 +273,386 @@ Create a complete rule file following this structure:
 The rule should be comprehensive, actionable, and follow the same style as existing Secure Flow rules. Focus on security best practices, specific steps, and clear implementation guidance.
 
 Return ONLY the complete markdown file content, starting with the frontmatter."""
+    
+    def _make_api_call(
+        self,
+        prompt: str,
+        max_tokens: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """Make a single API call to the LLM, answering from the response cache when possible
         
-        if self.provider == "anthropic":
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=4096,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            return message.content[0].text
-        else:  # openai
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }],
-                max_tokens=4096
-            )
-            return response.choices[0].message.content
+        When `on_token` is given the response is streamed and each piece of text is passed
+        to it as it arrives; a cached response is passed in one piece. `system` is the
+        stable part of the prompt, sent so the provider can cache it across calls.
+        """
+        if self.cache is None:
+            return self._request_completion(prompt, max_tokens, on_token, system)
+        
+        key = ResponseCache.make_key(self.provider, self.model, prompt, max_tokens, system)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.telemetry.annotate(response_cache='hit')
+            if on_token is not None:
+                on_token(cached)
+            return cached
+        
+        result = self._request_completion(prompt, max_tokens, on_token, system)
+        self.cache.set(key, result)
+        return result
     
-    def generate_cursor_command(self, rule_content: str, rule_name: str) -> str:
-        """Generate a cursor command file from rule content using LLM"""
+    def stream(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        """Yield the completion for a prompt piece by piece as it arrives"""
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(self.provider, self.model, prompt, max_tokens, system)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
         
-        prompt = f"""You are creating a Cursor IDE command file for a Secure Flow security rule.
-
-Rule Name: {rule_name}
-
-## Full Rule Content:
-{rule_content}
-
-Create a Cursor command file that extracts and formats the key information from this rule. The file should follow this exact structure:
-
-1. Title as H1 heading (extract from the rule title, convert to readable format)
-2. Overview section (## Overview) with a brief description of what this rule does
-3. Steps section (## Steps) with numbered steps extracted from the Implementation section:
-   - Each step should have a bold section title followed by bullet points
-   - Format: **Section Title**\n    - Step description
-   - Extract all meaningful implementation steps from H3/H4 sections
-4. Checklist section (## [Rule Name] Checklist) with all checklist items from the rule:
-   - Format: - [ ] Checklist item text
-
-The cursor command should be concise, actionable, and easy to follow. Focus on the practical steps a developer would need to implement this security rule.
-
-Return ONLY the complete markdown file content, without any code block wrappers."""
-        
-        if self.provider == "anthropic":
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=4096,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            return message.content[0].text
-        else:  # openai
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }],
-                max_tokens=4096
-            )
-            return response.choices[0].message.content
-    
-    def _make_api_call(self, prompt: str, max_tokens: int) -> str:
-        """Make a single API call to the LLM"""
-        if self.provider == "anthropic":
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=max_tokens,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
-            return message.content[0].text
+        pieces = []
+        for text in self._stream_completion(prompt, max_tokens, system):
+            pieces.append(text)
+            yield text
+        
+        if key is not None:
+            self.cache.set(key, "".join(pieces))
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Return how long to wait before retrying a failed call, or None to give up"""
+        if attempt > self.max_retries or not is_retryable(error):
+            return None
+        
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = backoff_delay(attempt, self.RETRY_BASE_DELAY, self.RETRY_MAX_DELAY)
+        elif getattr(error, 'status_code', None) == 429:
+            # The provider told us when capacity returns; hold back every worker until then
+            self.rate_limiter.pause(delay)
+        
+        status = getattr(error, 'status_code', None) or type(error).__name__
+        sys.stderr.write(f"Provider error ({status}); retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})...\n")
+        return delay
+    
+    def _with_retries(self, send: Callable[[], T]) -> T:
+        """Call `send`, retrying transient provider errors with backoff"""
+        attempt = 0
+        while True:
+            try:
+                return send()
+            except Exception as e:
+                attempt += 1
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+    
+    def _request_completion(
+        self,
+        prompt: str,
+        max_tokens: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        system: Optional[str] = None
+    ) -> str:
+        """Send a single completion request to the provider, retrying transient errors"""
+        if on_token is not None:
+            pieces = []
+            for text in self._stream_completion(prompt, max_tokens, system):
+                pieces.append(text)
+                on_token(text)
+            return "".join(pieces)
+        
+        return self._with_retries(lambda: self._send_request(prompt, max_tokens, system))
+    
+    def _anthropic_request(self, prompt: str, max_tokens: int, system: Optional[str]) -> Dict[str, Any]:
+        """Build the arguments of an Anthropic messages request"""
+        request = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+        if system:
+            block = {"type": "text", "text": system}
+            if self.prompt_caching:
+                # Marks the end of the cached prefix; later calls with the same system block read it from cache
+                block["cache_control"] = {"type": "ephemeral"}
+            request["system"] = [block]
+        return request
+    
+    @staticmethod
+    def _openai_messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+        """Build the messages of an OpenAI chat request
+        
+        OpenAI caches long prompt prefixes automatically, so the stable system message
+        goes first and only the user message varies between calls.
+        """
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _openai_request(self, prompt: str, max_tokens: int, system: Optional[str], stream: bool = False) -> Dict[str, Any]:
+        """Build the arguments of an OpenAI chat request"""
+        request = {
+            "model": self.model,
+            "messages": self._openai_messages(prompt, system),
+            "max_tokens": max_tokens
+        }
+        if stream:
+            request["stream"] = True
+            # Usage arrives in a final chunk without choices
+            request["stream_options"] = {"include_usage": True}
+        return request
+    
+    def _record_usage(self, usage: Any) -> Dict[str, Any]:
+        """Add the token usage reported with a response to the client's totals
+        
+        Returns the usage of this response with its estimated cost, as span attributes.
+        """
+        if usage is None:
+            return {}
+        
+        if self.provider in self.MESSAGES_API_PROVIDERS:
+            cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+            cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+            # input_tokens only counts the part of the prompt after the cached prefix
+            input_tokens = (usage.input_tokens or 0) + cache_read + cache_write
+            output_tokens = usage.output_tokens or 0
         else:  # openai
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }],
-                max_tokens=max_tokens
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cache_read = getattr(details, 'cached_tokens', None) or 0
+            cache_write = 0
+            input_tokens = usage.prompt_tokens or 0
+            output_tokens = usage.completion_tokens or 0
+        
+        with self._usage_lock:
+            self.usage['calls'] += 1
+            self.usage['input_tokens'] += input_tokens
+            self.usage['output_tokens'] += output_tokens
+            self.usage['cache_read_tokens'] += cache_read
+            self.usage['cache_write_tokens'] += cache_write
+        
+        response_usage = {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cache_read_tokens': cache_read,
+            'cache_write_tokens': cache_write,
+        }
+        response_usage['cost_usd'] = estimate_cost(self.model, response_usage)
+        return response_usage
+    
+    def usage_summary(self) -> Optional[str]:
+        """Describe the token usage of the calls made so far, or None if none were made"""
+        with self._usage_lock:
+            usage = dict(self.usage)
+        if not usage['calls']:
+            return None
+        
+        summary = (
+            f"Token usage: {usage['input_tokens']:,} input, {usage['output_tokens']:,} output "
+            f"over {usage['calls']} call(s)"
+        )
+        if usage['cache_read_tokens'] or usage['cache_write_tokens']:
+            hit_rate = usage['cache_read_tokens'] / usage['input_tokens']
+            summary += (
+                f"; prompt cache: {usage['cache_read_tokens']:,} read ({hit_rate:.0%} of input), "
+                f"{usage['cache_write_tokens']:,} written, "
+                f"{usage['input_tokens'] - usage['cache_read_tokens'] - usage['cache_write_tokens']:,} uncached"
             )
-            return response.choices[0].message.content
+        cost = estimate_cost(self.model, usage)
+        if cost:
+            summary += f"; est. cost ${cost:.4f}"
+        return summary
+    
+    def _acquire_rate_limit(self, system: Optional[str], prompt: str, max_tokens: int) -> None:
+        """Wait for the rate limiter to admit one request, or for a pause after a 429 to end"""
+        if not self.rate_limiter.enabled and not self.rate_limiter.paused:
+            return
+        # Budget the worst case: the full prompt plus every output token requested
+        with self.telemetry.span('rate_limit.wait'):
+            self.rate_limiter.acquire(self._estimate_tokens((system or "") + prompt) + max_tokens)
+    
+    def _send_request(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Send one completion request to the provider"""
+        self._acquire_rate_limit(system, prompt, max_tokens)
+        
+        with self.telemetry.span('llm.request', provider=self.provider, model=self.model, max_tokens=max_tokens) as span:
+            if self.provider in self.MESSAGES_API_PROVIDERS:
+                message = self.client.messages.create(**self._anthropic_request(prompt, max_tokens, system))
+                span.set(**self._record_usage(getattr(message, 'usage', None)))
+                return message.content[0].text
+            else:  # openai
+                response = self.client.chat.completions.create(**self._openai_request(prompt, max_tokens, system))
+                span.set(**self._record_usage(getattr(response, 'usage', None)))
+                return response.choices[0].message.content
+    
+    def _stream_completion(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        """Stream a completion, retrying transient errors that occur before any text arrives"""
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                for text in self._open_stream(prompt, max_tokens, system):
+                    emitted = True
+                    yield text
+                return
+            except Exception as e:
+                # Text already passed on cannot be taken back, so only a clean failure is retried
+                if emitted:
+                    raise
+                attempt += 1
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+    
+    def _open_stream(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        """Send a streaming completion request to the provider, yielding text as it arrives"""
+        self._acquire_rate_limit(system, prompt, max_tokens)
+        
+        # Not made current: a generator cannot hold a context variable across its yields
+        span = self.telemetry.start_span('llm.request', provider=self.provider, model=self.model, max_tokens=max_tokens, stream=True)
+        started = time.perf_counter()
+        first_token = True
+        try:
+            if self.provider in self.MESSAGES_API_PROVIDERS:
+                with self.client.messages.stream(**self._anthropic_request(prompt, max_tokens, system)) as stream:
+                    for text in stream.text_stream:
+                        if first_token:
+                            span.set(time_to_first_token_s=time.perf_counter() - started)
+                            first_token = False
+                        yield text
+                    span.set(**self._record_usage(getattr(stream.get_final_message(), 'usage', None)))
+            else:  # openai
+                response = self.client.chat.completions.create(**self._openai_request(prompt, max_tokens, system, stream=True))
+                for chunk in response:
+                    if getattr(chunk, 'usage', None) is not None:
+                        span.set(**self._record_usage(chunk.usage))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            span.set(time_to_first_token_s=time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+        except GeneratorExit:
+            # The consumer stopped reading early
+            span.end()
+            raise
+        except BaseException as e:
+            span.end(e)
+            raise
+        span.end()
+    
+    def _run_prompt(
+        self,
+        label: str,
+        prompt: str,
+        announce: bool = True,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        system: Optional[str] = None,
+        kind: str = 'chunk'
+    ) -> str:
+        """Execute one prompt of the map (`kind` 'chunk') or reduce ('reduce') phase"""
+        input_tokens = self._estimate_tokens((system or "") + prompt)
+        max_tokens = self._calculate_max_tokens(input_tokens)
+        
+        if announce:
+            # One write per line so messages from concurrent workers do not interleave
+            sys.stderr.write(f"Processing {label}...\n")
+        
+        stream_to = None
+        if on_token is not None:
+            stream_to = lambda text: on_token(label, text)
+        with self.telemetry.span(f'llm.{kind}', label=label, estimated_input_tokens=input_tokens):
+            return self._make_api_call(prompt, max_tokens, stream_to, system)
+    
+    def _map_prompts(
+        self,
+        items: List[Tuple[str, str, Union[str, "ChunkPrompt"]]],
+        announce: bool = True,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        checkpoint: Optional[RunCheckpoint] = None,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        kind: str = 'chunk'
+    ) -> List[str]:
+        """Run (label, system, prompt) items concurrently, returning results in item order
+        
+        A ChunkPrompt is built only when its item runs, so at most one prompt per worker
+        is held in memory.
+        With a checkpoint, items completed by an earlier attempt of the run are not
+        sent again and every newly completed item is recorded as soon as it finishes.
+        `on_result` is called with (item index, result) as each item completes.
+        `kind` names the phase the items belong to in telemetry.
+        """
+        def run_item(index: int, label: str, system: str, prompt: Union[str, ChunkPrompt]) -> str:
+            if isinstance(prompt, ChunkPrompt):
+                prompt = prompt.build()
+            result = checkpoint.get(prompt, system) if checkpoint is not None else None
+            if result is not None:
+                if on_token is not None:
+                    on_token(label, result)
+            else:
+                result = self._run_prompt(label, prompt, announce, on_token, system, kind)
+                if checkpoint is not None:
+                    checkpoint.record(prompt, result, system)
+            if on_result is not None:
+                on_result(index, result)
+            return result
+        
+        workers = min(self.concurrency, len(items))
+        
+        if workers <= 1:
+            return [run_item(i, label, system, prompt) for i, (label, system, prompt) in enumerate(items)]
+        
+        # A failed item does not cancel the others, so their results still reach the checkpoint.
+        # Each worker runs in a copy of the caller's context, so a daemon routes its output
+        # to the request that started it.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, run_item, i, label, system, prompt)
+                for i, (label, system, prompt) in enumerate(items)
+            ]
+            # Collect in submission order so the reduce step sees chunks in sequence
+            return [future.result() for future in futures]
     
-    def run_rule(self, rule_content: str, codebase_context: Dict[str, str]) -> str:
-        """Execute a rule with codebase context, splitting into multiple calls if needed"""
+    @staticmethod
+    def _build_rule_system(rule_content: str, structured: bool = False) -> str:
+        """Build the system prompt shared by every call for a rule: the instructions and the rule
         
-        # Estimate tokens for rule and base prompt
-        base_prompt_template = """You are executing a Secure Flow security rule. Follow the rule instructions precisely and apply them to the provided codebase context.
+        It is identical for every chunk, merge and summary call of the rule, so providers
+        with prompt caching bill and prefill it once instead of once per call. When
+        `structured`, it also asks for findings in the JSON format of findings.FINDING_SCHEMA.
+        """
+        system = f"""You are executing a Secure Flow security rule. Follow the rule instructions precisely and apply them to the codebase context or findings provided in each request.
 
 ## Rule to Execute:
-{rule_content}
-
-## Codebase Context:
+{rule_content}"""
+        if structured:
+            system += "\n\n" + FINDINGS_INSTRUCTIONS
+        return system
+    
+    def _plan_rule(
+        self,
+        rule_content: str,
+        codebase_context: Dict[str, str],
+        structured: bool = False,
+        merge_locally: bool = False
+    ) -> Tuple[List[Mapping[str, str]], str, List["ChunkPrompt"]]:
+        """Split the codebase context for a rule into chunks and plan one prompt per chunk
+        
+        With `merge_locally`, a context that needs more than one chunk is planned for
+        structured findings, so the chunk results can be merged without a model call.
+        Returns the chunks, the system prompt shared by all of them and the per-chunk prompts.
+        """
+        system = self._build_rule_system(rule_content, structured)
+        
+        # Estimate tokens for the system prompt (instructions and rule) and the chunk template
+        base_prompt_template = """## Codebase Context:
 {files_context}
 
 Execute this rule step by step:
@@ -235,76 +663,74 @@ Execute this rule step by step:
 5. Follow the implementation checklist in the rule
 
 Be thorough, specific, and actionable. Focus on security best practices."""
+        if structured:
+            base_prompt_template = """## Codebase Context:
+{files_context}
+
+Analyze the codebase context against the rule requirements and report every finding in the JSON output format."""
         
-        rule_tokens = self._estimate_tokens(rule_content)
-        base_prompt_tokens = self._estimate_tokens(base_prompt_template.replace("{rule_content}", "").replace("{files_context}", ""))
+        system_tokens = self._estimate_tokens(system)
+        base_prompt_tokens = self._estimate_tokens(base_prompt_template.replace("{files_context}", ""))
         
         # Calculate available tokens for codebase context
-        available_for_context = self.SAFE_INPUT_TOKENS - rule_tokens - base_prompt_tokens
+        available_for_context = self.safe_input_tokens - system_tokens - base_prompt_tokens
         
-        # Build files context
-        files_context = "\n\n".join([
-            f"## File: {filepath}\n```\n{content}\n```"
+        # Size the files context, reading each file once; chunk planning reuses the counts
+        file_tokens = {
+            filepath: self._file_tokens(filepath, content)
             for filepath, content in codebase_context.items()
-        ])
-        context_tokens = self._estimate_tokens(files_context)
+        }
+        context_tokens = sum(file_tokens.values())
+        
+        # Chunks that will be merged locally report structured findings, which the longer system prompt asks for
+        if context_tokens > available_for_context and merge_locally and not structured:
+            structured = True
+            system = self._build_rule_system(rule_content, structured)
+            available_for_context = self.safe_input_tokens - self._estimate_tokens(system) - base_prompt_tokens
         
         # If context fits in one call, do it
         if context_tokens <= available_for_context:
-            prompt = base_prompt_template.format(
-                rule_content=rule_content,
-                files_context=files_context
-            )
-            input_tokens = self._estimate_tokens(prompt)
-            max_tokens = self._calculate_max_tokens(input_tokens)
-            return self._make_api_call(prompt, max_tokens)
-        
-        # Otherwise, split into chunks and make multiple calls
-        print(f"Codebase context is large ({context_tokens} estimated tokens). Splitting into chunks...", file=sys.stderr)
+            chunks = [codebase_context]
+        else:
+            # Otherwise, split into chunks and make multiple calls
+            print(f"Codebase context is large ({context_tokens} estimated tokens). Splitting into chunks...", file=sys.stderr)
+            chunks = self._split_codebase_context(codebase_context, available_for_context, file_tokens)
+            for chunk in chunks:
+                self.windows.update(chunk.windows)
         
-        chunks = self._split_codebase_context(codebase_context, available_for_context)
-        results = []
+        prompts = []
         
         for i, chunk in enumerate(chunks, 1):
-            chunk_files_context = "\n\n".join([
-                f"## File: {filepath}\n```\n{content}\n```"
-                for filepath, content in chunk.items()
-            ])
-            
-            if len(chunks) > 1:
-                chunk_prompt = f"""You are executing a Secure Flow security rule. This is part {i} of {len(chunks)}.
+            # The files are only read into the prompt when the chunk is sent
+            if len(chunks) > 1 and structured:
+                template = f"""This is part {i} of {len(chunks)} of the codebase.
 
-## Rule to Execute:
-{rule_content}
+## Codebase Context (Part {i} of {len(chunks)}):
+{{files_context}}
+
+Analyze this portion of the codebase against the rule requirements and report every finding in it in the JSON output format."""
+            elif len(chunks) > 1:
+                template = f"""This is part {i} of {len(chunks)} of the codebase.
 
 ## Codebase Context (Part {i} of {len(chunks)}):
-{chunk_files_context}
+{{files_context}}
 
 Analyze this portion of the codebase against the rule requirements. Provide specific findings and actionable guidance for this part. Focus on security best practices."""
             else:
-                chunk_prompt = base_prompt_template.format(
-                    rule_content=rule_content,
-                    files_context=chunk_files_context
-                )
-            
-            input_tokens = self._estimate_tokens(chunk_prompt)
-            max_tokens = self._calculate_max_tokens(input_tokens)
-            
-            print(f"Processing chunk {i}/{len(chunks)}...", file=sys.stderr)
-            chunk_result = self._make_api_call(chunk_prompt, max_tokens)
-            results.append(chunk_result)
-        
-        # If multiple chunks, combine results with a summary call
-        if len(chunks) > 1:
-            combined_results = "\n\n".join([
-                f"## Chunk {i+1} Results:\n{result}"
-                for i, result in enumerate(results)
-            ])
-            
-            summary_prompt = f"""You are executing a Secure Flow security rule. The codebase was analyzed in {len(chunks)} parts. Combine and synthesize the findings below into a comprehensive, actionable response.
-
-## Rule to Execute:
-{rule_content}
+                template = base_prompt_template
+            prompts.append(ChunkPrompt(template, chunk))
+        
+        return chunks, system, prompts
+    
+    @staticmethod
+    def _build_summary_prompt(results: List[str]) -> str:
+        """Build the prompt that combines the results of every chunk"""
+        combined_results = "\n\n".join([
+            f"## Chunk {i+1} Results:\n{result}"
+            for i, result in enumerate(results)
+        ])
+        
+        return f"""The codebase was analyzed in {len(results)} parts. Combine and synthesize the findings below into a comprehensive, actionable response.
 
 ## Analysis Results from All Chunks:
 {combined_results}
@@ -317,10 +743,357 @@ Provide a unified, comprehensive response that:
 5. Follows the implementation checklist in the rule
 
 Be thorough, specific, and actionable. Focus on security best practices."""
-            
-            summary_tokens = self._estimate_tokens(summary_prompt)
-            max_tokens = self._calculate_max_tokens(summary_tokens)
-            return self._make_api_call(summary_prompt, max_tokens)
+    
+    @staticmethod
+    def _build_merge_prompt(results: List[str], first: int, total: int) -> str:
+        """Build the prompt that merges one group of results during a tree reduce"""
+        combined_results = "\n\n".join([
+            f"## Part {first + i} Results:\n{result}"
+            for i, result in enumerate(results)
+        ])
         
-        return results[0] if results else ""
+        return f"""The codebase was analyzed in parts and the findings are being merged in groups. Below are the results for parts {first}-{first + len(results) - 1} of {total}. Merge them into one consolidated set of findings.
+
+## Results to Merge:
+{combined_results}
+
+Produce a merged result that:
+1. Keeps every distinct finding with its file, location and details
+2. Removes duplicate findings
+3. Keeps all specific, actionable guidance and code changes
 
+Do not drop findings; a later step combines this result with the other merged groups."""
+    
+    def _group_for_reduce(self, system: str, results: List[str]) -> List[List[str]]:
+        """Split results into consecutive groups whose merge prompts fit the input budget
+        
+        The fan-in of each group follows from the token budget, with at least two
+        results per group so every level of the reduce makes progress.
+        """
+        budget = (
+            self.safe_input_tokens
+            - self._estimate_tokens(system)
+            - self._estimate_tokens(self._build_merge_prompt([], 1, 1))
+        )
+        groups = []
+        group = []
+        group_tokens = 0
+        
+        for result in results:
+            tokens = self._estimate_tokens(result) + 10  # Part header
+            if group and group_tokens + tokens > budget and len(group) >= 2:
+                groups.append(group)
+                group = []
+                group_tokens = 0
+            group.append(result)
+            group_tokens += tokens
+        
+        if group:
+            groups.append(group)
+        return groups
+    
+    def _reduce_results(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        pending: Dict[str, List[str]],
+        on_token: Optional[Callable[[str, str], None]] = None,
+        checkpoint: Optional[RunCheckpoint] = None
+    ) -> Dict[str, str]:
+        """Tree-reduce the chunk results of each rule until one result remains
+        
+        Each level merges groups of results in parallel, across all rules, and the
+        final level is the summary call. This keeps every reduce prompt within the
+        context window however many chunks there are.
+        """
+        reduced = {}
+        level = 0
+        
+        while pending:
+            level += 1
+            items, owners, carried, announce = self._plan_reduce_level(jobs, pending, level)
+            merged = self._map_prompts(items, announce, on_token, checkpoint, kind='reduce')
+            pending = self._apply_reduce_level(owners, merged, reduced, carried)
+        
+        return reduced
+    
+    def _plan_reduce_level(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        pending: Dict[str, List[str]],
+        level: int
+    ) -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, Optional[int]]], Dict[str, List[Optional[str]]], bool]:
+        """Plan the merge and summary calls of one level of the tree reduce
+        
+        Returns the calls, the (rule id, group index or None for a summary) each one
+        answers, the groups of each rule that need no call, and whether to report progress.
+        """
+        items = []
+        owners = []
+        carried = {}
+        merging = False
+        
+        for rule_id, results in pending.items():
+            system = self._build_rule_system(jobs[rule_id][0])
+            scope = f" of {rule_id}" if len(jobs) > 1 else ""
+            groups = self._group_for_reduce(system, results)
+            
+            if len(groups) == 1:
+                items.append((f"summary{scope}", system, self._build_summary_prompt(results)))
+                owners.append((rule_id, None))
+                continue
+            
+            merging = True
+            print(f"Merging {len(results)} results{scope} in {len(groups)} groups (level {level})...", file=sys.stderr)
+            carried[rule_id] = [None] * len(groups)
+            first = 1
+            for g, group in enumerate(groups):
+                if len(group) == 1:
+                    # A lone result needs no merge call
+                    carried[rule_id][g] = group[0]
+                else:
+                    label = f"merge {level}.{g + 1}/{len(groups)}{scope}"
+                    items.append((label, system, self._build_merge_prompt(group, first, len(results))))
+                    owners.append((rule_id, g))
+                first += len(group)
+        
+        return items, owners, carried, len(jobs) > 1 or merging
+    
+    @staticmethod
+    def _apply_reduce_level(
+        owners: List[Tuple[str, Optional[int]]],
+        merged: List[str],
+        reduced: Dict[str, str],
+        carried: Dict[str, List[Optional[str]]]
+    ) -> Dict[str, List[str]]:
+        """Store the results of one reduce level: summaries in `reduced`; returns what the next level merges"""
+        for (rule_id, g), result in zip(owners, merged):
+            if g is None:
+                reduced[rule_id] = result
+            else:
+                carried[rule_id][g] = result
+        return carried
+    
+    @staticmethod
+    def _merge_results(rule_id: str, results: List[str], windows: Optional[Mapping[str, Tuple[str, int, int]]] = None) -> str:
+        """Merge the structured findings of a rule's chunks into one report, without a model call
+        
+        A chunk whose response has no valid findings keeps its text in the report,
+        so nothing the model said is lost. Findings in line windows are placed in
+        their files with `windows`.
+        """
+        findings = []
+        unparsed = []
+        for i, result in enumerate(results, 1):
+            chunk_findings, errors = parse_findings(result, rule_id, windows)
+            findings.extend(chunk_findings)
+            if errors and not chunk_findings:
+                unparsed.append(f"## Chunk {i} of {len(results)} (not in the findings format)\n\n{result.strip()}")
+        merged = merge_findings(findings)
+        report = format_findings(merged)
+        if len(merged) < len(findings):
+            report = f"{report}\n\n({len(findings) - len(merged)} duplicate finding(s) across {len(results)} chunks merged)"
+        return "\n\n".join([report] + unparsed)
+    
+    def run_rule(
+        self,
+        rule_content: str,
+        codebase_context: Dict[str, str],
+        manifest: Optional[FindingsManifest] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        summarize: bool = False
+    ) -> str:
+        """Execute a rule with codebase context, splitting into multiple calls if needed
+        
+        When a manifest is given, chunks whose files are unchanged since the last run
+        reuse their stored findings and only the merge step is recomputed.
+        When `on_token` is given, responses are streamed and it is called with
+        (label, text) as text arrives, where label names the chunk or summary.
+        `summarize` is as in `run_rules`.
+        """
+        manifests = {"": manifest} if manifest is not None else None
+        return self.run_rules({"": (rule_content, codebase_context)}, manifests, on_token, summarize)[""]
+    
+    def stream_rule(self, rule_content: str, codebase_context: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+        """Execute a rule, yielding (label, text) pieces of every chunk and summary as they arrive"""
+        pieces = queue.Queue()
+        done = object()
+        outcome = {}
+        
+        def execute():
+            try:
+                self.run_rule(rule_content, codebase_context, on_token=lambda label, text: pieces.put((label, text)))
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                pieces.put(done)
+        
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(execute,), daemon=True)
+        worker.start()
+        while True:
+            piece = pieces.get()
+            if piece is done:
+                break
+            yield piece
+        worker.join()
+        
+        if 'error' in outcome:
+            raise outcome['error']
+    
+    def run_rules(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        manifests: Optional[Dict[str, FindingsManifest]] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        summarize: bool = False
+    ) -> Dict[str, str]:
+        """Execute several rules, scheduling every (rule, chunk) call on one shared worker pool
+        
+        `jobs` maps a rule id to its (rule_content, codebase_context) pair. Results are
+        returned under the same rule ids. `on_token` behaves as in `run_rule`.
+        A rule analysed in several chunks gets structured findings from each, merged
+        locally into one report; with `summarize`, the chunks' free-form results are
+        instead combined by model calls.
+        """
+        plans, results, checkpoint = self._run_chunks(jobs, manifests, on_token, merge_locally=not summarize)
+        
+        pending = {rule_id: results[rule_id] for rule_id, chunks in plans.items() if len(chunks) > 1}
+        if summarize:
+            # Combined by a tree reduce, also in parallel
+            with self.telemetry.span('reduce', rules=len(pending)):
+                summaries = self._reduce_results(jobs, pending, on_token, checkpoint)
+        else:
+            summaries = self._merge_pending(jobs, pending, on_token)
+        return self._finish_run(jobs, results, summaries, checkpoint)
+    
+    def _merge_pending(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        pending: Dict[str, List[str]],
+        on_token: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, str]:
+        """Merge the chunk findings of each rule analysed in several chunks, without model calls"""
+        with self.telemetry.span('merge', rules=len(pending)):
+            summaries = {rule_id: self._merge_results(rule_id, chunk_results, self.windows) for rule_id, chunk_results in pending.items()}
+        if on_token is not None:
+            for rule_id, summary in summaries.items():
+                on_token(f"merged findings of {rule_id}" if len(jobs) > 1 else "merged findings", summary)
+        return summaries
+    
+    @staticmethod
+    def _finish_run(
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        results: Dict[str, List[str]],
+        summaries: Dict[str, str],
+        checkpoint: Optional[RunCheckpoint]
+    ) -> Dict[str, str]:
+        """Complete the run's checkpoint and return one result per rule"""
+        if checkpoint is not None:
+            checkpoint.complete()
+        
+        return {
+            rule_id: summaries.get(rule_id, results[rule_id][0] if results[rule_id] else "")
+            for rule_id in jobs
+        }
+    
+    def run_rules_structured(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        on_result: Callable[[str, str], None],
+        manifests: Optional[Dict[str, FindingsManifest]] = None
+    ) -> None:
+        """Execute several rules for structured findings (see findings.FINDING_SCHEMA)
+        
+        `on_result` is called with (rule_id, response) as soon as each chunk's response
+        is complete, from the worker thread that produced it. Findings need no summary,
+        so no merge or summary calls are made.
+        """
+        _, _, checkpoint = self._run_chunks(jobs, manifests, structured=True, on_result=on_result)
+        if checkpoint is not None:
+            checkpoint.complete()
+    
+    def _run_chunks(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        manifests: Optional[Dict[str, FindingsManifest]] = None,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        structured: bool = False,
+        on_result: Optional[Callable[[str, str], None]] = None,
+        merge_locally: bool = False
+    ) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, List[str]], Optional[RunCheckpoint]]:
+        """Plan and run the chunk calls of several rules (the map phase)
+        
+        Returns each rule's chunks and chunk results, and the run's checkpoint, which
+        the caller completes once any reduce calls are done. `merge_locally` is passed
+        on to `_plan_rule`.
+        """
+        plan = self._plan_map(jobs, manifests, structured, on_result, merge_locally)
+        plan.replay_stored(on_token, on_result)
+        with self.telemetry.span('map', calls=len(plan.items)):
+            mapped = self._map_prompts(plan.items, plan.announce, on_token, plan.checkpoint, plan.item_done)
+        return plan.finish(mapped)
+    
+    def _plan_map(
+        self,
+        jobs: Dict[str, Tuple[str, Dict[str, str]]],
+        manifests: Optional[Dict[str, FindingsManifest]] = None,
+        structured: bool = False,
+        on_result: Optional[Callable[[str, str], None]] = None,
+        merge_locally: bool = False
+    ) -> MapPlan:
+        """Plan the chunk calls of several rules, looking up stored findings and opening the checkpoint
+        
+        Does no callbacks, so it may run off the caller's thread; stored findings are
+        passed on by MapPlan.replay_stored.
+        """
+        plan = MapPlan(manifests or {})
+        plans = plan.plans
+        results = plan.results
+        keys = plan.keys
+        items = plan.items
+        owners = plan.owners
+        
+        plan_span = self.telemetry.start_span('plan', rules=len(jobs))
+        for rule_id, (rule_content, codebase_context) in jobs.items():
+            chunks, system, prompts = self._plan_rule(rule_content, codebase_context, structured, merge_locally)
+            plans[rule_id] = chunks
+            results[rule_id] = [None] * len(chunks)
+            
+            manifest = plan.manifests.get(rule_id)
+            if manifest is not None:
+                # Keyed by the system prompt, so free-form and structured findings never mix
+                keys[rule_id] = [
+                    FindingsManifest.chunk_key(system, self.provider, self.model, chunk)
+                    for chunk in chunks
+                ]
+                for i, key in enumerate(keys[rule_id]):
+                    results[rule_id][i] = manifest.get(key)
+                reused = sum(1 for result in results[rule_id] if result is not None)
+                if reused:
+                    scope = f" of {rule_id}" if len(jobs) > 1 else ""
+                    print(f"Reusing stored findings for {reused}/{len(chunks)} unchanged chunk(s){scope}", file=sys.stderr)
+            
+            for i, prompt in enumerate(prompts):
+                if len(jobs) > 1:
+                    label = f"{rule_id} chunk {i + 1}/{len(chunks)}"
+                else:
+                    label = f"chunk {i + 1}/{len(chunks)}"
+                if results[rule_id][i] is not None:
+                    plan.stored.append((label, rule_id, results[rule_id][i]))
+                    continue
+                items.append((label, system, prompt))
+                owners.append((rule_id, i))
+        plan_span.set(chunks=sum(len(chunks) for chunks in plans.values()), calls=len(items))
+        plan_span.end()
+        
+        if self.checkpoint_dir is not None:
+            run_key = RunCheckpoint.run_key(self.provider, self.model, [(system, prompt.key()) for _, system, prompt in items])
+            checkpoint = plan.checkpoint = RunCheckpoint(run_key, self.checkpoint_dir)
+            if checkpoint.resumed:
+                print(f"Resuming: {checkpoint.resumed} completed call(s) restored from checkpoint", file=sys.stderr)
+        
+        if on_result is not None:
+            plan.item_done = lambda index, result: on_result(owners[index][0], result)
+        
+        # Progress is only worth reporting when there is more than one call
+        plan.announce = len(jobs) > 1 or any(len(chunks) > 1 for chunks in plans.values())
+        return plan
@@ -0,0 +1,86 @@
+"""
+Findings manifest for incremental rule execution
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+# Project-local so the manifest can be persisted between CI runs alongside the checkout
+MANIFEST_DIR = Path(".secure-flow") / "manifests"
+
+
+def hash_content(content: str) -> str:
+    """Return the sha256 hex digest of a file's content"""
+    return hashlib.sha256(content.encode('utf-8', errors='replace')).hexdigest()
+
+
+class FindingsManifest:
+    """Per-rule record of chunk findings keyed by the content of each chunk's files"""
+    
+    VERSION = 1
+    
+    def __init__(self, rule_id: str, manifest_dir: Optional[Path] = None):
+        self.rule_id = rule_id
+        self.path = Path(manifest_dir or MANIFEST_DIR) / f"{rule_id}.json"
+        self._lock = threading.Lock()
+        self._chunks = self._load()
+        self._seen = set()
+        self.reused = 0
+        self.recorded = 0
+    
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self.VERSION or data.get('rule_id') != self.rule_id:
+            return {}
+        return data.get('chunks', {})
+    
+    @staticmethod
+    def chunk_key(rule_prompt: str, provider: str, model: str, chunk: Dict[str, str]) -> str:
+        """Build the key identifying a chunk's findings for a rule's system prompt"""
+        members = sorted((filepath, hash_content(content)) for filepath, content in chunk.items())
+        payload = json.dumps([hash_content(rule_prompt), provider, model, members])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return stored findings for a chunk whose member files are unchanged"""
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is None:
+                return None
+            self._seen.add(key)
+            self.reused += 1
+            return entry['findings']
+    
+    def record(self, key: str, chunk: Dict[str, str], findings: str) -> None:
+        """Store the findings for a freshly analysed chunk"""
+        with self._lock:
+            self._chunks[key] = {
+                'files': {filepath: hash_content(content) for filepath, content in chunk.items()},
+                'findings': findings,
+            }
+            self._seen.add(key)
+            self.recorded += 1
+    
+    def save(self) -> None:
+        """Write the manifest, keeping only chunks that were part of this run"""
+        with self._lock:
+            chunks = {key: entry for key, entry in self._chunks.items() if key in self._seen}
+        
+        data = json.dumps({
+            'version': self.VERSION,
+            'rule_id': self.rule_id,
+            'chunks': chunks,
+        }, indent=2, ensure_ascii=False)
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,326 @@
+"""
+Deterministic local stand-in for a provider, to measure the CLI's own overhead
+
+`--provider mock` answers every call in-process, through the same request, retry,
+streaming and usage code paths as Anthropic, with configurable latency, output
+throughput, error rate and response size. Settings come from SECURE_FLOW_MOCK, e.g.
+
+    SECURE_FLOW_MOCK="latency=0.8,latency_sigma=0.3,tokens_per_second=80,output_tokens=400,error_rate=0.02"
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from .findings import FINDINGS_INSTRUCTIONS, SEVERITIES
+
+MOCK_ENV = 'SECURE_FLOW_MOCK'
+CHARS_PER_TOKEN = 4
+FILE_HEADER_PATTERN = re.compile(r'^## File: (.+)$', re.MULTILINE)
+
+WORDS = (
+    "input", "validation", "token", "session", "secret", "header", "request", "handler",
+    "query", "parameter", "sanitize", "escape", "policy", "access", "control", "config",
+)
+
+
+class MockSettings:
+    """How the mock provider behaves; every setting defaults to an instant, error-free reply"""
+    
+    # name: (type, default, description)
+    FIELDS = {
+        'latency': (float, 0.0, "median seconds before the first token"),
+        'latency_sigma': (float, 0.0, "log-normal spread of the latency (0: always the median)"),
+        'tokens_per_second': (float, 0.0, "output throughput (0: the whole response at once)"),
+        'output_tokens': (int, 200, "median response size in tokens"),
+        'output_sigma': (float, 0.0, "log-normal spread of the response size"),
+        'error_rate': (float, 0.0, "probability that a call fails with a retryable overloaded error"),
+        'retry_after': (float, 0.05, "seconds the failed call asks the client to wait before retrying"),
+        'seed': (int, 0, "seed of every random draw"),
+    }
+    
+    def __init__(self, **settings: Any):
+        for name, (kind, default, _) in self.FIELDS.items():
+            setattr(self, name, kind(settings.pop(name, default)))
+        if settings:
+            raise ValueError(f"Unknown mock setting(s): {', '.join(sorted(settings))}")
+        if not 0.0 <= self.error_rate < 1.0:
+            raise ValueError("Mock error_rate must be at least 0 and below 1")
+    
+    @classmethod
+    def parse(cls, spec: str) -> "MockSettings":
+        """Parse comma-separated name=value settings"""
+        settings = {}
+        for item in spec.split(','):
+            if not item.strip():
+                continue
+            name, separator, value = item.partition('=')
+            if not separator:
+                raise ValueError(f"Mock setting '{item.strip()}' must be name=value")
+            settings[name.strip()] = value.strip()
+        return cls(**settings)
+    
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        return cls.parse(os.environ.get(MOCK_ENV, ''))
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class MockProviderError(Exception):
+    """A transient provider failure, shaped like the SDKs' API errors"""
+    
+    status_code = 529
+    
+    def __init__(self, retry_after: float):
+        super().__init__("Overloaded (simulated by the mock provider)")
+        
+        class Response:
+            headers = {'retry-after-ms': str(int(retry_after * 1000))}
+        
+        self.response = Response()
+
+
+class _Usage:
+    def __init__(self, input_tokens: int, output_tokens: int, cache_read: int, cache_write: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_input_tokens = cache_read
+        self.cache_creation_input_tokens = cache_write
+
+
+class _TextBlock:
+    type = 'text'
+    
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Message:
+    def __init__(self, text: str, usage: _Usage):
+        self.content = [_TextBlock(text)]
+        self.usage = usage
+
+
+class _Stream:
+    """Context manager with the `text_stream` and `get_final_message` of an Anthropic stream"""
+    
+    def __init__(self, reply: "_Reply"):
+        self._reply = reply
+    
+    def __enter__(self) -> "_Stream":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+    
+    @property
+    def text_stream(self) -> Iterator[str]:
+        return self._reply.pieces()
+    
+    def get_final_message(self) -> _Message:
+        return self._reply.message
+
+
+class _Reply:
+    """A drawn response: its text, usage and timing"""
+    
+    PIECE_TOKENS = 8  # Tokens per streamed piece
+    
+    def __init__(self, text: str, usage: _Usage, latency: float, tokens_per_second: float):
+        self.message = _Message(text, usage)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+    
+    def wait(self) -> None:
+        """Sleep for as long as producing the whole response takes"""
+        time.sleep(self.latency + self._generation_time(self.message.usage.output_tokens))
+    
+    def pieces(self) -> Iterator[str]:
+        text = self.message.content[0].text
+        step = self.PIECE_TOKENS * CHARS_PER_TOKEN
+        time.sleep(self.latency)
+        for start in range(0, len(text), step):
+            time.sleep(self._generation_time(self.PIECE_TOKENS))
+            yield text[start:start + step]
+    
+    async def wait_async(self) -> None:
+        await asyncio.sleep(self.latency + self._generation_time(self.message.usage.output_tokens))
+    
+    async def pieces_async(self) -> AsyncIterator[str]:
+        text = self.message.content[0].text
+        step = self.PIECE_TOKENS * CHARS_PER_TOKEN
+        await asyncio.sleep(self.latency)
+        for start in range(0, len(text), step):
+            await asyncio.sleep(self._generation_time(self.PIECE_TOKENS))
+            yield text[start:start + step]
+    
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class _Messages:
+    def __init__(self, client: "MockClient"):
+        self._client = client
+    
+    def create(self, **request: Any) -> _Message:
+        reply = self._client.reply(request)
+        reply.wait()
+        return reply.message
+    
+    def stream(self, **request: Any) -> _Stream:
+        return _Stream(self._client.reply(request))
+
+
+class _AsyncStream:
+    """Async context manager with the `text_stream` and `get_final_message` of an AsyncAnthropic stream"""
+    
+    def __init__(self, reply: _Reply):
+        self._reply = reply
+    
+    async def __aenter__(self) -> "_AsyncStream":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> bool:
+        return False
+    
+    @property
+    def text_stream(self) -> AsyncIterator[str]:
+        return self._reply.pieces_async()
+    
+    async def get_final_message(self) -> _Message:
+        return self._reply.message
+
+
+class _AsyncMessages:
+    def __init__(self, client: "MockClient"):
+        self._client = client
+    
+    async def create(self, **request: Any) -> _Message:
+        reply = self._client.reply(request)
+        await reply.wait_async()
+        return reply.message
+    
+    def stream(self, **request: Any) -> _AsyncStream:
+        return _AsyncStream(self._client.reply(request))
+
+
+class MockClient:
+    """In-process replacement for the Anthropic SDK client: `messages.create` and `messages.stream`
+    
+    Every draw is seeded from the request and the number of times that request was
+    made before, so a run gives the same responses, timings and failures whatever
+    order its concurrent calls happen in. System prompts marked for caching are
+    reported as prompt-cache reads after the first call, as Anthropic does.
+    """
+    
+    # Summed over every mock client of the process, for benchmarks to report
+    totals = {'calls': 0, 'errors': 0, 'input_tokens': 0, 'output_tokens': 0}
+    _totals_lock = threading.Lock()
+    
+    def __init__(self, settings: Optional[MockSettings] = None):
+        self.settings = settings or MockSettings()
+        self.messages = _Messages(self)
+        self.calls = 0
+        self._attempts: Dict[str, int] = {}
+        self._cached_systems = set()
+        self._lock = threading.Lock()
+    
+    def reply(self, request: Dict[str, Any]) -> _Reply:
+        """Draw the response to a request, or raise the simulated error it fails with"""
+        system = "".join(block['text'] for block in request.get('system') or [])
+        prompt = "".join(message['content'] for message in request['messages'])
+        digest = hashlib.sha256(f"{self.settings.seed}\0{system}\0{prompt}".encode('utf-8')).hexdigest()
+        
+        cacheable = any('cache_control' in block for block in request.get('system') or [])
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+            cached = cacheable and system in self._cached_systems
+            if cacheable:
+                self._cached_systems.add(system)
+        rng = random.Random(f"{digest}:{attempt}")
+        
+        settings = self.settings
+        if rng.random() < settings.error_rate:
+            self._add_totals(calls=1, errors=1)
+            raise MockProviderError(settings.retry_after)
+        
+        output_tokens = max(1, min(request['max_tokens'], round(self._lognormal(rng, settings.output_tokens, settings.output_sigma))))
+        if FINDINGS_INSTRUCTIONS in system:
+            text = self._findings_text(rng, prompt)
+            output_tokens = len(text) // CHARS_PER_TOKEN
+        else:
+            text = self._prose(rng, output_tokens)
+        
+        system_tokens = len(system) // CHARS_PER_TOKEN
+        usage = _Usage(
+            # As with Anthropic, input_tokens excludes the cached prefix
+            input_tokens=len(prompt) // CHARS_PER_TOKEN + (0 if cacheable else system_tokens),
+            output_tokens=output_tokens,
+            cache_read=system_tokens if cached else 0,
+            cache_write=system_tokens if cacheable and not cached else 0
+        )
+        self._add_totals(
+            calls=1,
+            input_tokens=usage.input_tokens + usage.cache_read_input_tokens + usage.cache_creation_input_tokens,
+            output_tokens=output_tokens
+        )
+        latency = self._lognormal(rng, settings.latency, settings.latency_sigma)
+        return _Reply(text, usage, latency, settings.tokens_per_second)
+    
+    @classmethod
+    def _add_totals(cls, **counts: int) -> None:
+        with cls._totals_lock:
+            for name, count in counts.items():
+                cls.totals[name] += count
+    
+    @staticmethod
+    def _lognormal(rng: random.Random, median: float, sigma: float) -> float:
+        if median <= 0 or sigma <= 0:
+            return max(0.0, median)
+        return median * math.exp(rng.gauss(0.0, sigma))
+    
+    @staticmethod
+    def _prose(rng: random.Random, tokens: int) -> str:
+        # Words of about CHARS_PER_TOKEN characters, so the text is about `tokens` long
+        return " ".join(rng.choice(WORDS)[:CHARS_PER_TOKEN - 1] for _ in range(tokens))
+    
+    @staticmethod
+    def _findings_text(rng: random.Random, prompt: str) -> str:
+        """A JSON findings response (see findings.py) naming files of the prompt"""
+        files: List[str] = FILE_HEADER_PATTERN.findall(prompt)
+        findings = []
+        for filepath in files:
+            if rng.random() < 0.3:
+                line = rng.randint(1, 200)
+                findings.append({
+                    'file': filepath,
+                    'start_line': line,
+                    'end_line': line + rng.randint(0, 5),
+                    'severity': rng.choice(SEVERITIES),
+                    'rule_id': 'mock',
+                    'title': f"Mock finding in {filepath}",
+                    'description': "Generated by the mock provider.",
+                    'remediation': "No change needed; this finding is synthetic.",
+                })
+        return json.dumps({'findings': findings})
+
+
+class AsyncMockClient(MockClient):
+    """The mock client with the awaitable `messages` of the AsyncAnthropic SDK client"""
+    
+    def __init__(self, settings: Optional[MockSettings] = None):
+        super().__init__(settings)
+        self.messages = _AsyncMessages(self)
+    
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,156 @@
+"""
+Rate limiting and retry scheduling for LLM API calls
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors and overload
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Transport errors raised by both provider SDKs
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError'}
+
+
+class RateLimiter:
+    """Thread-safe token-bucket limiter for requests and tokens per minute"""
+    
+    _shared: Dict[Tuple[str, Optional[int], Optional[int]], "RateLimiter"] = {}
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._last_refill = time.monotonic()
+        # Buckets start full so short runs are never delayed
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._paused_until = 0.0
+    
+    @classmethod
+    def shared(cls, scope: str, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None) -> "RateLimiter":
+        """Return the process-wide limiter for a scope (e.g. a provider) and budget"""
+        key = (scope, requests_per_minute, tokens_per_minute)
+        with cls._shared_lock:
+            limiter = cls._shared.get(key)
+            if limiter is None:
+                limiter = cls._shared[key] = cls(requests_per_minute, tokens_per_minute)
+            return limiter
+    
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds`, e.g. after the provider answered 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+    
+    @property
+    def paused(self) -> bool:
+        """Whether callers are held back by `pause`, which applies even without a budget"""
+        return self._paused_until > time.monotonic()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                float(self.requests_per_minute),
+                self._request_allowance + elapsed * self.requests_per_minute / 60.0
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                float(self.tokens_per_minute),
+                self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+            )
+    
+    def _reserve(self, tokens: int) -> float:
+        """Take one request carrying `tokens` tokens from the buckets, or return how long to wait first"""
+        with self._lock:
+            self._refill()
+            wait = self._paused_until - time.monotonic()
+            if self.requests_per_minute and self._request_allowance < 1:
+                wait = max(wait, (1 - self._request_allowance) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute and self._token_allowance < tokens:
+                wait = max(wait, (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+            if self.requests_per_minute:
+                self._request_allowance -= 1
+            if self.tokens_per_minute:
+                self._token_allowance -= tokens
+            return 0.0
+    
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until one request carrying `tokens` tokens fits within the budget"""
+        if not self.enabled and not self.paused:
+            return
+        
+        # A single request larger than the whole per-minute budget waits for a full bucket
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+    
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """As `acquire`, but waits without blocking the event loop"""
+        if not self.enabled and not self.paused:
+            return
+        
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a provider error is transient and the request worth retrying"""
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    return getattr(error, 'status_code', None) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the delay requested by the provider's retry-after headers, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    # Otherwise an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (starting at 1)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
@@ -0,0 +1,216 @@
+"""
+Relevance pre-filter: drop files that cannot matter to a rule before they are chunked and sent
+
+A rule may declare signals in its frontmatter:
+    
+    relevance:
+      include: ['Dockerfile*', '*.dockerfile']   # path globs
+      keywords: ['FROM', 'apt-get']              # case-insensitive substrings
+      patterns: ['(?i)api[_-]?key']             # regular expressions
+
+A file is kept when its language is one of the rule's languages (or unknown) and,
+if the rule declares signals, at least one of them matches. Optionally the files
+left are ranked with BM25 against the rule text and only the best are kept.
+"""
+import fnmatch
+import math
+import re
+from collections import Counter
+from pathlib import PurePath
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .context import detect_language, subset_context
+from .tokens import TokenCounter
+
+RELEVANCE_FIELDS = ('include', 'keywords', 'patterns')
+
+# BM25 parameters, the usual defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TERM_PATTERN = re.compile(r'[a-z][a-z0-9]{2,}')
+# Words of rule prose that say nothing about which files matter
+STOPWORDS = frozenset("""
+about after all also and any are based before being both but can code could does each
+ensure example file files for from has have how into its may more must not only other
+over per rule should such than that the their them then there these this those use used
+using via when where which while will with within without you your
+""".split())
+
+
+def relevance_errors(relevance: Any) -> List[str]:
+    """Check a rule's `relevance` frontmatter; returns one message per problem"""
+    if not isinstance(relevance, dict):
+        return ["'relevance' must be a mapping of include, keywords and patterns"]
+    
+    errors = []
+    for name in relevance:
+        if name not in RELEVANCE_FIELDS:
+            errors.append(f"Unknown 'relevance' field: {name}")
+    for name in RELEVANCE_FIELDS:
+        values = relevance.get(name, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            errors.append(f"'relevance.{name}' must be a list of strings")
+    for pattern in relevance.get('patterns', []) if isinstance(relevance.get('patterns'), list) else []:
+        try:
+            re.compile(str(pattern))
+        except re.error as e:
+            errors.append(f"Invalid 'relevance.patterns' regex {pattern!r}: {e}")
+    return errors
+
+
+def terms(text: str) -> List[str]:
+    """Split text into lowercase word terms for ranking; identifiers split at _ and -"""
+    return TERM_PATTERN.findall(text.lower())
+
+
+class RelevanceReport:
+    """What a pre-filter pass kept and dropped"""
+    
+    def __init__(self):
+        self.total_files = 0
+        self.kept_files = 0
+        self.total_tokens = 0
+        self.kept_tokens = 0
+        self.dropped: Dict[str, int] = {'language': 0, 'no signal': 0, 'rank': 0}
+    
+    def add(self, other: "RelevanceReport") -> None:
+        """Add another pass's counts to this one, e.g. to total every rule of a batch"""
+        self.total_files += other.total_files
+        self.kept_files += other.kept_files
+        self.total_tokens += other.total_tokens
+        self.kept_tokens += other.kept_tokens
+        for reason, count in other.dropped.items():
+            self.dropped[reason] += count
+    
+    @property
+    def saved_tokens(self) -> int:
+        return self.total_tokens - self.kept_tokens
+    
+    def summary(self, scope: str = "") -> Optional[str]:
+        """Describe the savings, or None if every file was kept"""
+        if self.kept_files == self.total_files:
+            return None
+        reasons = ", ".join(f"{count} {reason}" for reason, count in self.dropped.items() if count)
+        share = self.saved_tokens / self.total_tokens if self.total_tokens else 0.0
+        return (
+            f"Pre-filter{scope}: kept {self.kept_files}/{self.total_files} file(s), dropped {reasons}; "
+            f"saved ~{self.saved_tokens:,} tokens ({share:.0%})"
+        )
+
+
+class RelevanceFilter:
+    """Selects the files of a codebase context worth sending for one rule"""
+    
+    def __init__(
+        self,
+        languages: Optional[List[str]] = None,
+        include: Optional[List[str]] = None,
+        keywords: Optional[List[str]] = None,
+        patterns: Optional[List[str]] = None,
+        query: str = "",
+        top_files: Optional[int] = None,
+        count_tokens: Optional[Callable[[str, str], int]] = None
+    ):
+        # `languages` None or empty accepts every language; `top_files` None disables ranking
+        self.languages = {language.lower() for language in languages or []}
+        self.include = list(include or [])
+        self.keywords = list(keywords or [])
+        self.patterns = [re.compile(pattern) for pattern in patterns or []]
+        # One scan per file for every keyword
+        self._keyword_pattern = None
+        if self.keywords:
+            self._keyword_pattern = re.compile('|'.join(re.escape(keyword) for keyword in self.keywords), re.IGNORECASE)
+        self.query = query
+        self.top_files = top_files
+        self.count_tokens = count_tokens or TokenCounter().count_file
+    
+    @classmethod
+    def for_rule(cls, rule: Dict[str, Any], top_files: Optional[int] = None, **options: Any) -> "RelevanceFilter":
+        """Build the filter declared by a rule loaded with rules.load_rule"""
+        relevance = rule.get('relevance') or {}
+        # A field left empty in the frontmatter (`keywords:`) loads as None
+        keywords = relevance.get('keywords') or []
+        return cls(
+            languages=None if rule.get('alwaysApply') else rule.get('languages'),
+            include=relevance.get('include') or [],
+            keywords=keywords,
+            patterns=relevance.get('patterns') or [],
+            # The signals plus the rule's own text describe what a relevant file contains
+            query=" ".join(keywords) + "\n" + (rule.get('content') or ''),
+            top_files=top_files,
+            **options
+        )
+    
+    @property
+    def has_signals(self) -> bool:
+        return bool(self.include or self.keywords or self.patterns)
+    
+    def _language_matches(self, filepath: str) -> bool:
+        language = detect_language(filepath)
+        # Files of an undetected language are kept, as in context.filter_by_languages
+        return not self.languages or language is None or language in self.languages
+    
+    def _signal_matches(self, filepath: str, content: str) -> bool:
+        name = PurePath(filepath).name
+        if any(fnmatch.fnmatch(filepath, glob) or fnmatch.fnmatch(name, glob) for glob in self.include):
+            return True
+        if self._keyword_pattern is not None and self._keyword_pattern.search(content):
+            return True
+        return any(pattern.search(content) for pattern in self.patterns)
+    
+    def select(self, codebase_context: Mapping[str, str], keep: Iterable[str] = ()) -> Tuple[Mapping[str, str], RelevanceReport]:
+        """Return the relevant part of a codebase context and a report of what was dropped
+        
+        Files in `keep`, e.g. those the user named explicitly, are never dropped.
+        Each file is read once; a lazy context stays lazy.
+        """
+        keep = set(keep)
+        report = RelevanceReport()
+        tokens = {}
+        candidates = []
+        for filepath, content in codebase_context.items():
+            tokens[filepath] = self.count_tokens(filepath, content)
+            if filepath not in keep:
+                if not self._language_matches(filepath):
+                    report.dropped['language'] += 1
+                    continue
+                if self.has_signals and not self._signal_matches(filepath, content):
+                    report.dropped['no signal'] += 1
+                    continue
+            candidates.append(filepath)
+        
+        if self.top_files is not None and len(candidates) > self.top_files:
+            chosen = set(self.rank(subset_context(codebase_context, candidates))[:self.top_files]) | (keep & set(candidates))
+            report.dropped['rank'] = len(candidates) - len(chosen)
+            candidates = [filepath for filepath in candidates if filepath in chosen]
+        
+        report.total_files = len(codebase_context)
+        report.kept_files = len(candidates)
+        report.total_tokens = sum(tokens.values())
+        report.kept_tokens = sum(tokens[filepath] for filepath in candidates)
+        return subset_context(codebase_context, candidates), report
+    
+    def rank(self, codebase_context: Mapping[str, str]) -> List[str]:
+        """Order files by BM25 relevance to the rule, most relevant first; ties keep the context's order"""
+        query = set(term for term in terms(self.query) if term not in STOPWORDS)
+        documents = {}
+        lengths = {}
+        for filepath, content in codebase_context.items():
+            documents[filepath] = Counter(term for term in terms(filepath + "\n" + content) if term in query)
+            lengths[filepath] = max(1, len(content) // TokenCounter.CHARS_PER_TOKEN)
+        average_length = sum(lengths.values()) / max(1, len(lengths))
+        document_frequency = Counter(term for counts in documents.values() for term in counts)
+        total = len(documents)
+        
+        def score(filepath: str) -> float:
+            counts = documents[filepath]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[filepath] / average_length)
+            result = 0.0
+            for term, frequency in counts.items():
+                idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                result += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            return result
+        
+        order = {filepath: i for i, filepath in enumerate(codebase_context)}
+        return sorted(codebase_context, key=lambda filepath: (-score(filepath), order[filepath]))
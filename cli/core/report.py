@@ -0,0 +1,82 @@
+"""
+Machine-readable validation reports: JSON, SARIF and JUnit XML
+"""
+import json
+from typing import Dict, List, Tuple
+
+ValidationResults = Dict[str, Tuple[bool, List[str]]]
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "secure-flow"
+TOOL_URI = "https://github.com/plutosecurity/secure-flow"
+INVALID_RULE_ID = "invalid-rule-file"
+
+
+def validation_json(results: ValidationResults) -> str:
+    """Render validation results as a JSON document"""
+    return json.dumps({
+        'valid': sum(1 for is_valid, _ in results.values() if is_valid),
+        'total': len(results),
+        'results': [
+            {'file': name, 'valid': is_valid, 'errors': errors}
+            for name, (is_valid, errors) in results.items()
+        ],
+    }, indent=2, ensure_ascii=False)
+
+
+def validation_sarif(results: ValidationResults) -> str:
+    """Render validation results as a SARIF 2.1.0 log, one result per error"""
+    sarif_results = []
+    for name, (_, errors) in results.items():
+        for error in errors:
+            sarif_results.append({
+                'ruleId': INVALID_RULE_ID,
+                'level': 'error',
+                'message': {'text': error},
+                'locations': [{'physicalLocation': {'artifactLocation': {'uri': name}}}],
+            })
+    
+    return json.dumps({
+        '$schema': SARIF_SCHEMA,
+        'version': '2.1.0',
+        'runs': [{
+            'tool': {'driver': {
+                'name': TOOL_NAME,
+                'informationUri': TOOL_URI,
+                'rules': [{
+                    'id': INVALID_RULE_ID,
+                    'shortDescription': {'text': 'Rule file is not valid'},
+                }],
+            }},
+            'results': sarif_results,
+        }],
+    }, indent=2, ensure_ascii=False)
+
+
+def validation_junit(results: ValidationResults) -> str:
+    """Render validation results as JUnit XML, one test case per rule file"""
+    import xml.etree.ElementTree as ET
+    
+    failures = sum(1 for is_valid, _ in results.values() if not is_valid)
+    suite = ET.Element('testsuite', {
+        'name': f"{TOOL_NAME} validate",
+        'tests': str(len(results)),
+        'failures': str(failures),
+        'errors': '0',
+    })
+    for name, (is_valid, errors) in results.items():
+        case = ET.SubElement(suite, 'testcase', {'classname': 'rules', 'name': name})
+        if not is_valid:
+            failure = ET.SubElement(case, 'failure', {'message': errors[0] if errors else 'invalid'})
+            failure.text = "\n".join(errors)
+    
+    suites = ET.Element('testsuites')
+    suites.append(suite)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(suites, encoding='unicode')
+
+
+VALIDATION_FORMATTERS = {
+    'json': validation_json,
+    'sarif': validation_sarif,
+    'junit': validation_junit,
+}
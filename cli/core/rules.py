@@ -0,0 +1,236 @@
+"""
+Rule file loading and lookup, backed by a compiled rule index
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .config import CACHE_DIR, RULES_DIR
+
+RULE_ID_PATTERN = re.compile(r'rule_id:\s*(\S+)')
+RULE_INDEX_DIR = CACHE_DIR / "rule-index"
+
+
+def parse_frontmatter(content: str) -> Dict[str, Any]:
+    """Parse the YAML frontmatter of a rule file
+    
+    Raises ValueError if the frontmatter is missing or not closed.
+    """
+    # Imported here: with a warm rule index, listing rules never parses YAML
+    import yaml
+    
+    if not content.startswith('---'):
+        raise ValueError("Missing frontmatter (should start with '---')")
+    frontmatter_end = content.index('---', 3)
+    return yaml.safe_load(content[3:frontmatter_end].strip()) or {}
+
+
+class RuleIndex:
+    """Cached metadata of every rule file, refreshed incrementally
+    
+    Entries are keyed by file name and hold the rule_id, description, languages,
+    alwaysApply and the offset where the rule body starts, together with the mtime
+    and size they were compiled from. Only files whose mtime or size changed are
+    read and parsed again, so listing or looking up rules costs one stat per file.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, rules_dir: Path = RULES_DIR, index_path: Optional[Path] = None):
+        self.rules_dir = Path(rules_dir)
+        if index_path is None:
+            # One index per rules directory
+            digest = hashlib.sha256(str(self.rules_dir.resolve()).encode('utf-8')).hexdigest()[:16]
+            index_path = RULE_INDEX_DIR / f"{digest}.json"
+        self.index_path = Path(index_path)
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self._aliases = self._build_aliases()
+        self._dirty = False
+        # A daemon serves requests from several threads at once
+        self._lock = threading.RLock()
+    
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('entries', {})
+    
+    def _build_aliases(self) -> Dict[str, str]:
+        aliases = {}
+        for filename in self.entries:
+            aliases[Path(filename).stem] = filename
+        for filename, entry in self.entries.items():
+            aliases.setdefault(entry['rule_id'], filename)
+        return aliases
+    
+    @staticmethod
+    def compile_entry(content: str, stem: str) -> Dict[str, Any]:
+        """Extract the indexed metadata from a rule file's content
+        
+        Parse errors are recorded in the entry's 'error' field rather than raised.
+        """
+        entry = {
+            'rule_id': stem,
+            'description': 'No description',
+            'languages': [],
+            'alwaysApply': False,
+            'body_offset': 0,
+            'error': None,
+        }
+        
+        try:
+            frontmatter = parse_frontmatter(content)
+            entry['description'] = frontmatter.get('description', 'No description')
+            entry['languages'] = frontmatter.get('languages', []) or []
+            entry['alwaysApply'] = frontmatter.get('alwaysApply', False)
+            entry['body_offset'] = content.index('---', 3) + 3
+        except Exception as e:
+            entry['error'] = str(e)
+        
+        rule_id_match = RULE_ID_PATTERN.search(content)
+        if rule_id_match:
+            entry['rule_id'] = rule_id_match.group(1)
+        return entry
+    
+    def _refresh_entry(self, filename: str, stat: os.stat_result) -> None:
+        entry = self.entries.get(filename)
+        if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return
+        
+        stem = Path(filename).stem
+        try:
+            entry = self.compile_entry((self.rules_dir / filename).read_text(), stem)
+        except (OSError, UnicodeDecodeError) as e:
+            entry = self.compile_entry('', stem)
+            entry['error'] = str(e)
+        entry['mtime_ns'] = stat.st_mtime_ns
+        entry['size'] = stat.st_size
+        
+        self.entries[filename] = entry
+        self._aliases[stem] = filename
+        self._aliases.setdefault(entry['rule_id'], filename)
+        self._dirty = True
+    
+    def refresh(self) -> None:
+        """Bring the index up to date with the rules directory and persist any change"""
+        with self._lock:
+            seen = set()
+            try:
+                with os.scandir(self.rules_dir) as scan:
+                    for dir_entry in scan:
+                        if not dir_entry.name.endswith('.md') or not dir_entry.is_file():
+                            continue
+                        seen.add(dir_entry.name)
+                        self._refresh_entry(dir_entry.name, dir_entry.stat())
+            except OSError:
+                pass
+            
+            removed = set(self.entries) - seen
+            if removed:
+                for filename in removed:
+                    del self.entries[filename]
+                self._aliases = self._build_aliases()
+                self._dirty = True
+            self.save()
+    
+    def save(self) -> None:
+        """Write the index atomically if any entry changed"""
+        if not self._dirty:
+            return
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.index_path.parent), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # The index is only a cache; failing to persist it must not fail the command
+            return
+        self._dirty = False
+    
+    def rules(self) -> List[Dict[str, Any]]:
+        """Return every rule entry, sorted by file name, with its 'file' name and 'path'"""
+        with self._lock:
+            self.refresh()
+            return [self._with_path(filename) for filename in sorted(self.entries)]
+    
+    def find(self, rule_id: str) -> Optional[Dict[str, Any]]:
+        """Resolve a rule id or file name, with or without the secure-flow- prefix
+        
+        Only the matching file is checked for changes; the whole directory is only
+        rescanned when the id is not in the index yet.
+        """
+        with self._lock:
+            for attempt in range(2):
+                for alias in (rule_id, f"secure-flow-{rule_id}"):
+                    filename = self._aliases.get(alias)
+                    if filename is None:
+                        continue
+                    try:
+                        stat = (self.rules_dir / filename).stat()
+                    except OSError:
+                        continue
+                    self._refresh_entry(filename, stat)
+                    self.save()
+                    return self._with_path(filename)
+                if attempt == 0:
+                    # Unknown or stale id: pick up rules added or renamed since the last scan
+                    self.refresh()
+            return None
+    
+    def _with_path(self, filename: str) -> Dict[str, Any]:
+        entry = dict(self.entries[filename])
+        entry['file'] = filename
+        entry['path'] = self.rules_dir / filename
+        return entry
+
+
+_default_index: Optional[RuleIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_rule_index() -> RuleIndex:
+    """Return the process-wide index of RULES_DIR"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = RuleIndex()
+        return _default_index
+
+
+def find_rule_file(rule_id: str) -> Optional[Path]:
+    """Resolve a rule id, with or without the secure-flow- prefix, to its file"""
+    entry = get_rule_index().find(rule_id)
+    return entry['path'] if entry else None
+
+
+def load_rule(rule_file: Path) -> Dict[str, Any]:
+    """Load a rule file with its frontmatter metadata"""
+    content = rule_file.read_text()
+    frontmatter = parse_frontmatter(content)
+    rule_id_match = RULE_ID_PATTERN.search(content)
+    
+    return {
+        'rule_id': rule_id_match.group(1) if rule_id_match else rule_file.stem,
+        'path': rule_file,
+        'content': content,
+        'description': frontmatter.get('description', 'No description'),
+        'languages': frontmatter.get('languages', []) or [],
+        'alwaysApply': frontmatter.get('alwaysApply', False),
+        'relevance': frontmatter.get('relevance') or {},
+    }
+
+
+def list_rule_files() -> List[Path]:
+    """Return all rule files, sorted by name"""
+    if not RULES_DIR.exists():
+        return []
+    return [entry['path'] for entry in get_rule_index().rules()]
@@ -0,0 +1,281 @@
+"""
+The steps of a rule run as functions that return values
+
+The run and run-all commands print around these; library callers combine them with
+LLMClient or AsyncLLMClient, e.g. to serve many runs from one event loop:
+
+    context, _ = collect_context(["src"])
+    plan = plan_jobs({path.stem: load_rule(path) for path in resolve_rule_files()}, context)
+    async with build_client("anthropic", client_class=AsyncLLMClient) as llm:
+        results = await llm.run_rules(plan.jobs)
+
+execute_plan runs a plan as the commands do, writing structured findings as they arrive.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple, Type
+
+from .cache import ResponseCache
+from .checkpoint import CHECKPOINT_DIR
+from .config import RULES_DIR
+from .context import filter_by_languages
+from .diff import DEFAULT_DIFF_CONTEXT, DiffContext
+from .findings import FINDINGS_WRITERS, write_findings
+from .http_pool import DEFAULT_MAX_CONNECTIONS, DEFAULT_TIMEOUT, ConnectionPool
+from .llm_client import LLMClient
+from .manifest import FindingsManifest
+from .relevance import RelevanceFilter, RelevanceReport
+from .rules import find_rule_file, list_rule_files
+from .telemetry import NULL_TELEMETRY, Telemetry, export_telemetry
+from .walker import DEFAULT_MAX_FILE_SIZE, collect_codebase_context
+
+
+class RuleNotFoundError(Exception):
+    """No rule file matches a rule id"""
+    
+    def __init__(self, rule_id: str):
+        super().__init__(f"Rule '{rule_id}' not found in {RULES_DIR}")
+        self.rule_id = rule_id
+
+
+def resolve_rule_files(rule_ids: Optional[List[str]] = None) -> List[Path]:
+    """Return the files of the given rules (with or without the secure-flow- prefix), or of every rule"""
+    if not rule_ids:
+        return list_rule_files()
+    rule_files = []
+    for rule_id in rule_ids:
+        rule_file = find_rule_file(rule_id)
+        if rule_file is None:
+            raise RuleNotFoundError(rule_id)
+        rule_files.append(rule_file)
+    return rule_files
+
+
+def collect_context(
+    files: List[str],
+    paths: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    diff: Optional[str] = None,
+    diff_window: int = DEFAULT_DIFF_CONTEXT,
+    telemetry: Telemetry = NULL_TELEMETRY
+) -> Tuple[Mapping[str, str], Optional[DiffContext]]:
+    """Collect the codebase context of a run and, with `diff`, the diff it was taken from
+    
+    With `diff` ('base..head') the context holds the changed parts of changed files,
+    limited to `files` and `paths`; otherwise files are read when their chunk is sent.
+    `languages` limits scanned directories (or changed files) to those languages.
+    Raises DiffError when git cannot produce the diff.
+    """
+    if diff:
+        with telemetry.span('collect', diff=diff) as span:
+            diff_context = DiffContext.from_git(
+                diff,
+                list(files) + list(paths or []),
+                window=diff_window,
+                include=include,
+                exclude=exclude,
+                max_file_size=max_file_size
+            )
+            codebase_context = diff_context.codebase_context()
+            if languages:
+                codebase_context = filter_by_languages(codebase_context, languages)
+            span.set(files=len(codebase_context))
+        return codebase_context, diff_context
+    
+    if not files and not paths:
+        return {}, None
+    
+    with telemetry.span('collect') as span:
+        codebase_context = collect_codebase_context(
+            files,
+            paths=paths,
+            include=include,
+            exclude=exclude,
+            languages=languages,
+            max_file_size=max_file_size,
+            # Contents are read when their chunk is sent rather than all up front
+            lazy=True
+        )
+        span.set(files=len(codebase_context))
+    return codebase_context, None
+
+
+class RunPlan:
+    """The rules of a run paired with the files each applies to"""
+    
+    def __init__(self):
+        # rule id -> (rule content, codebase context), as LLMClient.run_rules takes them
+        self.jobs: Dict[str, Tuple[str, Mapping[str, str]]] = {}
+        self.descriptions: Dict[str, str] = {}
+        # Rules left out because no file is in their languages, or none is relevant to them
+        self.skipped: List[str] = []
+        self.irrelevant: List[str] = []
+        self.prefiltered = RelevanceReport()
+
+
+def plan_jobs(
+    rules: Mapping[str, Dict[str, Any]],
+    codebase_context: Mapping[str, str],
+    keep: Iterable[str] = (),
+    prefilter: bool = False,
+    top_files: Optional[int] = None,
+    filter_languages: bool = True,
+    telemetry: Telemetry = NULL_TELEMETRY
+) -> RunPlan:
+    """Pair each loaded rule (see rules.load_rule) with the files of the context it applies to
+    
+    With `filter_languages`, a rule only sees files in its languages. With `prefilter`,
+    files matching none of a rule's relevance signals are left out, and with `top_files`
+    (which implies it) only that many are kept, ranked by BM25; the paths in `keep` always stay.
+    Both are lossy, so they are off by default.
+    """
+    plan = RunPlan()
+    keep = {os.path.normpath(filepath) for filepath in keep}
+    for rule_id, rule in rules.items():
+        rule_context = codebase_context
+        if codebase_context and filter_languages and not rule['alwaysApply'] and rule['languages']:
+            rule_context = filter_by_languages(codebase_context, rule['languages'])
+            if not rule_context:
+                plan.skipped.append(rule_id)
+                continue
+        if rule_context and (prefilter or top_files is not None):
+            with telemetry.span('prefilter', rule=rule_id) as span:
+                rule_context, report = RelevanceFilter.for_rule(rule, top_files=top_files).select(rule_context, keep=keep)
+                span.set(kept_files=report.kept_files, saved_tokens=report.saved_tokens)
+            plan.prefiltered.add(report)
+            if not rule_context:
+                plan.irrelevant.append(rule_id)
+                continue
+        plan.jobs[rule_id] = (rule['content'], rule_context)
+        plan.descriptions[rule_id] = rule['description']
+    return plan
+
+
+def build_client(
+    provider: str,
+    llm_token: Optional[str] = None,
+    model: Optional[str] = None,
+    concurrency: int = LLMClient.DEFAULT_CONCURRENCY,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    max_retries: int = LLMClient.DEFAULT_MAX_RETRIES,
+    resume: bool = True,
+    prompt_caching: bool = True,
+    timeout: float = DEFAULT_TIMEOUT,
+    http2: bool = False,
+    cache: bool = True,
+    cache_dir: Optional[str] = None,
+    telemetry: Optional[Telemetry] = None,
+    client_class: Type[LLMClient] = LLMClient
+) -> LLMClient:
+    """Create the client of a run with the CLI's defaults: checkpoints, response cache and the shared pool"""
+    return client_class(
+        provider=provider,
+        api_key=llm_token,
+        model=model,
+        concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_retries=max_retries,
+        checkpoint_dir=CHECKPOINT_DIR if resume else None,
+        prompt_caching=prompt_caching,
+        # Enough connections for every worker; the pool is reused by later runs in this process
+        pool=ConnectionPool.shared(max(concurrency, DEFAULT_MAX_CONNECTIONS), timeout, http2),
+        cache=ResponseCache(Path(cache_dir) if cache_dir else None) if cache else None,
+        telemetry=telemetry
+    )
+
+
+@contextmanager
+def recorded_telemetry(telemetry_output: Optional[str], telemetry_format: str = 'json') -> Iterator[Telemetry]:
+    """Yield the telemetry of a run, exported to `telemetry_output` when the run ends, even if it fails
+    
+    Phase timings and provider usage are only recorded when they are exported;
+    without `telemetry_output` this yields NULL_TELEMETRY.
+    """
+    if not telemetry_output:
+        yield NULL_TELEMETRY
+        return
+    telemetry = Telemetry()
+    try:
+        yield telemetry
+    finally:
+        export_telemetry(telemetry, telemetry_output, telemetry_format)
+
+
+def open_manifests(rule_ids: Iterable[str], manifest_dir: Optional[str] = None) -> Dict[str, FindingsManifest]:
+    """The findings manifest of each rule, for incremental runs"""
+    return {
+        rule_id: FindingsManifest(rule_id, Path(manifest_dir) if manifest_dir else None)
+        for rule_id in rule_ids
+    }
+
+
+@contextmanager
+def _open_output(output: Optional[str]) -> Iterator[TextIO]:
+    """The file findings are written to, or stdout"""
+    if not output:
+        yield sys.stdout
+        return
+    with open(output, 'w', encoding='utf-8') as out:
+        yield out
+
+
+def write_empty_findings(descriptions: Mapping[str, str], output_format: str, output: Optional[str] = None) -> None:
+    """Finish a run with nothing to send; structured formats still get a valid, empty document"""
+    if output_format == 'text':
+        return
+    with _open_output(output) as out:
+        FINDINGS_WRITERS[output_format](out, dict(descriptions)).close()
+
+
+class RunOutcome:
+    """What a run produced, for the caller to report"""
+    
+    def __init__(self):
+        # Rule id -> result text, with the 'text' format
+        self.results: Dict[str, str] = {}
+        # Findings written and findings rejected, with a structured format
+        self.findings: Optional[str] = None
+        self.rejected = 0
+        self.usage: Optional[str] = None
+
+
+def execute_plan(
+    llm: LLMClient,
+    plan: RunPlan,
+    output_format: str = 'text',
+    output: Optional[str] = None,
+    manifests: Optional[Dict[str, FindingsManifest]] = None,
+    diff_context: Optional[DiffContext] = None,
+    on_token: Optional[Callable[[str, str], None]] = None,
+    summarize: bool = False
+) -> RunOutcome:
+    """Run the jobs of a plan with `llm`
+    
+    With a structured format ('jsonl', 'sarif'), findings are written to `output`
+    (stdout by default) as each chunk completes rather than in one report at the end,
+    placed on the pull request's lines of `diff_context` if given. With 'text', the
+    results are returned for the caller to print; `on_token` and `summarize` are as
+    in LLMClient.run_rules.
+    """
+    outcome = RunOutcome()
+    if output_format == 'text':
+        outcome.results = llm.run_rules(plan.jobs, manifests, on_token=on_token, summarize=summarize)
+    else:
+        with _open_output(output) as out:
+            writer = FINDINGS_WRITERS[output_format](out, plan.descriptions)
+            outcome.rejected = write_findings(
+                lambda on_result: llm.run_rules_structured(plan.jobs, on_result, manifests),
+                writer,
+                diff_context.map_finding if diff_context is not None else None,
+                windows=llm.windows
+            )
+        outcome.findings = writer.summary()
+    outcome.usage = llm.usage_summary()
+    return outcome
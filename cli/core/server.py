@@ -0,0 +1,448 @@
+"""
+secure-flow daemon: serves list, validate and run over HTTP on a Unix socket or a loopback TCP port
+
+A long-lived process keeps what every CLI call would otherwise rebuild: the imported
+provider SDKs, the rule index, and the pooled provider connections. Endpoints:
+
+    GET  /health      daemon status
+    GET  /rules       the rule index, as `list` shows it
+    POST /validate    {"paths": [...], "cwd": "..."} -> validation results as JSON
+    POST /run         {"rule_id" or "rules", "files", "paths", ...} -> NDJSON output events
+    POST /cli         {"argv": [...], "cwd": "...", "env": {...}} -> NDJSON output events
+
+Output events are {"stdout": text}, {"stderr": text} and finally {"exit": code}.
+
+Over TCP every request must carry `Authorization: Bearer <token>`, with the token
+written to daemon.DAEMON_TOKEN_FILE (mode 0600) when the daemon starts, and
+commands never fall back to the daemon's own provider keys.
+"""
+import contextvars
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import signal
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .context import report_root
+from .daemon import DAEMON_COMMANDS, DAEMON_TOKEN_FILE, FORWARDED_ENV, connect
+from .manifest import MANIFEST_DIR
+from .rules import get_rule_index
+
+# Where print() in a request's threads writes; None outside of a request
+_output_sink: contextvars.ContextVar = contextvars.ContextVar('secure_flow_output_sink', default=None)
+
+# Options holding paths, made absolute against the client's working directory; the
+# files a command collects are still reported relative to it (see context.report_root)
+PATH_OPTIONS = ('files', 'paths', 'cache_dir', 'manifest_dir', 'output', 'telemetry_output')
+
+
+class _RoutedStream:
+    """Stand-in for sys.stdout/sys.stderr that writes to the current request's output"""
+    
+    def __init__(self, name: str, fallback: Any):
+        self.name = name
+        self._fallback = fallback
+    
+    def write(self, text: str) -> int:
+        sink = _output_sink.get()
+        if sink is None:
+            return self._fallback.write(text)
+        sink(self.name, text)
+        return len(text)
+    
+    def flush(self) -> None:
+        if _output_sink.get() is None:
+            self._fallback.flush()
+    
+    def isatty(self) -> bool:
+        return False
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._fallback, name)
+
+
+class Job:
+    """One command execution whose output events may be followed by several clients"""
+    
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.finished = False
+        self._changed = threading.Condition()
+    
+    def emit(self, event: Dict[str, Any]) -> None:
+        with self._changed:
+            self.events.append(event)
+            if 'exit' in event:
+                self.finished = True
+            self._changed.notify_all()
+    
+    def follow(self) -> Iterator[Dict[str, Any]]:
+        """Yield every event, from the first, until the command has exited"""
+        position = 0
+        while True:
+            with self._changed:
+                while position == len(self.events) and not self.finished:
+                    self._changed.wait()
+                pending = self.events[position:]
+                position = len(self.events)
+                finished = self.finished
+            yield from pending
+            if finished and position == len(self.events):
+                return
+
+
+def resolve_paths(args: Any, cwd: Path) -> None:
+    """Make the path options of parsed CLI arguments absolute against a client's directory"""
+    for option in PATH_OPTIONS:
+        value = getattr(args, option, None)
+        if isinstance(value, list):
+            setattr(args, option, [str(cwd / path) for path in value])
+        elif value:
+            setattr(args, option, str(cwd / value))
+    # A diff is taken in the client's repository, which git finds from the first path
+    if getattr(args, 'diff', None) and not args.files and not args.paths:
+        args.paths = [str(cwd)]
+    # Incremental manifests live in the client's project, not the daemon's directory
+    if getattr(args, 'incremental', False) and not args.manifest_dir:
+        args.manifest_dir = str(cwd / MANIFEST_DIR)
+
+
+def run_command(argv: List[str], cwd: str, env: Dict[str, str], remote: bool = False) -> int:
+    """Parse and run a CLI command as if it had been started in `cwd` with `env`
+    
+    A `remote` command (received over TCP) must bring its own provider key: the
+    daemon's environment is only used for commands received on its Unix socket.
+    """
+    # Imported here: the CLI module imports core, which imports this module
+    from ..cli import build_parser, dispatch
+    
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+        if args.command not in DAEMON_COMMANDS:
+            print(f"Error: The daemon does not run '{args.command}'", file=sys.stderr)
+            return 1
+        resolve_paths(args, Path(cwd))
+        # Prompts, findings and manifests name files as a run in the client's directory would
+        report_root.set(cwd)
+        # Same precedence as LLMClient: --llm-token, then the client's API key variables
+        if hasattr(args, 'llm_token') and args.llm_token is None:
+            args.llm_token = env.get('ANTHROPIC_API_KEY') or env.get('OPENAI_API_KEY')
+            if args.llm_token is None and remote and args.provider != 'mock':
+                print(
+                    "Error: Commands sent over TCP must pass --llm-token or the client's API key; "
+                    "the daemon's own keys are only used on its Unix socket",
+                    file=sys.stderr
+                )
+                return 1
+        return dispatch(args, parser)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+class CommandQueue:
+    """Runs CLI commands for daemon clients, at most `max_jobs` at a time
+    
+    Identical requests (same arguments, working directory and credentials) made while
+    one is queued or running share that execution, and every client receives its output.
+    """
+    
+    def __init__(self, max_jobs: int = 4, remote: bool = False):
+        self.max_jobs = max(1, max_jobs)
+        # Whether commands come over TCP, and so may not use the daemon's credentials
+        self.remote = remote
+        # Held while a command runs; requests beyond max_jobs wait for one
+        self.slots = threading.BoundedSemaphore(self.max_jobs)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+    
+    @staticmethod
+    def job_key(argv: List[str], cwd: str, env: Dict[str, str]) -> str:
+        # Credentials only enter the key hashed
+        env_digests = {name: hashlib.sha256(value.encode('utf-8')).hexdigest() for name, value in sorted(env.items())}
+        return hashlib.sha256(json.dumps([argv, cwd, env_digests]).encode('utf-8')).hexdigest()
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+    
+    def submit(self, argv: List[str], cwd: str, env: Dict[str, str]) -> Job:
+        """Queue a command, or join the identical one already queued or running"""
+        key = self.job_key(argv, cwd, env)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job
+            job = self._jobs[key] = Job()
+        
+        threading.Thread(target=self._execute, args=(key, job, argv, cwd, env), daemon=True).start()
+        return job
+    
+    def _execute(self, key: str, job: Job, argv: List[str], cwd: str, env: Dict[str, str]) -> None:
+        exit_code = 1
+        try:
+            with self.slots:
+                # Worker threads started by the command inherit this through copied contexts
+                _output_sink.set(lambda stream, text: job.emit({stream: text}))
+                exit_code = run_command(argv, cwd, env, self.remote)
+        finally:
+            with self._lock:
+                self._jobs.pop(key, None)
+            job.emit({'exit': exit_code})
+
+
+def run_argv(request: Dict[str, Any]) -> List[str]:
+    """Translate a JSON /run request into `run` command-line arguments
+    
+    Keys are the long option names, with '_' or '-'; lists repeat the option and
+    true booleans become flags.
+    """
+    argv = ['run']
+    if request.get('rule_id'):
+        argv.append(str(request['rule_id']))
+    for name, value in request.items():
+        if name in ('rule_id', 'cwd', 'env') or value is None or value is False:
+            continue
+        option = '--' + name.replace('_', '-')
+        if name == 'paths':
+            option = '--path'
+        elif name == 'rules' and isinstance(value, list):
+            value = ','.join(value)
+        
+        if value is True:
+            argv.append(option)
+        elif isinstance(value, list):
+            for item in value:
+                argv.extend([option, str(item)])
+        else:
+            argv.extend([option, str(value)])
+    return argv
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """HTTP endpoints of the daemon; one thread per connection"""
+    
+    server_version = 'secure-flow'
+    # Responses are streamed without a length, so each ends by closing the connection
+    protocol_version = 'HTTP/1.0'
+    
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'local'
+    
+    def log_message(self, format: str, *args: Any) -> None:
+        sys.__stderr__.write(f"[{self.log_date_time_string()}] {format % args}\n")
+    
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(request, dict):
+            raise ValueError("Request body must be a JSON object")
+        return request
+    
+    def _stream(self, job: Job) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            for event in job.follow():
+                self.wfile.write((json.dumps(event) + '\n').encode('utf-8'))
+                self.wfile.flush()
+        except OSError:
+            # The client went away; the command keeps running for anyone else following it
+            pass
+    
+    def _authorized(self) -> bool:
+        """Check the request's token when the daemon requires one, answering 401 if it does not match"""
+        token = getattr(self.server, 'token', None)
+        if token is None:
+            return True
+        header = self.headers.get('Authorization') or ''
+        if header.startswith('Bearer ') and hmac.compare_digest(header[len('Bearer '):].strip(), token):
+            return True
+        self._send_json(401, {'error': "Missing or invalid daemon token"})
+        return False
+    
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path == '/health':
+            self._send_json(200, {
+                'status': 'ok',
+                'pid': os.getpid(),
+                'max_jobs': self.server.commands.max_jobs,
+                'in_flight': self.server.commands.in_flight(),
+                'deduplicated': self.server.commands.deduplicated,
+            })
+        elif self.path == '/rules':
+            rules = [dict(rule, path=str(rule['path'])) for rule in get_rule_index().rules()]
+            self._send_json(200, {'rules': rules})
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+    
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        try:
+            request = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {'error': f"Invalid JSON request: {e}"})
+            return
+        
+        cwd = str(request.get('cwd') or os.getcwd())
+        env = {name: str(value) for name, value in (request.get('env') or {}).items() if name in FORWARDED_ENV}
+        
+        if self.path == '/cli':
+            argv = request.get('argv')
+            if not isinstance(argv, list):
+                self._send_json(400, {'error': "'argv' must be a list of arguments"})
+                return
+            self._stream(self.server.commands.submit([str(arg) for arg in argv], cwd, env))
+        elif self.path == '/run':
+            self._stream(self.server.commands.submit(run_argv(request), cwd, env))
+        elif self.path == '/validate':
+            self._validate(request.get('paths') or [], cwd)
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+    
+    def _validate(self, paths: List[str], cwd: str) -> None:
+        from .report import validation_json
+        from .validator import RuleValidator, ValidationCache
+        
+        with self.server.commands.slots:
+            cache = ValidationCache()
+            if paths:
+                results = {
+                    str(rule_path): result
+                    for rule_path, result in RuleValidator.validate_files(
+                        [Path(cwd) / path for path in paths], cache=cache
+                    ).items()
+                }
+            else:
+                results = RuleValidator.validate_all_rules(cache=cache)
+        self._send_json(200, validation_json(dict(sorted(results.items()))))
+
+
+class UnixDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPDaemonServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def socket_in_use(socket_path: Path) -> bool:
+    """Whether a daemon is answering on a Unix socket, as opposed to a stale socket file"""
+    try:
+        connection = connect(str(socket_path), timeout=1.0)
+        connection.request('GET', '/health')
+        connection.getresponse().read()
+        connection.close()
+        return True
+    except OSError:
+        return False
+
+
+def warm_up() -> None:
+    """Load what the first request would otherwise wait for"""
+    get_rule_index().refresh()
+    from . import llm_client  # noqa: F401
+    for sdk in ('anthropic', 'openai'):
+        try:
+            __import__(sdk)
+        except ImportError:
+            pass
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def write_token(token_file: Path) -> str:
+    """Create a new daemon token in a file only the current user can read"""
+    token = secrets.token_urlsafe(32)
+    token_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(token_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        # The file may predate this daemon with wider permissions
+        os.chmod(str(token_file), 0o600)
+        f.write(token + "\n")
+    return token
+
+
+def create_server(
+    socket_path: Optional[Path] = None,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+    max_jobs: int = 4,
+    token_file: Optional[Path] = None
+) -> socketserver.BaseServer:
+    """Bind a daemon server to a loopback TCP port, or else a Unix socket
+    
+    A TCP server requires the token it writes to `token_file` on every request.
+    """
+    if port is not None:
+        if not is_loopback(host):
+            raise OSError(f"The daemon only listens on loopback addresses, not {host}")
+        server = TCPDaemonServer((host, port), RequestHandler)
+        server.token = write_token(token_file or DAEMON_TOKEN_FILE)
+    else:
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.exists():
+            if socket_in_use(socket_path):
+                raise OSError(f"A daemon is already listening on {socket_path}")
+            socket_path.unlink()
+        # Only the current user may connect: requests run with the daemon's credentials
+        previous_umask = os.umask(0o077)
+        try:
+            server = UnixDaemonServer(str(socket_path), RequestHandler)
+        finally:
+            os.umask(previous_umask)
+    server.commands = CommandQueue(max_jobs, remote=port is not None)
+    return server
+
+
+def serve_forever(server: socketserver.BaseServer, on_stop: Optional[Callable[[], None]] = None) -> None:
+    """Serve requests until interrupted, routing each command's output to its client"""
+    sys.stdout = _RoutedStream('stdout', sys.stdout)
+    sys.stderr = _RoutedStream('stderr', sys.stderr)
+    # SIGTERM stops the daemon as cleanly as Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.stdout = sys.stdout._fallback
+        sys.stderr = sys.stderr._fallback
+        if on_stop is not None:
+            on_stop()
@@ -0,0 +1,49 @@
+"""
+Terminal output for streamed LLM responses
+"""
+import sys
+import threading
+from typing import Optional, TextIO
+
+
+class StreamPrinter:
+    """Prints streamed text as it arrives, with a header whenever the source changes
+    
+    Safe to call from several worker threads; pieces from concurrent chunks are
+    written whole and labelled so interleaved output stays readable.
+    """
+    
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._label = None
+        self._at_line_start = True
+    
+    def __call__(self, label: str, text: str) -> None:
+        with self._lock:
+            if label != self._label:
+                if not self._at_line_start:
+                    self.stream.write("\n")
+                self.stream.write(f"\n--- {label} ---\n")
+                self._label = label
+            self._write(text)
+    
+    def write(self, text: str) -> None:
+        """Print unlabelled text"""
+        with self._lock:
+            self._write(text)
+    
+    def finish(self) -> None:
+        """End the current line once streaming is over"""
+        with self._lock:
+            if not self._at_line_start:
+                self.stream.write("\n")
+                self._at_line_start = True
+            self.stream.flush()
+    
+    def _write(self, text: str) -> None:
+        if not text:
+            return
+        self.stream.write(text)
+        self.stream.flush()
+        self._at_line_start = text.endswith("\n")
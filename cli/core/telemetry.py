@@ -0,0 +1,438 @@
+"""
+Per-run telemetry: phase spans, provider token usage, cost estimates and latency histograms
+
+Every LLMClient records spans into a Telemetry: one per phase (collect, prefilter,
+plan, map, reduce), one per chunk or reduce call and one per provider request,
+carrying the token usage the provider reported. Command handlers add their own
+phases. A run's telemetry can be written as JSON or as OTLP/JSON traces for any
+OpenTelemetry collector, and `Profiler` records a cProfile trace of every thread.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .report import TOOL_NAME
+
+# USD per million tokens: (input, output, cache read, cache write); dated snapshots match by prefix.
+# Published list prices, so costs are estimates.
+MODEL_PRICES = {
+    "claude-3-5-sonnet": (3.0, 15.0, 0.30, 3.75),
+    "claude-3-5-haiku": (0.80, 4.0, 0.08, 1.0),
+    "claude-3-7-sonnet": (3.0, 15.0, 0.30, 3.75),
+    "claude-3-opus": (15.0, 75.0, 1.50, 18.75),
+    "claude-3-sonnet": (3.0, 15.0, 0.30, 3.75),
+    "claude-3-haiku": (0.25, 1.25, 0.03, 0.30),
+    "claude-sonnet-4": (3.0, 15.0, 0.30, 3.75),
+    "claude-opus-4": (15.0, 75.0, 1.50, 18.75),
+    "gpt-4": (30.0, 60.0, 30.0, 30.0),
+    "gpt-4-32k": (60.0, 120.0, 60.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0, 10.0, 10.0),
+    "gpt-4o": (2.50, 10.0, 1.25, 2.50),
+    "gpt-4o-mini": (0.15, 0.60, 0.075, 0.15),
+    "gpt-4.1": (2.0, 8.0, 0.50, 2.0),
+    "mock": (0.0, 0.0, 0.0, 0.0),
+}
+
+# Upper bounds in seconds of the latency histogram buckets, as in OpenTelemetry explicit buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0, 300.0)
+# Spans whose durations are collected into latency histograms
+LATENCY_SPANS = ('llm.chunk', 'llm.reduce', 'llm.request')
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens')
+
+TELEMETRY_FORMATS = ('json', 'otlp')
+# Span attributes exported under OpenTelemetry GenAI semantic convention names
+OTEL_ATTRIBUTES = {
+    'provider': 'gen_ai.system',
+    'model': 'gen_ai.request.model',
+    'input_tokens': 'gen_ai.usage.input_tokens',
+    'output_tokens': 'gen_ai.usage.output_tokens',
+}
+OTEL_SPAN_KIND_INTERNAL = 1
+OTEL_SPAN_KIND_CLIENT = 3
+OTEL_STATUS_OK = 1
+OTEL_STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('secure_flow_span', default=None)
+
+
+def prices_for(model: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Return the per-million-token prices of a model, matching the longest known name prefix"""
+    if not model:
+        return None
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return None
+    return MODEL_PRICES[max(matches, key=len)]
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, int]) -> Optional[float]:
+    """Estimate the USD cost of token usage, or None if the model's prices are unknown
+    
+    `usage['input_tokens']` includes the cache reads and writes, as in LLMClient.usage.
+    """
+    prices = prices_for(model)
+    if prices is None:
+        return None
+    input_price, output_price, read_price, write_price = prices
+    cache_read = usage.get('cache_read_tokens', 0)
+    cache_write = usage.get('cache_write_tokens', 0)
+    uncached = usage.get('input_tokens', 0) - cache_read - cache_write
+    return (
+        uncached * input_price
+        + usage.get('output_tokens', 0) * output_price
+        + cache_read * read_price
+        + cache_write * write_price
+    ) / 1e6
+
+
+class Histogram:
+    """Latencies in fixed buckets, keeping the values for exact percentiles"""
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is unbounded
+        self.values: List[float] = []
+    
+    def add(self, value: float) -> None:
+        self.values.append(value)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+    
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile, `q` between 0 and 100"""
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))]
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': len(self.values),
+            'sum_s': sum(self.values),
+            'p50_s': self.percentile(50),
+            'p90_s': self.percentile(90),
+            'p99_s': self.percentile(99),
+            'max_s': max(self.values) if self.values else 0.0,
+            'buckets': [
+                {'le': bound, 'count': count}
+                for bound, count in zip(list(self.bounds) + ['+Inf'], self.counts)
+            ],
+        }
+
+
+class Span:
+    """One timed operation; ended once, by `end()`"""
+    
+    def __init__(self, telemetry: "Telemetry", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.thread = threading.current_thread().name
+        self.start_ns = time.time_ns()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+    
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+    
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.telemetry._finish(self)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'thread': self.thread,
+            'start_unix_ns': self.start_ns,
+            'duration_s': self.duration,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class Telemetry:
+    """Spans of one run, recorded from any thread
+    
+    Spans opened with `span()` become the parent of spans opened inside them, in
+    the same thread or in workers started with contextvars.copy_context.
+    """
+    
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.histograms: Dict[str, Histogram] = {name: Histogram() for name in LATENCY_SPANS}
+        self._lock = threading.Lock()
+    
+    def _parent(self) -> Optional[Span]:
+        span = _current_span.get()
+        return span if span is not None and span.telemetry is self else None
+    
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """Open a span under the current one without making it current; the caller ends it"""
+        return Span(self, name, self._parent(), attributes)
+    
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block as a span, the parent of any span opened within it"""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(e)
+            raise
+        else:
+            span.end()
+        finally:
+            _current_span.reset(token)
+    
+    def annotate(self, **attributes: Any) -> None:
+        """Set attributes on the current span, if it belongs to this telemetry"""
+        span = self._parent()
+        if span is not None:
+            span.set(**attributes)
+    
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+            # Failed attempts end early, so only successful calls describe latency
+            if span.name in self.histograms and span.error is None:
+                self.histograms[span.name].add(span.duration)
+    
+    def usage(self) -> Dict[str, Any]:
+        """Token usage and estimated cost summed over every provider request"""
+        with self._lock:
+            requests = [span for span in self.spans if span.name == 'llm.request']
+        usage: Dict[str, Any] = {
+            'requests': len(requests),
+            'failed_requests': sum(1 for span in requests if span.error is not None),
+        }
+        for field in USAGE_FIELDS:
+            usage[field] = sum(span.attributes.get(field, 0) for span in requests)
+        costs = [span.attributes['cost_usd'] for span in requests if span.attributes.get('cost_usd') is not None]
+        usage['cost_usd'] = sum(costs) if costs else None
+        return usage
+    
+    def phases(self) -> Dict[str, Dict[str, Any]]:
+        """Count and time of the spans of each name, in order of first completion"""
+        phases: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            phase = phases.setdefault(span.name, {'count': 0, 'total_s': 0.0, 'max_s': 0.0, 'errors': 0})
+            phase['count'] += 1
+            phase['total_s'] += span.duration
+            phase['max_s'] = max(phase['max_s'], span.duration)
+            phase['errors'] += span.error is not None
+        return phases
+    
+    def wall_time(self) -> float:
+        with self._lock:
+            if not self.spans:
+                return 0.0
+            start = min(span.start_ns for span in self.spans)
+            end = max(span.start_ns + int(span.duration * 1e9) for span in self.spans)
+        return (end - start) / 1e9
+    
+    def report(self) -> Dict[str, Any]:
+        """Everything recorded, as a JSON-serializable dict"""
+        with self._lock:
+            spans = [span.as_dict() for span in self.spans]
+            histograms = {name: histogram.as_dict() for name, histogram in self.histograms.items() if histogram.values}
+        return {
+            'trace_id': self.trace_id,
+            'wall_s': self.wall_time(),
+            'usage': self.usage(),
+            'phases': self.phases(),
+            'latency': histograms,
+            'spans': spans,
+        }
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        """The spans as an OTLP/JSON traces document, e.g. for a collector's otlpjsonfile receiver"""
+        with self._lock:
+            spans = list(self.spans)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', TOOL_NAME)]},
+            'scopeSpans': [{
+                'scope': {'name': TOOL_NAME},
+                'spans': [self._otlp_span(span) for span in spans],
+            }],
+        }]}
+    
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        attributes = [
+            _otlp_attribute(OTEL_ATTRIBUTES.get(name, f"secure_flow.{name}"), value)
+            for name, value in span.attributes.items()
+            if value is not None
+        ]
+        otlp = {
+            'traceId': self.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': OTEL_SPAN_KIND_CLIENT if span.name == 'llm.request' else OTEL_SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.start_ns + int(span.duration * 1e9)),
+            'attributes': attributes + [_otlp_attribute('thread.name', span.thread)],
+            'status': {'code': OTEL_STATUS_ERROR, 'message': span.error} if span.error else {'code': OTEL_STATUS_OK},
+        }
+        if span.parent_id:
+            otlp['parentSpanId'] = span.parent_id
+        return otlp
+    
+    def summary(self) -> str:
+        """A few lines on where the time and tokens went"""
+        phases = self.phases()
+        parts = []
+        for name, phase in phases.items():
+            if name.startswith('llm.') or name == 'rate_limit.wait':
+                continue
+            parts.append(f"{name} {phase['total_s']:.2f}s")
+        lines = [f"Telemetry: {self.wall_time():.2f}s wall" + (f"; {', '.join(parts)}" if parts else "")]
+        
+        for name, label in (('llm.chunk', 'Chunk'), ('llm.reduce', 'Reduce'), ('llm.request', 'Request')):
+            histogram = self.histograms[name]
+            if histogram.values:
+                lines.append(
+                    f"{label} latency: p50 {histogram.percentile(50):.2f}s, p90 {histogram.percentile(90):.2f}s, "
+                    f"p99 {histogram.percentile(99):.2f}s, max {max(histogram.values):.2f}s over {len(histogram.values)} call(s)"
+                )
+        if 'rate_limit.wait' in phases:
+            lines.append(f"Rate limit waits: {phases['rate_limit.wait']['total_s']:.2f}s in total")
+        
+        usage = self.usage()
+        if usage['requests']:
+            line = f"Provider usage: {usage['input_tokens']:,} input, {usage['output_tokens']:,} output tokens over {usage['requests']} request(s)"
+            if usage['failed_requests']:
+                line += f" ({usage['failed_requests']} failed and retried)"
+            if usage['cost_usd'] is not None:
+                line += f"; est. cost ${usage['cost_usd']:.4f}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def write(self, path: str, fmt: str = 'json') -> None:
+        """Write the report (`json`) or the OTLP traces (`otlp`) to a file"""
+        document = self.to_otlp() if fmt == 'otlp' else self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2, default=str)
+            f.write("\n")
+
+
+class _NullSpan:
+    def set(self, **attributes: Any) -> None:
+        pass
+    
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+class NullTelemetry:
+    """Accepts spans like a Telemetry and records nothing, for runs that export no telemetry"""
+    
+    _span = _NullSpan()
+    
+    def start_span(self, name: str, **attributes: Any) -> _NullSpan:
+        return self._span
+    
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[_NullSpan]:
+        yield self._span
+    
+    def annotate(self, **attributes: Any) -> None:
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        # OTLP/JSON encodes 64-bit integers as strings
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def export_telemetry(telemetry: Telemetry, path: str, fmt: str = 'json') -> None:
+    """Write a run's telemetry and print its summary on stderr"""
+    print(telemetry.summary(), file=sys.stderr)
+    try:
+        telemetry.write(path, fmt)
+    except OSError as e:
+        print(f"Warning: Could not write telemetry to {path}: {e}", file=sys.stderr)
+        return
+    print(f"Telemetry written to {path}", file=sys.stderr)
+
+
+class Profiler:
+    """cProfile of the main thread and every thread started while it runs
+    
+    Before Python 3.12 each thread needs its own profiler, so one is started in
+    each new thread and their statistics are merged; from 3.12 a profiler sees
+    every thread. The result is a pstats file, readable by `python -m pstats`,
+    snakeviz or flameprof (for a flame graph).
+    """
+    
+    def __init__(self):
+        import cProfile
+        self._new_profile = cProfile.Profile
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+    
+    def _start_thread(self, frame: Any, event: str, arg: Any) -> None:
+        # Installed by threading.setprofile; replaced by the thread's own profiler on first call
+        profile = self._new_profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+    
+    def start(self) -> None:
+        profile = self._new_profile()
+        self._profiles.append(profile)
+        if self._per_thread:
+            threading.setprofile(self._start_thread)
+        profile.enable()
+    
+    def stop(self, path: str) -> None:
+        """Stop profiling and write the merged statistics to `path`"""
+        import pstats
+        self._profiles[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+    
+    @contextmanager
+    def running(self, path: str) -> Iterator[None]:
+        """Profile the enclosed block and write the statistics to `path` afterwards"""
+        self.start()
+        try:
+            yield
+        finally:
+            self.stop(path)
+            print(f"Profile written to {path} (view with: python -m pstats {path}, snakeviz or flameprof)", file=sys.stderr)
@@ -0,0 +1,98 @@
+"""
+Token counting and model context window limits
+"""
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Total context window (input + output) per model; dated snapshots match by prefix
+MODEL_CONTEXT_WINDOWS = {
+    "claude-3-5-sonnet": 200000,
+    "claude-3-5-haiku": 200000,
+    "claude-3-7-sonnet": 200000,
+    "claude-3-opus": 200000,
+    "claude-3-sonnet": 200000,
+    "claude-3-haiku": 200000,
+    "claude-sonnet-4": 200000,
+    "claude-opus-4": 200000,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1047576,
+    # The mock provider; "mock-8k" or "mock-32k" force chunking of smaller inputs
+    "mock": 200000,
+    "mock-8k": 8192,
+    "mock-32k": 32768,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+
+def context_window_for(model: Optional[str]) -> int:
+    """Return the context window of a model, matching the longest known name prefix"""
+    if not model:
+        return DEFAULT_CONTEXT_WINDOW
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if model.startswith(name)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+class TokenCounter:
+    """Counts tokens with a provider tokenizer when one is available locally
+    
+    Falls back to a ~4 characters per token heuristic. Per-file counts are memoized
+    so the same file is only tokenized once per process.
+    """
+    
+    CHARS_PER_TOKEN = 4
+    
+    def __init__(self, encode: Optional[Callable[[str], int]] = None, name: str = "heuristic"):
+        self._encode = encode
+        self.name = name
+        self._file_counts: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from a real tokenizer rather than the heuristic"""
+        return self._encode is not None
+    
+    @classmethod
+    def for_model(cls, provider: str, model: Optional[str]) -> "TokenCounter":
+        """Build the most accurate counter available locally for a provider and model"""
+        if provider == "openai":
+            # Imported lazily: loading tiktoken is only worth it when a model is called
+            try:
+                import tiktoken
+            except ImportError:
+                return cls()
+            try:
+                encoding = tiktoken.encoding_for_model(model or "")
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return cls(
+                lambda text: len(encoding.encode(text, disallowed_special=())),
+                name=f"tiktoken:{encoding.name}"
+            )
+        # Anthropic does not ship a local tokenizer for current Claude models
+        return cls()
+    
+    def count(self, text: str) -> int:
+        """Count the tokens in a piece of text"""
+        if self._encode is None:
+            return len(text) // self.CHARS_PER_TOKEN
+        return self._encode(text)
+    
+    def count_file(self, filepath: str, content: str) -> int:
+        """Count the tokens in a file's content, memoized by path and content"""
+        key = (filepath, hash(content))
+        with self._lock:
+            cached = self._file_counts.get(key)
+        if cached is not None:
+            return cached
+        
+        tokens = self.count(content)
+        with self._lock:
+            self._file_counts[key] = tokens
+        return tokens
@@ -1,12 +1,75 @@
 """
 Rule validation module
 """
-import yaml
+import hashlib
+import json
+import os
+import tempfile
 import re
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
-from .config import RULES_DIR
+from .config import CACHE_DIR, RULES_DIR
+from .relevance import relevance_errors
+from .rules import list_rule_files
+
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_THRESHOLD = 16
+
+
+class ValidationCache:
+    """Content hashes of rule files that passed validation
+    
+    Only valid results are cached, so a rule that failed is always re-checked
+    and reports its current errors.
+    """
+    
+    VERSION = 2
+    MAX_ENTRIES = 10000
+    
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else CACHE_DIR / "validation.json"
+        self._keys: Dict[str, bool] = self._load()
+        self._dirty = False
+    
+    def _load(self) -> Dict[str, bool]:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return dict.fromkeys(data.get('valid', []), True)
+    
+    @staticmethod
+    def make_key(rule_path: Path, content: str) -> str:
+        """Hash the content together with the file name, which the rule_id is checked against"""
+        digest = hashlib.sha256(f"{ValidationCache.VERSION}\0{rule_path.stem}\0".encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+    
+    def add(self, key: str) -> None:
+        if key not in self._keys:
+            self._keys[key] = True
+            self._dirty = True
+    
+    def save(self) -> None:
+        """Persist the cache, keeping only the most recently added entries"""
+        if not self._dirty:
+            return
+        keys = list(self._keys)[-self.MAX_ENTRIES:]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'valid': keys}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            return
+        self._dirty = False
 
 
 class RuleValidator:
@@ -18,12 +81,18 @@ class RuleValidator:
     @staticmethod
     def validate_rule_file(rule_path: Path) -> Tuple[bool, List[str]]:
         """Validate a single rule file"""
-        errors = []
-        
         if not rule_path.exists():
             return False, [f"File does not exist: {rule_path}"]
         
-        content = rule_path.read_text()
+        return RuleValidator.validate_content(rule_path.read_text(), rule_path.stem)
+    
+    @staticmethod
+    def validate_content(content: str, expected_rule_id: str) -> Tuple[bool, List[str]]:
+        """Validate the content of a rule file whose name (without .md) is `expected_rule_id`"""
+        # Imported here so fully cached validation runs never load the YAML parser
+        import yaml
+        
+        errors = []
         
         # Check for frontmatter
         if not content.startswith('---'):
@@ -53,6 +122,10 @@ class RuleValidator:
             if 'languages' in frontmatter and not isinstance(frontmatter['languages'], list):
                 errors.append("'languages' must be a list")
             
+            # Validate the optional relevance signals used by the pre-filter
+            if 'relevance' in frontmatter:
+                errors.extend(relevance_errors(frontmatter['relevance']))
+        
         except ValueError:
             errors.append("Invalid frontmatter format (missing closing '---')")
         except yaml.YAMLError as e:
@@ -67,23 +140,78 @@ class RuleValidator:
             if rule_id_match:
                 rule_id = rule_id_match.group(1)
                 # Validate rule_id matches filename
-                expected_rule_id = rule_path.stem
                 if rule_id != expected_rule_id:
                     errors.append(f"rule_id '{rule_id}' does not match filename '{expected_rule_id}'")
         
         return len(errors) == 0, errors
     
     @staticmethod
-    def validate_all_rules() -> Dict[str, Tuple[bool, List[str]]]:
-        """Validate all rule files"""
-        results = {}
+    def validate_files(
+        rule_paths: List[Path],
+        max_workers: Optional[int] = None,
+        cache: Optional[ValidationCache] = None
+    ) -> Dict[Path, Tuple[bool, List[str]]]:
+        """Validate many rule files, in worker processes when there are enough of them
         
-        if not RULES_DIR.exists():
-            return results
+        Files whose content matches a cached valid result are not parsed again.
+        Results are returned in the order of `rule_paths`.
+        """
+        results: Dict[Path, Tuple[bool, List[str]]] = {}
+        pending = []  # (path, content, cache key)
+        for rule_path in rule_paths:
+            try:
+                content = rule_path.read_text()
+            except FileNotFoundError:
+                results[rule_path] = (False, [f"File does not exist: {rule_path}"])
+                continue
+            except (OSError, UnicodeDecodeError) as e:
+                results[rule_path] = (False, [f"Could not read file: {e}"])
+                continue
+            
+            key = ValidationCache.make_key(rule_path, content)
+            if cache is not None and key in cache:
+                results[rule_path] = (True, [])
+            else:
+                pending.append((rule_path, content, key))
         
-        for rule_file in RULES_DIR.glob("*.md"):
-            is_valid, errors = RuleValidator.validate_rule_file(rule_file)
-            results[str(rule_file.name)] = (is_valid, errors)
+        contents = [content for _, content, _ in pending]
+        expected_ids = [rule_path.stem for rule_path, _, _ in pending]
+        workers = max_workers or os.cpu_count() or 1
+        outcomes = None
+        if len(pending) >= PARALLEL_THRESHOLD and workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            from concurrent.futures.process import BrokenProcessPool
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    outcomes = list(executor.map(
+                        RuleValidator.validate_content,
+                        contents,
+                        expected_ids,
+                        chunksize=max(1, len(pending) // (4 * workers))
+                    ))
+            except (OSError, BrokenProcessPool):
+                # No process support here (e.g. a restricted sandbox); validate in-process
+                outcomes = None
+        if outcomes is None:
+            outcomes = [RuleValidator.validate_content(c, e) for c, e in zip(contents, expected_ids)]
         
-        return results
-
+        for (rule_path, _, key), outcome in zip(pending, outcomes):
+            results[rule_path] = outcome
+            if cache is not None and outcome[0]:
+                cache.add(key)
+        if cache is not None:
+            cache.save()
+        
+        return {rule_path: results[rule_path] for rule_path in rule_paths}
+    
+    @staticmethod
+    def validate_all_rules(
+        max_workers: Optional[int] = None,
+        cache: Optional[ValidationCache] = None
+    ) -> Dict[str, Tuple[bool, List[str]]]:
+        """Validate all rule files"""
+        if not RULES_DIR.exists():
+            return {}
+        
+        results = RuleValidator.validate_files(list_rule_files(), max_workers, cache)
+        return {rule_file.name: result for rule_file, result in results.items()}
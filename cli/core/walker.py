@@ -0,0 +1,379 @@
+"""
+Fast, gitignore-aware file walker for building codebase context from directories
+"""
+import contextvars
+import fnmatch
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .config import DEFAULT_MAX_FILE_SIZE
+from .context import LazyContext, detect_language, report_root
+
+DEFAULT_READ_WORKERS = 16
+SNIFF_BYTES = 8192
+
+# Dependency, build and tool directories that are never worth scanning
+VENDORED_DIRS = {
+    '.git', '.hg', '.svn',
+    'node_modules', 'bower_components', 'jspm_packages',
+    'vendor', 'third_party', 'third-party', 'Pods',
+    '__pycache__', '.venv', 'venv', 'site-packages', '.tox', '.nox',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache',
+    'dist', 'build', 'target', 'out', '.next', '.nuxt',
+    '.gradle', '.idea', '.terraform', '.secure-flow',
+}
+
+# Leading bytes of common binary formats
+BINARY_SIGNATURES = (
+    b'\x7fELF',            # ELF executables
+    b'MZ',                 # Windows executables
+    b'\xca\xfe\xba\xbe',   # Java classes / Mach-O fat binaries
+    b'\xcf\xfa\xed\xfe',   # Mach-O
+    b'PK\x03\x04',         # zip, jar, wheel
+    b'\x1f\x8b',           # gzip
+    b'BZh',                # bzip2
+    b'\xfd7zXZ',           # xz
+    b'%PDF',
+    b'\x89PNG',
+    b'GIF8',
+    b'\xff\xd8\xff',       # JPEG
+    b'\x00asm',            # WebAssembly
+    b'SQLite format 3',
+)
+
+
+def is_binary(header: bytes) -> bool:
+    """Guess whether file content is binary from its first bytes"""
+    if header.startswith(BINARY_SIGNATURES):
+        return True
+    return b'\x00' in header[:SNIFF_BYTES]
+
+
+def _translate_pattern(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression over a relative path"""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '*':
+            if pattern[i:i + 3] == '**/':
+                regex += '(?:.*/)?'
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                regex += '.*'
+                i += 2
+                continue
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex += f'[{body}]'
+                i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+class GitIgnore:
+    """Matches paths against the patterns of one .gitignore file"""
+
+    def __init__(self, base: str, lines: Iterable[str]):
+        self.base = base  # Directory of the .gitignore, relative to the walk root ('' for the root)
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negated, directory_only)
+
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+
+            # Patterns with a slash are anchored to the .gitignore directory
+            if '/' in line:
+                regex = _translate_pattern(line.lstrip('/'))
+            else:
+                regex = '(?:.*/)?' + _translate_pattern(line)
+            self.rules.append((re.compile(regex + r'\Z', re.DOTALL), negated, directory_only))
+
+    @classmethod
+    def load(cls, path: Path, base: str) -> Optional["GitIgnore"]:
+        try:
+            lines = path.read_text(encoding='utf-8', errors='replace').splitlines()
+        except OSError:
+            return None
+        ignore = cls(base, lines)
+        return ignore if ignore.rules else None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True if ignored, False if re-included, None if no pattern applies"""
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return None
+            rel_path = rel_path[len(self.base) + 1:]
+
+        result = None
+        for regex, negated, directory_only in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                result = not negated
+        return result
+
+
+def _is_ignored(ignores: List[GitIgnore], rel_path: str, is_dir: bool) -> bool:
+    ignored = False
+    # Deeper .gitignore files take precedence over their parents
+    for ignore in ignores:
+        result = ignore.match(rel_path, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+
+def _matches_any(rel_path: str, patterns: List[str]) -> bool:
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def walk_files(
+    paths: List[str],
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    respect_gitignore: bool = True
+) -> List[str]:
+    """Collect files under `paths`, honouring .gitignore files and skipping vendored directories
+
+    `include`/`exclude` are glob patterns matched against the path relative to the walk
+    root and against the file name. When `languages` is given, files detected as another
+    language are left out; files of no detected language (.env, keys, configs) are
+    kept, as in context.filter_by_languages. Files larger than `max_file_size` bytes are skipped.
+    """
+    include = include or []
+    exclude = exclude or []
+    wanted_languages = {language.lower() for language in languages} if languages else None
+    found = []
+    oversized = 0
+
+    for root in paths:
+        root_path = Path(root)
+        if root_path.is_file():
+            found.append(str(root_path))
+            continue
+        if not root_path.is_dir():
+            print(f"Warning: Path not found: {root}", file=sys.stderr)
+            continue
+
+        root_ignores = []
+        if respect_gitignore:
+            for candidate in (root_path / '.git' / 'info' / 'exclude', root_path / '.gitignore'):
+                ignore = GitIgnore.load(candidate, '')
+                if ignore:
+                    root_ignores.append(ignore)
+
+        # Depth-first walk with the .gitignore rules in effect for each directory
+        stack = [(str(root_path), '', root_ignores)]
+        while stack:
+            directory, rel_dir, ignores = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except OSError:
+                continue
+
+            if respect_gitignore and rel_dir:
+                ignore = GitIgnore.load(Path(directory) / '.gitignore', rel_dir)
+                if ignore:
+                    ignores = ignores + [ignore]
+
+            subdirectories = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = entry.is_file(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if entry.name in VENDORED_DIRS or _is_ignored(ignores, rel_path, True):
+                        continue
+                    if exclude and _matches_any(rel_path, exclude):
+                        continue
+                    subdirectories.append((entry.path, rel_path, ignores))
+                    continue
+
+                if not is_file or _is_ignored(ignores, rel_path, False):
+                    continue
+                if include and not _matches_any(rel_path, include):
+                    continue
+                if exclude and _matches_any(rel_path, exclude):
+                    continue
+                if wanted_languages is not None:
+                    language = detect_language(entry.name)
+                    if language is not None and language not in wanted_languages:
+                        continue
+                try:
+                    if entry.stat().st_size > max_file_size:
+                        oversized += 1
+                        continue
+                except OSError:
+                    continue
+                found.append(entry.path)
+
+            # Reverse so directories are visited in name order
+            stack.extend(reversed(subdirectories))
+
+    if oversized:
+        print(f"Skipped {oversized} file(s) larger than {max_file_size} bytes", file=sys.stderr)
+    return found
+
+
+def _read_text_file(filepath: str, max_file_size: int) -> Optional[str]:
+    """Read a file as text, returning None for binary, oversized or unreadable files"""
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read(max_file_size + 1)
+    except OSError as e:
+        print(f"Warning: Could not read {filepath}: {e}", file=sys.stderr)
+        return None
+
+    if len(data) > max_file_size or is_binary(data[:SNIFF_BYTES]):
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
+def _text_file_size(filepath: str, max_file_size: int) -> Optional[int]:
+    """Return the size of a text file from its first bytes, or None for binary, oversized or unreadable files"""
+    try:
+        with open(filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            header = f.read(SNIFF_BYTES)
+    except OSError as e:
+        print(f"Warning: Could not read {filepath}: {e}", file=sys.stderr)
+        return None
+
+    if size > max_file_size or is_binary(header):
+        return None
+    return size
+
+
+def read_files_concurrently(
+    filepaths: List[str],
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    max_workers: int = DEFAULT_READ_WORKERS
+) -> Dict[str, str]:
+    """Read text files in parallel, skipping binaries, preserving the input order"""
+    if not filepaths:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(filepaths))) as executor:
+        # Warnings from workers go wherever the caller's output goes (see core/server.py)
+        context = contextvars.copy_context()
+        contents = list(executor.map(
+            lambda filepath: context.copy().run(_read_text_file, filepath, max_file_size),
+            filepaths
+        ))
+
+    return {
+        filepath: content
+        for filepath, content in zip(filepaths, contents)
+        if content is not None
+    }
+
+
+def _probe_files_concurrently(
+    filepaths: List[str],
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    max_workers: int = DEFAULT_READ_WORKERS
+) -> Dict[str, int]:
+    """Find the sizes of text files in parallel, skipping binaries, preserving the input order"""
+    if not filepaths:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(filepaths))) as executor:
+        context = contextvars.copy_context()
+        sizes = list(executor.map(
+            lambda filepath: context.copy().run(_text_file_size, filepath, max_file_size),
+            filepaths
+        ))
+
+    return {
+        filepath: size
+        for filepath, size in zip(filepaths, sizes)
+        if size is not None
+    }
+
+
+def collect_codebase_context(
+    files: List[str],
+    paths: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    lazy: bool = False
+) -> Mapping[str, str]:
+    """Build the codebase context from explicit files plus files found under `paths`
+
+    Explicit files are always included; the include/exclude/language filters only
+    apply to files discovered by walking `paths`. With `lazy`, only the first bytes
+    of each file are read here, to skip binaries, and a LazyContext is returned
+    that reads contents when they are used.
+    """
+    filepaths = []
+    explicit = set()
+    for filepath in files:
+        if not Path(filepath).exists():
+            print(f"Warning: File not found: {filepath}", file=sys.stderr)
+            continue
+        filepath = os.path.normpath(filepath)
+        explicit.add(filepath)
+        filepaths.append(filepath)
+
+    if paths:
+        filepaths.extend(os.path.normpath(filepath) for filepath in walk_files(
+            paths,
+            include=include,
+            exclude=exclude,
+            languages=languages,
+            max_file_size=max_file_size
+        ))
+
+    # Drop duplicates while keeping the first occurrence's position
+    filepaths = list(dict.fromkeys(filepaths))
+    # Files are read where they were given, but keyed relative to report_root when it is set
+    root = report_root.get()
+    label = (lambda filepath: os.path.relpath(filepath, root)) if root else (lambda filepath: filepath)
+    if lazy:
+        sizes = _probe_files_concurrently(filepaths, max_file_size)
+        codebase_context = LazyContext({label(filepath): size for filepath, size in sizes.items()}, root)
+    else:
+        contents = read_files_concurrently(filepaths, max_file_size)
+        codebase_context = {label(filepath): content for filepath, content in contents.items()}
+
+    for filepath in filepaths:
+        if filepath in explicit and label(filepath) not in codebase_context:
+            print(f"Warning: Skipping {filepath} (binary or larger than {max_file_size} bytes)", file=sys.stderr)
+    return codebase_context
@@ -0,0 +1,32 @@
+"""
+Tests for the on-disk response cache
+"""
+from cli.core.cache import ResponseCache
+
+
+def entry_count(cache: ResponseCache) -> int:
+    return len(list(cache.cache_dir.glob("*/*.json")))
+
+
+def test_long_lived_cache_stays_under_its_size_limit(tmp_path):
+    cache = ResponseCache(tmp_path, max_size_bytes=10_000)
+    response = "x" * 900
+    
+    for i in range(100):
+        cache.set(ResponseCache.make_key('mock', 'model', f"prompt {i}", 100), response)
+    
+    total = sum(path.stat().st_size for path in tmp_path.glob("*/*.json"))
+    # Eviction runs again after each tenth of the limit is written
+    assert total <= 10_000 * 1.1 + 1000
+    assert entry_count(cache) < 100
+    assert cache.get(ResponseCache.make_key('mock', 'model', "prompt 99", 100)) == response
+
+
+def test_cache_round_trip_and_miss(tmp_path):
+    cache = ResponseCache(tmp_path)
+    key = ResponseCache.make_key('mock', 'model', "prompt", 100, system="rules")
+    
+    assert cache.get(key) is None
+    cache.set(key, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.get(ResponseCache.make_key('mock', 'model', "prompt", 100)) is None
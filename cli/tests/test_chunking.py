@@ -0,0 +1,145 @@
+"""
+Tests for chunk planning and line windows
+"""
+import json
+from collections.abc import Mapping
+
+from cli.core.chunking import plan_chunks, split_into_windows
+from cli.core.findings import parse_findings
+from cli.core.llm_client import LLMClient
+
+
+def measure(label: str, text: str) -> int:
+    return len(text) // 4
+
+
+def big_file(lines: int) -> str:
+    return "".join(f"value_{number} = {number}  # padding padding padding\n" for number in range(1, lines + 1))
+
+
+def test_windows_cover_file_with_overlap():
+    content = big_file(500)
+    windows = split_into_windows('src/big.py', content, 1000, measure, overlap_lines=10)
+    
+    assert len(windows) > 1
+    assert windows[0][3] == 1
+    assert windows[-1][4] == 500
+    for (_, _, _, _, last_line), (_, _, _, first_line, _) in zip(windows, windows[1:]):
+        assert first_line <= last_line  # consecutive windows overlap
+    for label, start, end, first_line, last_line in windows:
+        assert label == f"src/big.py (lines {first_line}-{last_line})"
+        assert content[start:end].splitlines()[0] == f"value_{first_line} = {first_line}  # padding padding padding"
+
+
+def test_window_lines_are_numbered_as_in_file():
+    chunks = plan_chunks({'src/big.py': big_file(500)}, 1000, measure)
+    label, (filepath, first_line, last_line) = next(iter(chunks[1].windows.items()))
+    
+    text = chunks[1][label]
+    assert filepath == 'src/big.py'
+    assert f"{first_line} | value_{first_line} = {first_line}" in text
+    assert f"{last_line} | value_{last_line} = {last_line}" in text
+    for chunk in chunks:
+        assert sum(measure(label, text) for label, text in chunk.items()) <= 1000
+
+
+def test_small_files_are_packed_whole():
+    context = {f"src/file_{i}.py": "x = 1\n" for i in range(10)}
+    chunks = plan_chunks(context, 1000, measure)
+    
+    assert len(chunks) == 1
+    assert dict(chunks[0]) == context
+    assert chunks[0].windows == {}
+
+
+def test_files_of_a_directory_share_a_chunk():
+    # Each file is 250 tokens, so a chunk of 1000 holds one whole directory of three
+    body = "x" * 1000
+    context = {}
+    for directory in ('api', 'db', 'web'):
+        for i in range(3):
+            context[f"{directory}/file_{i}.py"] = body
+    
+    chunks = plan_chunks(context, 1000, measure)
+    
+    assert len(chunks) == 3
+    for chunk in chunks:
+        assert len({label.split('/')[0] for label in chunk}) == 1
+    assert [label for chunk in chunks for label in chunk] == list(context)
+
+
+def test_oversized_directory_is_packed_first_fit_decreasing():
+    context = {
+        'src/a.py': "x" * 2800,
+        'src/b.py': "x" * 2000,
+        'src/c.py': "x" * 1200,
+        'src/d.py': "x" * 800,
+    }
+    
+    chunks = plan_chunks(context, 1000, measure)
+    
+    # 700 + 300 and 500 + 200 tokens
+    assert [sorted(chunk) for chunk in chunks] == [['src/a.py', 'src/c.py'], ['src/b.py', 'src/d.py']]
+
+
+def test_findings_in_windows_are_placed_in_the_file():
+    chunks = plan_chunks({'src/big.py': big_file(500)}, 1000, measure)
+    windows = {}
+    for chunk in chunks:
+        windows.update(chunk.windows)
+    label, (_, first_line, last_line) = list(windows.items())[1]
+    response = json.dumps({'findings': [
+        # Numbered as shown in the window
+        {'file': label, 'start_line': first_line + 2, 'severity': 'high', 'title': 'A', 'remediation': 'Fix'},
+        # Counted from the start of the window
+        {'file': label, 'start_line': 3, 'end_line': 4, 'severity': 'low', 'title': 'B', 'remediation': 'Fix'},
+    ]})
+    
+    findings, errors = parse_findings(response, 'rule', windows)
+    
+    assert errors == []
+    assert [(f['file'], f['start_line'], f['end_line']) for f in findings] == [
+        ('src/big.py', first_line + 2, first_line + 2),
+        ('src/big.py', first_line + 2, first_line + 3),
+    ]
+
+
+class CountingContext(Mapping):
+    """A codebase context that records each time a file's content is read"""
+    
+    def __init__(self, files):
+        self.files = files
+        self.reads = []
+    
+    def __getitem__(self, filepath):
+        self.reads.append(filepath)
+        return self.files[filepath]
+    
+    def __iter__(self):
+        return iter(self.files)
+    
+    def __len__(self):
+        return len(self.files)
+
+
+def test_planning_reads_only_files_that_must_be_split():
+    context = CountingContext({'src/big.py': big_file(500), 'src/a.py': "a = 1\n" * 40, 'lib/b.py': "b = 2\n" * 40})
+    file_tokens = {filepath: measure(filepath, content) for filepath, content in context.files.items()}
+    
+    chunks = plan_chunks(context, 1000, measure, file_tokens=file_tokens)
+    
+    assert context.reads == ['src/big.py']
+    planned = {filepath for chunk in chunks for filepath, _, _ in chunk.members.values()}
+    assert planned == {'src/big.py', 'src/a.py', 'lib/b.py'}
+    assert sum(len(chunk.windows) for chunk in chunks) > 1
+
+
+def test_rule_planning_measures_each_file_once():
+    llm = LLMClient(provider='mock')
+    llm.safe_input_tokens = 3000
+    context = CountingContext({'src/big.py': big_file(500), 'src/a.py': "a = 1\n" * 40, 'lib/b.py': "b = 2\n" * 40})
+    
+    chunks, _, _ = llm._plan_rule("Find bugs", context, merge_locally=True)
+    
+    assert len(chunks) > 1
+    assert sorted(context.reads) == ['lib/b.py', 'src/a.py', 'src/big.py', 'src/big.py']
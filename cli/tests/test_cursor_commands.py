@@ -0,0 +1,118 @@
+"""
+Tests for translating rules into Cursor commands and keeping them in sync
+"""
+from cli.commands import sync as sync_command
+from cli.core.cursor_commands import STATE_FILE_NAME, SyncState, sync_commands, translate_rule
+
+RULE = """---
+description: Find hardcoded secrets
+languages:
+- python
+alwaysApply: false
+---
+
+rule_id: secure-flow-detect-secrets
+
+# Detect Secrets
+
+Find credentials committed to the repository.
+
+### Scan the code
+
+- Search for API keys
+  - Include `.env` files
+
+```bash
+grep -r AKIA .
+```
+
+### Implementation Checklist
+
+- [ ] Keys removed
+- [x] Keys rotated
+"""
+
+COMMAND = """# Detect Secrets
+
+## Overview
+
+Find credentials committed to the repository.
+
+## Steps
+
+1. **Scan the code**
+    - Search for API keys
+        - Include `.env` files
+    ```bash
+    grep -r AKIA .
+    ```
+
+## Detect Secrets Checklist
+
+- [ ] Keys removed
+- [ ] Keys rotated
+"""
+
+
+def test_translation_is_deterministic():
+    assert translate_rule(RULE) == COMMAND
+    assert translate_rule(RULE) == translate_rule(RULE)
+
+
+def write_rules(tmp_path, count=2):
+    rules_dir = tmp_path / 'rules'
+    rules_dir.mkdir(exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = rules_dir / f"secure-flow-rule-{i}.md"
+        path.write_text(RULE.replace("Detect Secrets", f"Rule {i}"))
+        paths.append(path)
+    return paths
+
+
+def test_unchanged_rules_are_skipped_and_force_rewrites(tmp_path):
+    rules = write_rules(tmp_path)
+    commands_dir = tmp_path / 'commands'
+    
+    assert set(sync_commands(rules, commands_dir).values()) == {'created'}
+    assert (commands_dir / STATE_FILE_NAME).exists()
+    
+    # Edits to a command are kept while its rule is unchanged
+    (commands_dir / 'secure-flow-rule-0.md').write_text("# Edited\n")
+    assert set(sync_commands(rules, commands_dir).values()) == {'unchanged'}
+    assert (commands_dir / 'secure-flow-rule-0.md').read_text() == "# Edited\n"
+    
+    assert set(sync_commands(rules, commands_dir, force=True).values()) == {'updated'}
+    assert (commands_dir / 'secure-flow-rule-0.md').read_text().startswith("# Rule 0\n")
+
+
+def test_existing_commands_without_state_are_adopted(tmp_path):
+    rules = write_rules(tmp_path)
+    commands_dir = tmp_path / 'commands'
+    commands_dir.mkdir()
+    (commands_dir / 'secure-flow-rule-0.md').write_text("# Maintained by hand\n")
+    
+    statuses = sync_commands(rules, commands_dir)
+    
+    assert statuses == {'secure-flow-rule-0.md': 'adopted', 'secure-flow-rule-1.md': 'created'}
+    assert (commands_dir / 'secure-flow-rule-0.md').read_text() == "# Maintained by hand\n"
+    assert SyncState(commands_dir).get('secure-flow-rule-0.md') is not None
+
+
+def test_check_fails_only_for_changed_rules(tmp_path, monkeypatch, capsys):
+    rules = write_rules(tmp_path)
+    commands_dir = tmp_path / 'commands'
+    sync_commands(rules, commands_dir)
+    monkeypatch.setattr(sync_command, 'RULES_DIR', tmp_path / 'rules')
+    monkeypatch.setattr(sync_command, 'CURSOR_COMMANDS_DIR', commands_dir)
+    monkeypatch.setattr(sync_command, 'list_rule_files', lambda: rules)
+    
+    assert sync_command.sync_cursor_commands(check=True) == 0
+    
+    rules[1].write_text(RULE + "\nOne more line.\n")
+    assert sync_command.sync_cursor_commands(check=True) == 1
+    output = capsys.readouterr().out
+    assert 'secure-flow-rule-1.md' in output
+    assert 'secure-flow-rule-0.md' not in output
+    # Nothing was written
+    assert sync_command.sync_cursor_commands(check=True) == 1
@@ -0,0 +1,78 @@
+"""
+Tests for parsing diffs and placing findings on the lines of changed files
+"""
+from cli.core.diff import DiffContext, FileDiff, parse_diff
+
+DIFF = """diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -3,0 +4,2 @@ def handler():
++    token = request.args['token']
++    run(token)
+@@ -20 +22 @@ def other():
+-    return 1
++    return 2
+@@ -30,2 +31,0 @@ def removed():
+-    a = 1
+-    b = 2
+diff --git a/old.py b/old.py
+deleted file mode 100644
+--- a/old.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-x = 1
+-y = 2
+diff --git a/new.txt b/new.txt
+new file mode 100644
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,3 @@
++one
++two
++three
+"""
+
+
+def test_parse_diff_reads_new_line_ranges():
+    assert parse_diff(DIFF) == {
+        'src/app.py': [(4, 5), (22, 22), (31, 31)],
+        'new.txt': [(1, 3)],
+    }
+
+
+def numbered(lines: int) -> str:
+    return "".join(f"line {number}\n" for number in range(1, lines + 1))
+
+
+def test_excerpt_holds_changed_lines_and_their_window():
+    file_diff = FileDiff('notes.txt', numbered(100), [(50, 50), (80, 81)], window=2)
+    
+    assert file_diff.sent == [(48, 52), (78, 83)]
+    assert file_diff.line_map == [48, 49, 50, 51, 52, 78, 79, 80, 81, 82, 83]
+    assert "+50 | line 50" in file_diff.excerpt
+    assert " 49 | line 49" in file_diff.excerpt
+    assert "line 60" not in file_diff.excerpt
+    assert file_diff.is_changed(49, 50) and not file_diff.is_changed(51, 79)
+
+
+def map_finding(start_line: int, end_line: int) -> dict:
+    file_diff = FileDiff('notes.txt', numbered(100), [(50, 50)], window=2)
+    context = DiffContext('main..HEAD', {'notes.txt': file_diff}, 0, '.')
+    return context.map_finding({'file': 'notes.txt', 'start_line': start_line, 'end_line': end_line})
+
+
+def test_finding_on_sent_lines_keeps_its_lines():
+    assert map_finding(50, 51) == {'file': 'notes.txt', 'start_line': 50, 'end_line': 51, 'in_diff': True}
+
+
+def test_finding_counting_excerpt_lines_is_translated():
+    assert map_finding(2, 3) == {'file': 'notes.txt', 'start_line': 49, 'end_line': 50, 'in_diff': True}
+
+
+def test_finding_spanning_sent_lines_is_not_translated():
+    assert map_finding(3, 49) == {'file': 'notes.txt', 'start_line': 3, 'end_line': 49, 'in_diff': False}
+
+
+def test_finding_outside_excerpt_keeps_its_lines():
+    assert map_finding(70, 72) == {'file': 'notes.txt', 'start_line': 70, 'end_line': 72, 'in_diff': False}
@@ -0,0 +1,85 @@
+"""
+Tests for merging findings and the streaming JSONL and SARIF writers
+"""
+import io
+import json
+
+from cli.core.findings import JsonlFindingsWriter, SarifFindingsWriter, fingerprint, merge_findings
+
+
+def finding(**fields):
+    return dict({
+        'file': 'src/app.py',
+        'start_line': 10,
+        'end_line': 12,
+        'severity': 'medium',
+        'rule_id': 'detect-secrets',
+        'category': 'hardcoded-secret',
+        'title': 'Hardcoded secret',
+        'description': 'An API key is committed.',
+        'remediation': 'Read it from the environment.',
+    }, **fields)
+
+
+def test_fingerprint_ignores_path_spelling_and_end_line():
+    assert fingerprint(finding()) == fingerprint(finding(file='./src//app.py', end_line=20))
+    assert fingerprint(finding()) != fingerprint(finding(start_line=11))
+    assert fingerprint(finding()) != fingerprint(finding(category='sql-injection'))
+
+
+def test_merge_keeps_most_severe_duplicate_spanning_both_ranges():
+    merged = merge_findings([
+        finding(start_line=10, end_line=12, severity='low'),
+        finding(file='./src/app.py', start_line=12, end_line=15, severity='high'),
+        finding(start_line=40, end_line=40, category='sql-injection', severity='critical'),
+    ])
+    
+    assert [(f['severity'], f['start_line'], f['end_line']) for f in merged] == [
+        ('critical', 40, 40),
+        ('high', 10, 15),
+    ]
+    assert all(f['file'] == 'src/app.py' and f['fingerprint'] for f in merged)
+
+
+def test_merge_keeps_distinct_categories_on_the_same_lines():
+    merged = merge_findings([finding(), finding(category='weak-crypto')])
+    
+    assert len(merged) == 2
+
+
+def test_jsonl_writer_writes_one_finding_per_line():
+    out = io.StringIO()
+    writer = JsonlFindingsWriter(out)
+    writer.write([finding(), finding(start_line=30, end_line=30, severity='high')])
+    writer.close()
+    
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line)['start_line'] for line in lines] == [10, 30]
+    assert writer.summary() == "Findings: 2 (1 high, 1 medium)"
+
+
+def test_sarif_writer_produces_a_valid_log_incrementally():
+    out = io.StringIO()
+    writer = SarifFindingsWriter(out, {'detect-secrets': 'Detect hardcoded secrets'})
+    writer.write([finding(fingerprint='abc')])
+    writer.write([finding(start_line=30, end_line=31, severity='critical', in_diff=True)])
+    writer.close()
+    
+    run = json.loads(out.getvalue())['runs'][0]
+    assert run['tool']['driver']['rules'] == [{'id': 'detect-secrets', 'shortDescription': {'text': 'Detect hardcoded secrets'}}]
+    first, second = run['results']
+    assert first['level'] == 'warning'
+    assert first['partialFingerprints'] == {'secureFlow/v1': 'abc'}
+    assert first['locations'][0]['physicalLocation']['region'] == {'startLine': 10, 'endLine': 12}
+    assert 'fixes' not in first
+    assert 'Read it from the environment.' in first['message']['markdown']
+    assert first['properties']['remediation'] == 'Read it from the environment.'
+    assert second['level'] == 'error'
+    assert second['properties']['in_diff'] is True
+
+
+def test_sarif_writer_without_findings_is_valid():
+    out = io.StringIO()
+    SarifFindingsWriter(out).close()
+    
+    assert json.loads(out.getvalue())['runs'][0]['results'] == []
@@ -0,0 +1,78 @@
+"""
+Tests for the findings manifest of incremental runs
+"""
+import json
+
+from cli.core.llm_client import LLMClient
+from cli.core.manifest import FindingsManifest
+
+
+CHUNK = {'app/a.py': "x = 1\n", 'app/b.py': "y = 2\n"}
+
+
+def key(chunk=CHUNK, rule="Find bugs", model='model'):
+    return FindingsManifest.chunk_key(rule, 'mock', model, chunk)
+
+
+def test_chunk_key_depends_on_the_files_and_the_rule():
+    assert key() == key(dict(reversed(list(CHUNK.items()))))
+    assert key(dict(CHUNK, **{'app/b.py': "y = 3\n"})) != key()
+    assert key(dict(CHUNK, **{'app/c.py': ""})) != key()
+    assert key(rule="Find other bugs") != key()
+    assert key(model='other') != key()
+
+
+def test_stored_findings_are_reused_from_disk(tmp_path):
+    manifest = FindingsManifest('rule', tmp_path)
+    manifest.record(key(), CHUNK, "findings")
+    manifest.save()
+    
+    reloaded = FindingsManifest('rule', tmp_path)
+    
+    assert reloaded.get(key()) == "findings"
+    assert reloaded.get(key(dict(CHUNK, **{'app/b.py': "y = 3\n"}))) is None
+    assert reloaded.reused == 1
+    assert FindingsManifest('other-rule', tmp_path).get(key()) is None
+
+
+def test_save_drops_chunks_not_seen_in_the_run(tmp_path):
+    manifest = FindingsManifest('rule', tmp_path)
+    old_chunk = {'app/a.py': "x = 0\n"}
+    manifest.record(key(old_chunk), old_chunk, "old findings")
+    manifest.record(key(), CHUNK, "findings")
+    manifest.save()
+    
+    manifest = FindingsManifest('rule', tmp_path)
+    manifest.get(key())
+    manifest.save()
+    
+    chunks = json.loads((tmp_path / "rule.json").read_text())['chunks']
+    assert list(chunks) == [key()]
+
+
+def test_manifest_of_another_version_is_ignored(tmp_path):
+    manifest = FindingsManifest('rule', tmp_path)
+    manifest.record(key(), CHUNK, "findings")
+    manifest.save()
+    data = json.loads((tmp_path / "rule.json").read_text())
+    (tmp_path / "rule.json").write_text(json.dumps(dict(data, version=FindingsManifest.VERSION + 1)))
+    
+    assert FindingsManifest('rule', tmp_path).get(key()) is None
+
+
+def test_incremental_run_reanalyses_only_when_a_file_or_the_rule_changes(tmp_path):
+    def run(rule, context):
+        llm = LLMClient(provider='mock')
+        manifest = FindingsManifest('rule', tmp_path)
+        result = llm.run_rules({'rule': (rule, context)}, manifests={'rule': manifest})['rule']
+        return llm.usage['calls'], manifest.reused, result
+    
+    calls, reused, first = run("Find bugs", CHUNK)
+    assert (calls, reused) == (1, 0)
+    
+    calls, reused, second = run("Find bugs", CHUNK)
+    assert (calls, reused) == (0, 1)
+    assert second == first
+    
+    assert run("Find bugs", dict(CHUNK, **{'app/b.py': "y = 3\n"}))[:2] == (1, 0)
+    assert run("Find more bugs", CHUNK)[:2] == (1, 0)
@@ -0,0 +1,54 @@
+"""
+Tests for the token-bucket rate limiter
+"""
+import asyncio
+import time
+
+from cli.core.rate_limiter import RateLimiter
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter()
+    
+    assert not limiter.enabled
+    for _ in range(100):
+        assert limiter._reserve(10000) == 0.0
+
+
+def test_request_bucket_starts_full_then_refills():
+    limiter = RateLimiter(requests_per_minute=60)
+    
+    for _ in range(60):
+        assert limiter._reserve(0) == 0.0
+    wait = limiter._reserve(0)
+    # One request per second once the bucket is empty
+    assert 0.9 < wait <= 1.0
+
+
+def test_token_bucket_limits_large_requests():
+    limiter = RateLimiter(tokens_per_minute=6000)
+    
+    assert limiter._reserve(5000) == 0.0
+    wait = limiter._reserve(2000)
+    # 1,000 tokens short at 100 tokens per second
+    assert 9.9 < wait <= 10.0
+
+
+def test_pause_holds_back_callers_without_a_budget():
+    limiter = RateLimiter()
+    limiter.pause(0.2)
+    
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.19
+    
+    limiter.pause(0.2)
+    started = time.monotonic()
+    asyncio.run(limiter.acquire_async())
+    assert time.monotonic() - started >= 0.19
+    assert not limiter.paused
+
+
+def test_shared_limiter_is_reused_per_scope_and_budget():
+    assert RateLimiter.shared('test', 10) is RateLimiter.shared('test', 10)
+    assert RateLimiter.shared('test', 10) is not RateLimiter.shared('test', 20)
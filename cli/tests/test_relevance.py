@@ -0,0 +1,64 @@
+"""
+Tests for the relevance pre-filter
+"""
+from cli.core.relevance import RelevanceFilter
+
+
+CONTEXT = {
+    'Dockerfile': "FROM python:3.12\n",
+    'app/settings.py': "DB_PASSWORD = 'changeme'\n",
+    'app/client.py': "headers = {'x-api-key': key}\n",
+    'app/util.py': "def add(a, b):\n    return a + b\n",
+    'app/named.py': "VALUE = 1\n",
+    'main.go': "package main // password\n",
+}
+
+
+def rule(relevance, languages=('python', 'docker')):
+    return {
+        'languages': list(languages),
+        'alwaysApply': False,
+        'relevance': relevance,
+        'content': "Find hardcoded secrets.",
+    }
+
+
+def test_prefilter_keeps_files_matching_a_signal():
+    relevance_filter = RelevanceFilter.for_rule(rule({
+        'include': ['Dockerfile*'],
+        'keywords': ['password'],
+        'patterns': [r'(?i)api[_-]?key'],
+    }))
+    
+    context, report = relevance_filter.select(CONTEXT, keep=['app/named.py'])
+    
+    assert list(context) == ['Dockerfile', 'app/settings.py', 'app/client.py', 'app/named.py']
+    assert report.dropped == {'language': 1, 'no signal': 1, 'rank': 0}
+    assert (report.total_files, report.kept_files) == (6, 4)
+    assert 0 < report.kept_tokens < report.total_tokens
+
+
+def test_empty_relevance_fields_are_no_signals():
+    # As loaded from `keywords:` and `patterns:` with nothing after them
+    relevance_filter = RelevanceFilter.for_rule(rule({'include': None, 'keywords': None, 'patterns': None}))
+    
+    assert not relevance_filter.has_signals
+    assert relevance_filter.query == "\nFind hardcoded secrets."
+    context, report = relevance_filter.select(CONTEXT)
+    assert 'main.go' not in context
+    assert report.dropped == {'language': 1, 'no signal': 0, 'rank': 0}
+
+
+def test_ranking_keeps_the_best_files_and_those_named_explicitly():
+    relevance_filter = RelevanceFilter.for_rule(rule({'keywords': ['password', 'secret']}, languages=()), top_files=1)
+    context = {
+        'docs/notes.py': "notes\n",
+        'app/settings.py': "password = secret\nsecret_key = secret\n",
+        'app/weak.py': "password\n",
+        'app/other.py': "password\n",
+    }
+    
+    selected, report = relevance_filter.select(context, keep=['app/other.py'])
+    
+    assert list(selected) == ['app/settings.py', 'app/other.py']
+    assert report.dropped == {'language': 0, 'no signal': 1, 'rank': 1}
@@ -0,0 +1,65 @@
+"""
+Tests for the compiled rule index
+"""
+import os
+
+from cli.core.rules import RuleIndex
+
+
+def write_rule(rules_dir, name, description, mtime_ns=None):
+    path = rules_dir / f"{name}.md"
+    path.write_text(f"---\ndescription: {description}\nlanguages: [python]\n---\n\nrule_id: {name}\n\nBody.\n")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def counting_compiles(monkeypatch):
+    compiled = []
+    original = RuleIndex.compile_entry
+    
+    def compile_entry(content, stem):
+        compiled.append(stem)
+        return original(content, stem)
+    
+    monkeypatch.setattr(RuleIndex, 'compile_entry', staticmethod(compile_entry))
+    return compiled
+
+
+def test_index_is_reused_until_a_rule_file_changes(tmp_path, monkeypatch):
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    index_path = tmp_path / "index.json"
+    write_rule(rules_dir, 'secure-flow-alpha', "First", mtime_ns=1_000_000_000)
+    beta = write_rule(rules_dir, 'secure-flow-beta', "Second", mtime_ns=1_000_000_000)
+    compiled = counting_compiles(monkeypatch)
+    
+    assert [rule['description'] for rule in RuleIndex(rules_dir, index_path).rules()] == ["First", "Second"]
+    assert sorted(compiled) == ['secure-flow-alpha', 'secure-flow-beta']
+    
+    # A new process loads the persisted index and parses nothing
+    compiled.clear()
+    assert [rule['rule_id'] for rule in RuleIndex(rules_dir, index_path).rules()] == ['secure-flow-alpha', 'secure-flow-beta']
+    assert compiled == []
+    
+    # Same size, newer mtime: only that file is compiled again
+    write_rule(rules_dir, 'secure-flow-beta', "Latest", mtime_ns=2_000_000_000)
+    index = RuleIndex(rules_dir, index_path)
+    assert index.find('beta')['description'] == "Latest"
+    assert compiled == ['secure-flow-beta']
+    assert index.entries['secure-flow-beta.md']['mtime_ns'] == beta.stat().st_mtime_ns
+
+
+def test_index_follows_added_and_removed_rules(tmp_path):
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    alpha = write_rule(rules_dir, 'secure-flow-alpha', "First")
+    index = RuleIndex(rules_dir, tmp_path / "index.json")
+    assert [rule['file'] for rule in index.rules()] == ['secure-flow-alpha.md']
+    
+    write_rule(rules_dir, 'secure-flow-gamma', "Third")
+    assert index.find('gamma')['path'] == rules_dir / 'secure-flow-gamma.md'
+    
+    alpha.unlink()
+    assert index.find('alpha') is None
+    assert [rule['file'] for rule in RuleIndex(rules_dir, tmp_path / "index.json").rules()] == ['secure-flow-gamma.md']
@@ -0,0 +1,132 @@
+"""
+Tests for the daemon's server: token authentication, command deduplication and output routing
+"""
+import http.client
+import stat
+import sys
+import threading
+
+import pytest
+
+from cli.core import server
+from cli.core.server import CommandQueue, _RoutedStream, create_server, write_token
+
+
+def stdout_of(job) -> str:
+    return "".join(event.get('stdout', '') for event in job.follow())
+
+
+def test_token_file_is_only_readable_by_its_owner(tmp_path):
+    token_file = tmp_path / "daemon" / "token"
+    token_file.parent.mkdir()
+    token_file.write_text("stale\n")
+    token_file.chmod(0o644)
+    
+    token = write_token(token_file)
+    
+    assert stat.S_IMODE(token_file.stat().st_mode) == 0o600
+    assert token_file.read_text() == token + "\n"
+    assert write_token(token_file) != token
+
+
+@pytest.mark.parametrize('host', ['0.0.0.0', '192.0.2.1', 'example.com'])
+def test_tcp_server_refuses_non_loopback_hosts(tmp_path, host):
+    with pytest.raises(OSError, match="loopback"):
+        create_server(host=host, port=0, token_file=tmp_path / "token")
+    assert not (tmp_path / "token").exists()
+
+
+def test_tcp_server_requires_the_bearer_token(tmp_path):
+    daemon = create_server(host='127.0.0.1', port=0, token_file=tmp_path / "token")
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    token = (tmp_path / "token").read_text().strip()
+    
+    def status(headers):
+        connection = http.client.HTTPConnection('127.0.0.1', daemon.server_address[1], timeout=5)
+        try:
+            connection.request('GET', '/health', headers=headers)
+            return connection.getresponse().status
+        finally:
+            connection.close()
+    
+    try:
+        assert status({}) == 401
+        assert status({'Authorization': 'Bearer wrong'}) == 401
+        assert status({'Authorization': token}) == 401
+        assert status({'Authorization': f'Bearer {token}'}) == 200
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
+    assert daemon.commands.remote
+
+
+def test_identical_commands_share_one_execution(monkeypatch):
+    release = threading.Event()
+    calls = []
+    
+    def fake_run_command(argv, cwd, env, remote=False):
+        calls.append(argv)
+        release.wait(5)
+        print(f"ran {' '.join(argv)}")
+        return 0
+    
+    monkeypatch.setattr(server, 'run_command', fake_run_command)
+    monkeypatch.setattr(sys, 'stdout', _RoutedStream('stdout', sys.stdout))
+    queue = CommandQueue(max_jobs=2)
+    
+    first = queue.submit(['list'], '/work', {'ANTHROPIC_API_KEY': 'key'})
+    second = queue.submit(['list'], '/work', {'ANTHROPIC_API_KEY': 'key'})
+    other_key = queue.submit(['list'], '/work', {'ANTHROPIC_API_KEY': 'other'})
+    other_cwd = queue.submit(['list'], '/elsewhere', {'ANTHROPIC_API_KEY': 'key'})
+    
+    assert second is first
+    assert other_key is not first and other_cwd is not first
+    assert queue.deduplicated == 1
+    release.set()
+    
+    assert stdout_of(first) == stdout_of(second) == "ran list\n"
+    assert first.events[-1] == {'exit': 0}
+    for job in (other_key, other_cwd):
+        assert stdout_of(job) == "ran list\n"
+    assert len(calls) == 3
+    
+    # Once a command has finished, the same request runs again
+    assert queue.submit(['list'], '/work', {'ANTHROPIC_API_KEY': 'key'}) is not first
+
+
+def test_concurrent_command_output_is_kept_apart(monkeypatch):
+    both_running = threading.Barrier(2, timeout=5)
+    
+    def fake_run_command(argv, cwd, env, remote=False):
+        both_running.wait()
+        name = argv[0]
+        for i in range(200):
+            print(f"{name} {i}")
+            print(f"{name} warning {i}", file=sys.stderr)
+        return 0 if name == 'list' else 3
+    
+    monkeypatch.setattr(server, 'run_command', fake_run_command)
+    monkeypatch.setattr(sys, 'stdout', _RoutedStream('stdout', sys.stdout))
+    monkeypatch.setattr(sys, 'stderr', _RoutedStream('stderr', sys.stderr))
+    queue = CommandQueue(max_jobs=2)
+    
+    jobs = {name: queue.submit([name], '/work', {}) for name in ('list', 'validate')}
+    
+    for name, job in jobs.items():
+        events = list(job.follow())
+        stdout = "".join(event.get('stdout', '') for event in events)
+        stderr = "".join(event.get('stderr', '') for event in events)
+        assert stdout == "".join(f"{name} {i}\n" for i in range(200))
+        assert stderr == "".join(f"{name} warning {i}\n" for i in range(200))
+    assert jobs['list'].events[-1] == {'exit': 0}
+    assert jobs['validate'].events[-1] == {'exit': 3}
+
+
+def test_output_outside_a_command_goes_to_the_real_stream(capsys):
+    stream = _RoutedStream('stdout', sys.stdout)
+    
+    stream.write("direct\n")
+    
+    assert capsys.readouterr().out == "direct\n"
+    assert not stream.isatty()
@@ -0,0 +1,67 @@
+"""
+Tests for incremental rule validation
+"""
+from cli.core.validator import RuleValidator, ValidationCache
+
+
+VALID_RULE = "---\ndescription: Find secrets\nlanguages: [python]\nalwaysApply: false\n---\n\nrule_id: {name}\n"
+
+
+def write_rule(rules_dir, name, content=None):
+    path = rules_dir / f"{name}.md"
+    path.write_text(content if content is not None else VALID_RULE.format(name=name))
+    return path
+
+
+def counting_validations(monkeypatch):
+    validated = []
+    original = RuleValidator.validate_content
+    
+    def validate_content(content, expected_rule_id):
+        validated.append(expected_rule_id)
+        return original(content, expected_rule_id)
+    
+    monkeypatch.setattr(RuleValidator, 'validate_content', staticmethod(validate_content))
+    return validated
+
+
+def test_unchanged_valid_rules_are_not_validated_again(tmp_path, monkeypatch):
+    cache_path = tmp_path / "validation.json"
+    rules = [write_rule(tmp_path, 'secure-flow-alpha'), write_rule(tmp_path, 'secure-flow-beta')]
+    validated = counting_validations(monkeypatch)
+    
+    first = RuleValidator.validate_files(rules, cache=ValidationCache(cache_path))
+    assert all(valid for valid, _ in first.values())
+    assert validated == ['secure-flow-alpha', 'secure-flow-beta']
+    
+    validated.clear()
+    second = RuleValidator.validate_files(rules, cache=ValidationCache(cache_path))
+    assert second == first
+    assert validated == []
+    
+    # A changed file misses the cache; the other still hits
+    rules[1].write_text(rules[1].read_text() + "\nMore guidance.\n")
+    RuleValidator.validate_files(rules, cache=ValidationCache(cache_path))
+    assert validated == ['secure-flow-beta']
+
+
+def test_invalid_rules_are_always_validated_again(tmp_path, monkeypatch):
+    cache_path = tmp_path / "validation.json"
+    broken = write_rule(tmp_path, 'secure-flow-broken', VALID_RULE.format(name='secure-flow-other'))
+    validated = counting_validations(monkeypatch)
+    
+    for _ in range(2):
+        valid, errors = RuleValidator.validate_files([broken], cache=ValidationCache(cache_path))[broken]
+        assert not valid
+        assert errors == ["rule_id 'secure-flow-other' does not match filename 'secure-flow-broken'"]
+    assert validated == ['secure-flow-broken', 'secure-flow-broken']
+
+
+def test_cache_key_includes_the_file_name(tmp_path):
+    content = VALID_RULE.format(name='secure-flow-alpha')
+    cache = ValidationCache(tmp_path / "validation.json")
+    cache.add(ValidationCache.make_key(tmp_path / 'secure-flow-alpha.md', content))
+    
+    assert ValidationCache.make_key(tmp_path / 'secure-flow-alpha.md', content) in cache
+    assert ValidationCache.make_key(tmp_path / 'secure-flow-beta.md', content) not in cache
+    assert ValidationCache.make_key(tmp_path / 'secure-flow-alpha.md', content + "\n") not in cache